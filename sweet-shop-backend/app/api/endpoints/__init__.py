@@ -3,3 +3,7 @@ from . import auth
 from . import user    
 from . import sweets
 from . import orders
+from . import admin
+from . import analytics
+from . import reservations
+from . import metrics
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+
+# Import your dependencies
+from ...db.database import engine
+from ...db.models import User as UserModel
+from ...db.pool_stats import pool_status
+from ...core.security import get_current_admin_user
+from ...core.cache import principal_cache
+
+# --- Router Definition ---
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+# --- 1. GET /admin/db-pool (Admin only) ---
+@router.get("/db-pool")
+async def read_db_pool_status(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    Reports the database connection pool: checked-out, idle and overflow connections,
+    plus a histogram of how long requests waited to check out a connection.
+    """
+    return pool_status(engine.sync_engine.pool)
+
+# --- 2. GET /admin/principal-cache (Admin only) ---
+@router.get("/principal-cache")
+async def read_principal_cache_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """Reports the size and hit rate of the authenticated-user (principal) cache."""
+    return principal_cache.stats()
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from datetime import date
+
+# Import your dependencies
+from ...db.database import get_db, get_read_db
+from ...db import models
+from ...db.rollups import rebuild_sales_rollups
+from ...schemas.analytics import SalesRow
+from ...core.security import get_current_admin_user
+
+# --- Router Definition ---
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"]
+)
+
+# --- 1. GET /analytics/sales (Admin only) ---
+@router.get("/sales", response_model=List[SalesRow], response_model_exclude_none=True)
+async def read_sales(
+    group_by: Literal["day", "sweet", "category"] = Query("day"),
+    date_from: Optional[date] = Query(None, alias="from", description="First day included (UTC)."),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day included (UTC)."),
+    db: AsyncSession = Depends(get_read_db),
+    admin_user: models.User = Depends(get_current_admin_user)
+):
+    """
+    Revenue and units sold from the daily rollup tables, excluding cancelled orders.
+    group_by=day returns one row per day (oldest first) with its order count;
+    sweet and category return one row per sweet or category over the range, best selling first.
+    """
+    if group_by == "day":
+        table = models.DailySales
+        stmt = select(table.day, table.orders, table.units, table.revenue).order_by(table.day)
+    elif group_by == "sweet":
+        table = models.DailySweetSales
+        revenue = func.sum(table.revenue)
+        stmt = select(table.sweet_id, models.Sweet.name, func.sum(table.units).label("units"), revenue.label("revenue")) \
+            .outerjoin(models.Sweet, table.sweet_id == models.Sweet.id) \
+            .group_by(table.sweet_id, models.Sweet.name) \
+            .order_by(revenue.desc(), table.sweet_id)
+    else:
+        table = models.DailyCategorySales
+        revenue = func.sum(table.revenue)
+        stmt = select(table.category, func.sum(table.units).label("units"), revenue.label("revenue")) \
+            .group_by(table.category) \
+            .order_by(revenue.desc(), table.category)
+
+    if date_from is not None:
+        stmt = stmt.where(table.day >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(table.day <= date_to)
+
+    rows = []
+    for row in await db.execute(stmt):
+        sales = row._asdict()
+        sales["revenue"] = round(sales["revenue"], 2)
+        rows.append(sales)
+    return rows
+
+# --- 2. POST /analytics/sales/rebuild (Admin only) ---
+@router.post("/sales/rebuild", status_code=204)
+async def rebuild_sales(
+    db: AsyncSession = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user)
+):
+    """Recomputes the rollup tables from all orders, e.g. after first deploying them on existing data."""
+    await rebuild_sales_rollups(db)
+    await db.commit()
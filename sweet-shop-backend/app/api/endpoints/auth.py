@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 # REQUIRED FOR THE LOGIN ENDPOINT
 from fastapi.security import OAuth2PasswordRequestForm 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 # Import your dependencies
@@ -9,9 +10,9 @@ from ...db.database import get_db
 from ...db.models import User as UserModel
 from ...schemas.user import UserCreate, Token
 from ...core.security import (
-    get_password_hash, 
+    get_password_hash_async, 
     create_access_token,
-    verify_password  # Used in the login endpoint
+    verify_password_async  # Used in the login endpoint
 )
 from ...core.config import settings
 
@@ -19,27 +20,27 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 # --- 1. POST /auth/register ---
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
     """Handles user registration and returns a JWT."""
     
     # Check for existing user
-    db_user = db.query(UserModel).filter(UserModel.email == user_in.email).first()
+    db_user = await db.scalar(select(UserModel).where(UserModel.email == user_in.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Hash password
-    hashed_password = get_password_hash(user_in.password)
+    # Hash password (bcrypt runs on the hashing process pool, off the event loop)
+    hashed_password = await get_password_hash_async(user_in.password)
     
     # Logic: First user created is automatically an admin
-    is_admin = not db.query(UserModel).first()
+    is_admin = await db.scalar(select(UserModel.id).limit(1)) is None
     
     db_user = UserModel(email=user_in.email, hashed_password=hashed_password, is_admin=is_admin, is_active=True)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     # Generate token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -55,22 +56,30 @@ def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
 
 # --- 2. POST /auth/token (THE MISSING LOGIN ENDPOINT) ---
 @router.post("/token", response_model=Token)
-def login_for_access_token(
-    db: Session = Depends(get_db), 
+async def login_for_access_token(
+    db: AsyncSession = Depends(get_db), 
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
     """Handles user login using OAuth2 form data (username/password)."""
     
     # 1. Find the user by username (which is email)
-    user = db.query(UserModel).filter(UserModel.email == form_data.username).first()
+    user = await db.scalar(select(UserModel).where(UserModel.email == form_data.username))
     
     # 2. Check if user exists and password is correct
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    password_ok, upgraded_hash = False, None
+    if user:
+        password_ok, upgraded_hash = await verify_password_async(form_data.password, user.hashed_password)
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Re-hash with the configured bcrypt cost if it changed since this hash was made
+    if upgraded_hash:
+        user.hashed_password = upgraded_hash
+        await db.commit()
     
     # 3. Create the token
     is_admin = user.is_admin
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Response
+
+from ...db.database import engine
+from ...db.pool_stats import pool_status
+from ...core.cache import principal_cache
+from ...core.metrics import metrics_registry
+
+# Served at /metrics (outside /api), where Prometheus scrapes by default
+router = APIRouter(tags=["Monitoring"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- 1. GET /metrics: Prometheus scrape endpoint ---
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Exports this worker's request latency, status-code, in-flight and database metrics,
+    plus connection pool and principal cache gauges and counters, in the Prometheus text format.
+    """
+    pool = pool_status(engine.sync_engine.pool)
+    cache = principal_cache.stats()
+    gauges = [
+        ("db_pool_checked_out", "Connections checked out of the primary pool.", pool.get("checked_out", 0)),
+        ("db_pool_idle", "Idle connections in the primary pool.", pool.get("idle", 0)),
+        ("db_pool_overflow", "Connections open beyond the primary pool size.", pool.get("overflow", 0)),
+        ("principal_cache_size", "Cached authenticated principals.", cache["size"]),
+    ]
+    counters = [
+        ("principal_cache_hits_total", "Principal cache hits since start.", cache["hits"]),
+        ("principal_cache_misses_total", "Principal cache misses since start.", cache["misses"]),
+    ]
+    return Response(content=metrics_registry.render(gauges, counters), media_type=PROMETHEUS_CONTENT_TYPE)
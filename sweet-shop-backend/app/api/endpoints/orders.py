@@ -1,15 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload 
-from sqlalchemy import select 
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, case, and_, or_, func
+from typing import AsyncIterator, Dict, List, Literal, NamedTuple, Optional, Tuple, Union
+from datetime import date, datetime
+import base64
+import csv
+import io
+import json
 
 # --- CORRECTED IMPORTS ---
-from ...db.database import get_db
+from ...db import database
+from ...db.database import get_db, get_read_db
+from ...db.group_commit import GroupCommitter
+from ...db.routing import mark_write
+from ...core.config import settings
 from ...core.security import get_current_user 
+from ...core.cache import catalog_cache
 from ...db import models 
+from ...db.rollups import CANCELLED, SaleLine, order_sale_lines, orders_sale_lines, record_order_sales
+from ...db.reservations import RELEASED, consume_reservation, release_reservations
+from ...db.idempotency import (
+    IdempotencyKeyInProgress, IdempotencyKeyMismatch, claim_idempotency_key,
+    complete_idempotency_key, release_idempotency_key, request_fingerprint,
+)
 
 # NOTE: You MUST ensure these Pydantic schemas exist and OrderAdmin is defined
-from ...schemas.order import OrderCreate, Order as OrderSchema, OrderItemCreate, OrderItem as OrderItemSchema, OrderStatusUpdate, OrderAdmin
+from ...schemas.order import OrderCreate, OrderItemCreate, Order as OrderSchema, OrderStatusUpdate, OrderAdmin, OrderRow, OrderItemRow, dump_order, dump_orders
+from ...schemas.order import MAX_STATUS_BATCH_SIZE, OrderStatusBatchResult, OrderStatusBatchUpdate, OrderSummary, dump_order_summaries, format_utc
 from ...schemas.user import User as UserSchema
 # -------------------------
 
@@ -18,180 +36,685 @@ router = APIRouter(
     tags=["Orders"]
 )
 
+# --- Shared response building ---
+# Every order endpoint builds its response as plain dicts from Core rows and
+# encodes them with the precompiled serializer in schemas/order.py. The endpoints
+# return the JSON bytes directly, so FastAPI does not validate them a second
+# time against response_model (which stays for the API docs).
+
+ORDER_COLUMNS = (
+    models.Order.id,
+    models.Order.owner_id,
+    models.Order.status,
+    models.Order.total_price,
+    models.Order.created_at,
+    models.Order.updated_at,
+)
+
+
+def order_row(row, items: List[OrderItemRow]) -> OrderRow:
+    """Builds the response dict for an order from a row holding ORDER_COLUMNS."""
+    return {
+        "id": row.id,
+        "owner_id": row.owner_id,
+        "status": row.status,
+        "total_price": row.total_price,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "items": items,
+    }
+
+
+async def load_order_items(db: AsyncSession, order_ids: List[int]) -> Dict[int, List[OrderItemRow]]:
+    """Fetches the items (with sweet names) of the given orders in one query, keyed by order ID."""
+    items: Dict[int, List[OrderItemRow]] = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return items
+    rows = await db.execute(
+        select(
+            models.OrderItem.id,
+            models.OrderItem.order_id,
+            models.OrderItem.sweet_id,
+            models.Sweet.name,
+            models.OrderItem.quantity,
+            models.OrderItem.price_at_purchase,
+        ).outerjoin(models.Sweet, models.OrderItem.sweet_id == models.Sweet.id)
+        .where(models.OrderItem.order_id.in_(order_ids))
+        .order_by(models.OrderItem.order_id, models.OrderItem.id)
+    )
+    for item in rows:
+        items[item.order_id].append({
+            "id": item.id,
+            "order_id": item.order_id,
+            "sweet_id": item.sweet_id,
+            "name": item.name,
+            "quantity": item.quantity,
+            "price_at_purchase": item.price_at_purchase,
+        })
+    return items
+
+
+async def load_order(db: AsyncSession, order_id: int) -> Optional[OrderRow]:
+    """Fetches one order with its items as a response dict, or None if it does not exist."""
+    row = (await db.execute(select(*ORDER_COLUMNS).where(models.Order.id == order_id))).first()
+    if row is None:
+        return None
+    items = await load_order_items(db, [order_id])
+    return order_row(row, items[order_id])
+
+
+def json_response(body: bytes, status_code: int = status.HTTP_200_OK, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+# --- Shared stock checks (also used by POST /reservations) ---
+
+def check_items(
+    sweets: Dict[int, models.Sweet], items: List[OrderItemCreate], available: Dict[int, int]
+) -> Dict[int, int]:
+    """
+    Checks that every item's sweet exists, is for sale and has enough `available` stock,
+    summing quantities for repeated sweets. Returns the total quantity requested per sweet.
+    """
+    quantities: Dict[int, int] = {}
+    for item_in in items:
+        sweet = sweets.get(item_in.sweet_id)
+
+        if not sweet or not sweet.is_available:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Sweet with ID {item_in.sweet_id} not found or is currently unavailable."
+            )
+
+        quantities[sweet.id] = quantities.get(sweet.id, 0) + item_in.quantity
+        if available[sweet.id] < quantities[sweet.id]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock for {sweet.name}. Requested: {quantities[sweet.id]}, Available: {available[sweet.id]}"
+            )
+    return quantities
+
+
+async def load_available_sweets(
+    db: AsyncSession, items: List[OrderItemCreate]
+) -> Tuple[Dict[int, models.Sweet], Dict[int, int]]:
+    """
+    Fetches every requested sweet in a single IN (...) query and checks availability and
+    stock. Returns the sweets by ID and the total quantity requested per sweet.
+    """
+    requested_ids = {item_in.sweet_id for item_in in items}
+    sweets = {
+        sweet.id: sweet
+        for sweet in await db.scalars(
+            select(models.Sweet).where(models.Sweet.id.in_(requested_ids))
+        )
+    }
+    stock = {sweet_id: sweet.stock_quantity for sweet_id, sweet in sweets.items()}
+    return sweets, check_items(sweets, items, stock)
+
+
+async def take_stock(db: AsyncSession, quantities: Dict[int, int]) -> None:
+    """
+    Decrements stock for all sweets with one conditional CASE update.
+    The WHERE clause re-checks stock so a concurrent order cannot oversell.
+    """
+    decrement = case(quantities, value=models.Sweet.id)
+    result = await db.execute(
+        update(models.Sweet)
+        .where(
+            models.Sweet.id.in_(quantities),
+            models.Sweet.stock_quantity >= decrement,
+        )
+        .values(stock_quantity=models.Sweet.stock_quantity - decrement)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient stock for one or more sweets. Please refresh your cart and try again."
+        )
+
+
+# --- Shared order building ---
+
+def new_order(owner_id: int, items: List[OrderItemCreate], sweets: Dict[int, models.Sweet]) -> models.Order:
+    """Builds an order and its items at the sweets' current prices."""
+    return models.Order(
+        owner_id=owner_id,
+        total_price=sum(sweets[item_in.sweet_id].price * item_in.quantity for item_in in items),
+        items=[
+            models.OrderItem(
+                sweet_id=item_in.sweet_id,
+                quantity=item_in.quantity,
+                price_at_purchase=sweets[item_in.sweet_id].price,
+                category=sweets[item_in.sweet_id].category,
+            )
+            for item_in in items
+        ],
+    )
+
+
+def sale_lines(db_order: models.Order) -> List[SaleLine]:
+    """The order's lines in the shape record_order_sales expects (with the category recorded at sale time)."""
+    return [
+        (item.sweet_id, item.category, item.quantity, item.price_at_purchase)
+        for item in db_order.items
+    ]
+
+
+def order_body(db_order: models.Order, sweets: Dict[int, models.Sweet]) -> bytes:
+    """Serializes a flushed order from the objects in hand; no reload is needed."""
+    return dump_order(order_row(db_order, [
+        {
+            "id": item.id,
+            "order_id": db_order.id,
+            "sweet_id": item.sweet_id,
+            "name": sweets[item.sweet_id].name,
+            "quantity": item.quantity,
+            "price_at_purchase": item.price_at_purchase,
+        }
+        for item in db_order.items
+    ]))
+
+
+# --- Group commit (ORDER_GROUP_COMMIT) ---
+# At peak, one commit per order makes the database's fsync the bottleneck. With
+# ORDER_GROUP_COMMIT on, POST /orders queues item orders for a writer task that
+# places them in micro-batches of up to ORDER_BATCH_MAX_SIZE orders (collected for
+# at most ORDER_BATCH_MAX_WAIT_MS) with a single commit per batch. Each caller
+# still gets its own 201 or error.
+
+class PendingOrder(NamedTuple):
+    owner_id: int
+    items: List[OrderItemCreate]
+    idempotency_key: Optional[str]
+
+
+async def place_order_batch(db: AsyncSession, orders: List[PendingOrder]) -> List[Union[bytes, Exception]]:
+    """
+    Places a batch of orders in the given transaction and returns each one's response
+    body, or the HTTPException for an order that was rejected.
+
+    Stock is allocated in arrival order from one locked read of all sweets involved, so
+    orders that no longer fit are rejected without affecting the rest. The accepted
+    orders take their stock with one aggregated CASE update, are inserted with one flush
+    and are added to the sales rollups with one upsert per table and day.
+    """
+    requested_ids = {item_in.sweet_id for order in orders for item_in in order.items}
+    sweets = {
+        sweet.id: sweet
+        for sweet in await db.scalars(
+            select(models.Sweet).where(models.Sweet.id.in_(requested_ids)).with_for_update()
+        )
+    }
+    available = {sweet_id: sweet.stock_quantity for sweet_id, sweet in sweets.items()}
+
+    results: List[Union[models.Order, Exception]] = []
+    totals: Dict[int, int] = {}
+    for order in orders:
+        try:
+            quantities = check_items(sweets, order.items, available)
+        except HTTPException as exc:
+            results.append(exc)
+            continue
+        for sweet_id, quantity in quantities.items():
+            available[sweet_id] -= quantity
+            totals[sweet_id] = totals.get(sweet_id, 0) + quantity
+        results.append(new_order(order.owner_id, order.items, sweets))
+
+    accepted = [result for result in results if isinstance(result, models.Order)]
+    if not accepted:
+        return results
+
+    # If a writer outside the batch took stock meanwhile, this fails the whole
+    # batch, and GroupCommitter retries its orders one by one
+    await take_stock(db, totals)
+    db.add_all(accepted)
+    await db.flush()
+
+    lines_by_day: Dict[date, List] = {}
+    orders_by_day: Dict[date, int] = {}
+    for db_order in accepted:
+        day = db_order.created_at.date()
+        lines_by_day.setdefault(day, []).extend(sale_lines(db_order))
+        orders_by_day[day] = orders_by_day.get(day, 0) + 1
+    for day, lines in lines_by_day.items():
+        await record_order_sales(db, day, lines, order_count=orders_by_day[day])
+
+    bodies: List[Union[bytes, Exception]] = []
+    for order, result in zip(orders, results):
+        if isinstance(result, models.Order):
+            result = order_body(result, sweets)
+            if order.idempotency_key is not None:
+                await complete_idempotency_key(
+                    db, order.owner_id, order.idempotency_key, (status.HTTP_201_CREATED, result)
+                )
+        bodies.append(result)
+    return bodies
+
+
+# Batches are written on the current primary (looked up per batch)
+order_committer: GroupCommitter[PendingOrder, bytes] = GroupCommitter(
+    lambda: database.session_router.primary(),
+    place_order_batch,
+    max_batch_size=settings.ORDER_BATCH_MAX_SIZE,
+    max_wait_seconds=settings.ORDER_BATCH_MAX_WAIT_MS / 1000,
+)
+
+
 # --- 1. POST /orders: Create a new order ---
 
 @router.post("/", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
-def create_order(
+async def create_order(
     order_in: OrderCreate,
-    db: Session = Depends(get_db),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_db),
     current_user: UserSchema = Depends(get_current_user)
 ):
     """
-    Creates a new order for the authenticated user.
+    Creates a new order for the authenticated user, either from a list of items or
+    by checking out an active reservation (reservation_id), whose stock is already held.
+
+    With an Idempotency-Key header, retries of the same request return the stored
+    response of the first one (marked Idempotent-Replayed: true) instead of placing
+    another order. A retry sent while the first request is still running waits for it.
     """
-    if not order_in.items:
+    if idempotency_key is None:
+        return await place_order(request, db, order_in, current_user)
+
+    try:
+        stored = await claim_idempotency_key(
+            db, current_user.id, idempotency_key, request_fingerprint(order_in.model_dump_json().encode())
+        )
+    except IdempotencyKeyMismatch:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Order cannot be empty. Please include at least one item."
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="This Idempotency-Key was already used with a different request."
         )
+    except IdempotencyKeyInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed.",
+            headers={"Retry-After": "1"},
+        )
+    if stored is not None:
+        status_code, body = stored
+        return json_response(body, status_code, headers={"Idempotent-Replayed": "true"})
 
-    order_items_to_create = []
-    total_price = 0.0
-    for item_in in order_in.items:
-        sweet = db.query(models.Sweet).filter(models.Sweet.id == item_in.sweet_id).first()
+    try:
+        return await place_order(request, db, order_in, current_user, idempotency_key)
+    except Exception:
+        # Nothing was committed, so let a retry run the order again
+        await release_idempotency_key(db, current_user.id, idempotency_key)
+        raise
 
-        if not sweet or not sweet.is_available:
+
+async def place_order(
+    request: Request, db: AsyncSession, order_in: OrderCreate, current_user: UserSchema,
+    idempotency_key: Optional[str] = None,
+) -> Response:
+    """Validates and places the order in one transaction (the body of POST /orders)."""
+    if order_in.reservation_id is not None:
+        if order_in.items:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Sweet with ID {item_in.sweet_id} not found or is currently unavailable."
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Send either items or a reservation_id, not both."
             )
 
-        if sweet.stock_quantity < item_in.quantity:
+        # 1-3. Consume the reservation; its stock was taken when it was made
+        reserved = await consume_reservation(db, order_in.reservation_id, current_user.id, models.utc_now())
+        if reserved is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Reservation not found, expired or already used. Please reserve your cart again."
+            )
+        items = [OrderItemCreate(sweet_id=sweet_id, quantity=quantity) for sweet_id, quantity in reserved]
+        reserved_ids = {sweet_id for sweet_id, _ in reserved}
+        sweets = {
+            sweet.id: sweet
+            for sweet in await db.scalars(select(models.Sweet).where(models.Sweet.id.in_(reserved_ids)))
+        }
+        if len(sweets) < len(reserved_ids):
+            # A reserved sweet was deleted since: undo the checkout and give the
+            # rest of the held stock back instead of leaving the hold to expire
+            await db.rollback()
+            await release_reservations(db, [order_in.reservation_id], RELEASED, models.utc_now())
+            await db.commit()
+            catalog_cache.invalidate()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A sweet in this reservation is no longer available. The reservation was released; please reserve your cart again."
+            )
+    else:
+        if not order_in.items:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient stock for {sweet.name}. Requested: {item_in.quantity}, Available: {sweet.stock_quantity}"
+                detail="Order cannot be empty. Please include at least one item."
             )
+        items = order_in.items
 
-        item_price = sweet.price * item_in.quantity
-        total_price += item_price
+        if settings.ORDER_GROUP_COMMIT:
+            # 1-4. Queue the order for the next group commit and wait for its outcome
+            body = await order_committer.submit(PendingOrder(current_user.id, items, idempotency_key))
+            # The batch committed outside this request's session: start the
+            # client's read-your-writes window and drop the stale catalog
+            mark_write(request)
+            catalog_cache.invalidate()
+            return json_response(body, status.HTTP_201_CREATED)
 
-        order_items_to_create.append({
-            "sweet_id": sweet.id,
-            "quantity": item_in.quantity,
-            "price_at_purchase": sweet.price,
-            "sweet_model": sweet 
-        })
+        # 1-2. Fetch and validate every requested sweet
+        sweets, quantities = await load_available_sweets(db, items)
 
-    db_order = models.Order(
-        owner_id=current_user.id,
-        total_price=total_price,
-    )
+        # 3. Decrement stock for all sweets at once
+        await take_stock(db, quantities)
+
+    # 4. Insert the order and all of its items in one flush, then commit once
+    db_order = new_order(current_user.id, items, sweets)
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    for item_data in order_items_to_create:
-        sweet_model = item_data.pop("sweet_model") 
-
-        db_order_item = models.OrderItem(
-            order_id=db_order.id,
-            sweet_id=item_data["sweet_id"],
-            quantity=item_data["quantity"],
-            price_at_purchase=item_data["price_at_purchase"]
-        )
-        db.add(db_order_item)
-        
-        sweet_model.stock_quantity -= item_data["quantity"]
-        db.add(sweet_model) 
+    await db.flush()
 
-    db.commit()
-    db.refresh(db_order)
-    
-    # Reload the order with items/sweet names for the response
-    db.refresh(db_order, attribute_names=['items'])
-    
-    # Manually map items to include sweet name before returning
-    order_dict = db_order.__dict__.copy()
-    items_list_for_pydantic = []
-    for item in db_order.items:
-        # Check if the sweet relationship exists before accessing name
-        if hasattr(item, 'sweet') and item.sweet:
-            item_dict = item.__dict__.copy()
-            item_dict['name'] = item.sweet.name 
-            items_list_for_pydantic.append(item_dict)
-        else:
-            # Fallback if eager loading failed for some reason
-            items_list_for_pydantic.append(item.__dict__.copy())
-            
-    order_dict['items'] = items_list_for_pydantic
-    
-    return OrderSchema(**order_dict)
+    # Add the sale to the daily rollups in the same transaction
+    await record_order_sales(db, db_order.created_at.date(), sale_lines(db_order))
+
+    # Build the response from the flushed objects
+    body = order_body(db_order, sweets)
+    if idempotency_key is not None:
+        # Stored in the order's transaction: either both commit or neither does
+        await complete_idempotency_key(db, current_user.id, idempotency_key, (status.HTTP_201_CREATED, body))
+    await db.commit()
+    # Stock levels changed, so the cached catalog is stale
+    catalog_cache.invalidate()
+
+    return json_response(body, status.HTTP_201_CREATED)
+
+
+# --- 2. GET /orders: Fetch a page of orders (keyset pagination) ---
+
+# Page size bounds for GET /orders. Pages are ordered newest first by (created_at, id).
+DEFAULT_ORDERS_PAGE_SIZE = 50
+MAX_ORDERS_PAGE_SIZE = 200
+
+
+def encode_order_cursor(created_at: datetime, order_id: int) -> str:
+    """Encodes the (created_at, id) of the last order on a page as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
 
-# --- 2. GET /orders: Fetch a list of orders (FINAL WORKING VERSION) ---
-@router.get("/", response_model=List[OrderSchema]) 
-def read_orders(
-    db: Session = Depends(get_db),
+def decode_order_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodes a cursor produced by encode_order_cursor, rejecting malformed values."""
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor."
+        )
+
+
+@router.get("/", response_model=List[OrderAdmin]) 
+async def read_orders(
+    limit: int = Query(DEFAULT_ORDERS_PAGE_SIZE, ge=1, le=MAX_ORDERS_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page."),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    owner_id: Optional[int] = Query(None, description="Admin only: restrict to one customer's orders."),
+    created_from: Optional[datetime] = Query(None, description="Only orders created at or after this time."),
+    created_to: Optional[datetime] = Query(None, description="Only orders created before this time."),
+    db: AsyncSession = Depends(get_read_db),
     current_user: UserSchema = Depends(get_current_user)
 ):
     """
-    Retrieves a list of orders. 
+    Retrieves a page of orders, newest first.
     Admins see all orders with user email. Regular users see only their own orders.
+    When more orders exist, the X-Next-Cursor response header holds the cursor for the next page.
     """
     
+    # 1. Build the filters. Regular users are always restricted to their own orders.
+    filters = []
+    if not current_user.is_admin:
+        filters.append(models.Order.owner_id == current_user.id)
+    elif owner_id is not None:
+        filters.append(models.Order.owner_id == owner_id)
+    if status_filter is not None:
+        filters.append(models.Order.status == status_filter)
+    if created_from is not None:
+        filters.append(models.Order.created_at >= created_from)
+    if created_to is not None:
+        filters.append(models.Order.created_at < created_to)
+    if cursor is not None:
+        cursor_created_at, cursor_id = decode_order_cursor(cursor)
+        filters.append(or_(
+            models.Order.created_at < cursor_created_at,
+            and_(models.Order.created_at == cursor_created_at, models.Order.id < cursor_id),
+        ))
+
+    # 2. Fetch one row more than the page size to know whether another page follows.
+    # Items are loaded with a separate IN query so LIMIT applies to orders, not joined rows.
     if current_user.is_admin:
-        # Admin logic: Fetch all orders, join User for email, and eagerly load nested relationships.
-        
-        # 1. Define the selection statement: Select ALL Order columns and the joined User email.
-        # This uses positional indexing for ultimate reliability.
-        stmt = select(
-            models.Order,
-            models.User.email.label("user_email") # <-- This provides the email at position [1]
-        ).join(models.User, models.Order.owner_id == models.User.id) \
-          .options(
-              # Eagerly load order items and the sweet related to each item
-              joinedload(models.Order.items).joinedload(models.OrderItem.sweet) 
-          ) \
-         .order_by(models.Order.created_at.desc())
-         
-        # 2. Execute the statement
-        result = db.execute(stmt)
-        orders_data = result.unique().all() 
-        
-        orders_list = []
-        for row in orders_data:
-            # CRITICAL: Order model is at index 0, User email is at index 1
-            order_obj = row[0] 
-            user_email = row[1] 
-
-            # Convert ORM object to dict 
-            order_dict = order_obj.__dict__.copy()
-            
-            # 3. Map items, including the Sweet Name (now available via the eager load)
-            items_list_for_pydantic = []
-            for item in order_obj.items:
-                item_dict = item.__dict__.copy()
-                # CRITICAL: Access the name from the eagerly loaded sweet relationship
-                item_dict['name'] = item.sweet.name 
-                items_list_for_pydantic.append(item_dict)
-
-            order_dict['items'] = items_list_for_pydantic
-            order_dict['user_email'] = user_email # <--- Using the guaranteed user_email
-            
-            # Pass the combined dictionary to the OrderAdmin schema
-            orders_list.append(OrderAdmin(**order_dict)) 
-            
-        return orders_list
-        
+        stmt = select(*ORDER_COLUMNS, models.User.email.label("user_email")) \
+            .join(models.User, models.Order.owner_id == models.User.id)
     else:
-        # Regular User logic: Filter by owner_id (also eagerly load items for performance)
-        orders = db.query(models.Order).filter(models.Order.owner_id == current_user.id) \
-             .options(
-                 joinedload(models.Order.items).joinedload(models.OrderItem.sweet)
-             ) \
-             .order_by(models.Order.created_at.desc()).all()
-             
-        # Manually map items to include sweet name for the standard OrderSchema as well
-        orders_list = []
-        for order_obj in orders:
-            order_dict = order_obj.__dict__.copy()
-            items_list_for_pydantic = []
-            for item in order_obj.items:
-                item_dict = item.__dict__.copy()
-                item_dict['name'] = item.sweet.name 
-                items_list_for_pydantic.append(item_dict)
-            order_dict['items'] = items_list_for_pydantic
-            orders_list.append(OrderSchema(**order_dict)) 
-
-        return orders_list
-
-
-# --- 3. GET /orders/{order_id}: Fetch a single order ---
+        stmt = select(*ORDER_COLUMNS)
+
+    stmt = stmt.where(*filters) \
+        .order_by(models.Order.created_at.desc(), models.Order.id.desc()) \
+        .limit(limit + 1)
+
+    rows = (await db.execute(stmt)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_order_cursor(rows[-1].created_at, rows[-1].id)
+
+    # 3. Attach items (with sweet names); admins also get the customer's email
+    items = await load_order_items(db, [row.id for row in rows])
+    orders_list = []
+    for row in rows:
+        order = order_row(row, items[row.id])
+        if current_user.is_admin:
+            order["user_email"] = row.user_email
+        orders_list.append(order)
+
+    return json_response(dump_orders(orders_list), headers=headers)
+
+
+# --- 3. GET /orders/export: Stream all orders as CSV or NDJSON (ADMIN ONLY) ---
+
+# Rows fetched from the database cursor per batch while streaming an export.
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_CSV_COLUMNS = [
+    "order_id", "created_at", "updated_at", "status", "owner_id", "user_email", "total_price",
+    "item_id", "sweet_id", "sweet_name", "quantity", "price_at_purchase",
+]
+
+
+async def _export_rows(db: AsyncSession, filters: list):
+    """
+    Yields one flat row per order item (or per order without items), ordered by order ID,
+    using a server-side cursor so only one batch is held in memory at a time.
+    """
+    stmt = select(
+        models.Order.id.label("order_id"),
+        models.Order.created_at,
+        models.Order.updated_at,
+        models.Order.status,
+        models.Order.owner_id,
+        models.User.email.label("user_email"),
+        models.Order.total_price,
+        models.OrderItem.id.label("item_id"),
+        models.OrderItem.sweet_id,
+        models.Sweet.name.label("sweet_name"),
+        models.OrderItem.quantity,
+        models.OrderItem.price_at_purchase,
+    ).join(models.User, models.Order.owner_id == models.User.id) \
+     .outerjoin(models.OrderItem, models.OrderItem.order_id == models.Order.id) \
+     .outerjoin(models.Sweet, models.OrderItem.sweet_id == models.Sweet.id) \
+     .where(*filters) \
+     .order_by(models.Order.id, models.OrderItem.id)
+
+    result = await db.stream(stmt, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+    try:
+        async for row in result:
+            yield row
+    finally:
+        await result.close()
+
+
+async def _stream_csv(rows) -> AsyncIterator[str]:
+    """Encodes export rows as CSV, flushing the buffer once per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    # Send the header straight away so the client sees the first byte before the query runs
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    count = 0
+    async for row in rows:
+        count += 1
+        writer.writerow([
+            row.order_id, format_utc(row.created_at), format_utc(row.updated_at) if row.updated_at else "",
+            row.status, row.owner_id, row.user_email, row.total_price,
+            row.item_id, row.sweet_id, row.sweet_name, row.quantity, row.price_at_purchase,
+        ])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+async def _stream_ndjson(rows) -> AsyncIterator[str]:
+    """Encodes export rows as one JSON object per order, with its items nested."""
+    current = None
+    async for row in rows:
+        if current is None or current["id"] != row.order_id:
+            if current is not None:
+                yield json.dumps(current) + "\n"
+            current = {
+                "id": row.order_id,
+                "owner_id": row.owner_id,
+                "user_email": row.user_email,
+                "status": row.status,
+                "total_price": row.total_price,
+                "created_at": format_utc(row.created_at),
+                "updated_at": format_utc(row.updated_at) if row.updated_at else None,
+                "items": [],
+            }
+        if row.item_id is not None:
+            current["items"].append({
+                "id": row.item_id,
+                "order_id": row.order_id,
+                "sweet_id": row.sweet_id,
+                "name": row.sweet_name,
+                "quantity": row.quantity,
+                "price_at_purchase": row.price_at_purchase,
+            })
+
+    if current is not None:
+        yield json.dumps(current) + "\n"
+
+
+@router.get("/export")
+async def export_orders(
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None, description="Only orders created at or after this time."),
+    created_to: Optional[datetime] = Query(None, description="Only orders created before this time."),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    Streams every order (optionally filtered) for accounting exports. Restricted to Admin users.
+    CSV has one row per order item; NDJSON has one line per order with its items nested.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can export orders."
+        )
+
+    filters = []
+    if status_filter is not None:
+        filters.append(models.Order.status == status_filter)
+    if created_from is not None:
+        filters.append(models.Order.created_at >= created_from)
+    if created_to is not None:
+        filters.append(models.Order.created_at < created_to)
+
+    rows = _export_rows(db, filters)
+    if export_format == "csv":
+        return StreamingResponse(
+            _stream_csv(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="orders.csv"'},
+        )
+    return StreamingResponse(
+        _stream_ndjson(rows),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="orders.ndjson"'},
+    )
+
+
+# --- 4. GET /orders/history: The current user's orders, without items ---
+
+@router.get("/history", response_model=List[OrderSummary])
+async def read_order_history(
+    limit: int = Query(DEFAULT_ORDERS_PAGE_SIZE, ge=1, le=MAX_ORDERS_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page."),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    Retrieves a page of the current user's orders, newest first, as summaries: status,
+    total and item count, without the items themselves (see GET /orders/{order_id}).
+    When more orders exist, the X-Next-Cursor response header holds the cursor for the next page.
+    """
+    filters = [models.Order.owner_id == current_user.id]
+    if cursor is not None:
+        cursor_created_at, cursor_id = decode_order_cursor(cursor)
+        filters.append(or_(
+            models.Order.created_at < cursor_created_at,
+            and_(models.Order.created_at == cursor_created_at, models.Order.id < cursor_id),
+        ))
+
+    # The page is read from the (owner_id, created_at, id) index; each order's item
+    # count comes from a correlated subquery on the indexed order_items.order_id
+    item_count = select(func.coalesce(func.sum(models.OrderItem.quantity), 0)) \
+        .where(models.OrderItem.order_id == models.Order.id) \
+        .scalar_subquery()
+    stmt = select(
+        models.Order.id,
+        models.Order.status,
+        models.Order.total_price,
+        item_count.label("item_count"),
+        models.Order.created_at,
+        models.Order.updated_at,
+    ).where(*filters) \
+     .order_by(models.Order.created_at.desc(), models.Order.id.desc()) \
+     .limit(limit + 1)
+
+    rows = (await db.execute(stmt)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_order_cursor(rows[-1].created_at, rows[-1].id)
+
+    return json_response(dump_order_summaries([row._asdict() for row in rows]), headers=headers)
+
+
+# --- 5. GET /orders/{order_id}: Fetch a single order ---
 
 @router.get("/{order_id}", response_model=OrderSchema)
-def read_order(
+async def read_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: UserSchema = Depends(get_current_user)
 ):
     """
@@ -199,11 +722,7 @@ def read_order(
     Access is restricted to the owner of the order or an Admin user.
     """
     
-    # Eagerly load items and sweet for single order view
-    db_order = db.query(models.Order).filter(models.Order.id == order_id) \
-        .options(
-            joinedload(models.Order.items).joinedload(models.OrderItem.sweet)
-        ).first()
+    db_order = await load_order(db, order_id)
     
     if not db_order:
         raise HTTPException(
@@ -211,30 +730,33 @@ def read_order(
             detail=f"Order with ID {order_id} not found."
         )
         
-    if db_order.owner_id != current_user.id and not current_user.is_admin:
+    if db_order["owner_id"] != current_user.id and not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view this order."
         )     
 
-    # Map items to include sweet name before returning
-    order_dict = db_order.__dict__.copy()
-    items_list_for_pydantic = []
-    for item in db_order.items:
-        item_dict = item.__dict__.copy()
-        item_dict['name'] = item.sweet.name 
-        items_list_for_pydantic.append(item_dict)
-    order_dict['items'] = items_list_for_pydantic
-    
-    return OrderSchema(**order_dict)
+    return json_response(dump_order(db_order))
+
+
+# --- 6. PATCH /orders/{order_id}/status: Update order status (ADMIN ONLY) ---
+
+VALID_STATUSES = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
+
+
+def check_status(new_status: str) -> None:
+    if new_status not in VALID_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status value. Must be one of: {', '.join(VALID_STATUSES)}"
+        )
 
 
-# --- 4. PATCH /orders/{order_id}/status: Update order status (ADMIN ONLY) ---
 @router.patch("/{order_id}/status", response_model=OrderSchema)
-def update_order_status(
+async def update_order_status(
     order_id: int,
     status_update: OrderStatusUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserSchema = Depends(get_current_user)
 ):
     """
@@ -248,15 +770,10 @@ def update_order_status(
         )
 
     # 2. Validation: Check if the new status is valid
-    valid_statuses = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
-    if status_update.status not in valid_statuses:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid status value. Must be one of: {', '.join(valid_statuses)}"
-        )
+    check_status(status_update.status)
 
     # 3. Fetch the order
-    db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    db_order = await db.get(models.Order, order_id)
 
     if not db_order:
         raise HTTPException(
@@ -264,22 +781,118 @@ def update_order_status(
             detail=f"Order with ID {order_id} not found."
         )
 
-    # 4. Update and Commit
-    db_order.status = status_update.status
-    db.add(db_order)
-    db.commit()
-    
-    # Reload the order with items/sweet names for the response
-    db_order = db.query(models.Order).filter(models.Order.id == order_id) \
-        .options(joinedload(models.Order.items).joinedload(models.OrderItem.sweet)).first()
-    
-    # Map items to include sweet name before returning
-    order_dict = db_order.__dict__.copy()
-    items_list_for_pydantic = []
-    for item in db_order.items:
-        item_dict = item.__dict__.copy()
-        item_dict['name'] = item.sweet.name 
-        items_list_for_pydantic.append(item_dict)
-    order_dict['items'] = items_list_for_pydantic
-    
-    return OrderSchema(**order_dict)
\ No newline at end of file
+    # 4. Update only if the status is still the one read above, so two concurrent
+    # changes cannot both adjust the sales rollups
+    old_status = db_order.status
+    result = await db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.status == old_status)
+        .values(status=status_update.status)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The order status was changed by another request. Please retry."
+        )
+
+    # 5. Cancelling removes the order from the sales rollups; reinstating it adds it back
+    if (old_status == CANCELLED) != (status_update.status == CANCELLED):
+        sign = -1 if status_update.status == CANCELLED else 1
+        await record_order_sales(db, db_order.created_at.date(), await order_sale_lines(db, order_id), sign)
+    await db.commit()
+
+    return json_response(dump_order(await load_order(db, order_id)))
+
+
+# --- 7. POST /orders/status-batch: Move many orders to one status (ADMIN ONLY) ---
+@router.post("/status-batch", response_model=OrderStatusBatchResult)
+async def update_order_status_batch(
+    batch: OrderStatusBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    Moves the orders given by ID, or matching a filter, to one status in a single UPDATE,
+    and reports which orders were updated, already had the status or do not exist.
+    Restricted to Admin users.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can update order status."
+        )
+    check_status(batch.status)
+
+    # 1. Read the selected orders' current status
+    stmt = select(models.Order.id, models.Order.status, models.Order.created_at)
+    if batch.order_ids is not None:
+        order_ids = list(dict.fromkeys(batch.order_ids))
+        stmt = stmt.where(models.Order.id.in_(order_ids))
+    else:
+        filters = []
+        if batch.filter.status is not None:
+            filters.append(models.Order.status == batch.filter.status)
+        if batch.filter.owner_id is not None:
+            filters.append(models.Order.owner_id == batch.filter.owner_id)
+        if batch.filter.created_from is not None:
+            filters.append(models.Order.created_at >= batch.filter.created_from)
+        if batch.filter.created_to is not None:
+            filters.append(models.Order.created_at < batch.filter.created_to)
+        stmt = stmt.where(*filters).order_by(models.Order.id).limit(MAX_STATUS_BATCH_SIZE + 1)
+
+    rows = (await db.execute(stmt)).all()
+    if batch.order_ids is None:
+        if len(rows) > MAX_STATUS_BATCH_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"The filter matches more than {MAX_STATUS_BATCH_SIZE} orders. Narrow it down."
+            )
+        order_ids = [row.id for row in rows]
+    found = {row.id: row for row in rows}
+    changing = [found[order_id] for order_id in order_ids if order_id in found and found[order_id].status != batch.status]
+
+    # 2. Update them in one statement, each only if its status is still the one read above,
+    # so a concurrent change cannot adjust the sales rollups twice
+    if changing:
+        ids_by_status: Dict[str, List[int]] = {}
+        for row in changing:
+            ids_by_status.setdefault(row.status, []).append(row.id)
+        result = await db.execute(
+            update(models.Order)
+            .where(or_(*(
+                and_(models.Order.status == old_status, models.Order.id.in_(ids))
+                for old_status, ids in ids_by_status.items()
+            )))
+            .values(status=batch.status)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(changing):
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Some order statuses were changed by another request. Please retry."
+            )
+
+        # 3. Cancelling removes orders from the sales rollups; reinstating them adds them back.
+        # Orders from the same day are recorded together.
+        crossing = [row for row in changing if (row.status == CANCELLED) != (batch.status == CANCELLED)]
+        if crossing:
+            sign = -1 if batch.status == CANCELLED else 1
+            lines = await orders_sale_lines(db, [row.id for row in crossing])
+            ids_by_day: Dict[date, List[int]] = {}
+            for row in crossing:
+                ids_by_day.setdefault(row.created_at.date(), []).append(row.id)
+            for day, ids in ids_by_day.items():
+                day_lines = [line for order_id in ids for line in lines.get(order_id, [])]
+                await record_order_sales(db, day, day_lines, sign, order_count=len(ids))
+        await db.commit()
+
+    updated = {row.id for row in changing}
+    return OrderStatusBatchResult(
+        status=batch.status,
+        updated=[order_id for order_id in order_ids if order_id in updated],
+        unchanged=[order_id for order_id in order_ids if order_id in found and order_id not in updated],
+        not_found=[order_id for order_id in order_ids if order_id not in found],
+    )
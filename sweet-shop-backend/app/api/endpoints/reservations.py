@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
+
+from ...db.database import get_db
+from ...db import models
+from ...db.reservations import RELEASED, release_reservations
+from ...core.config import settings
+from ...core.security import get_current_user
+from ...core.cache import catalog_cache
+from ...schemas.reservation import ReservationCreate, Reservation as ReservationSchema
+from ...schemas.user import User as UserSchema
+from .orders import load_available_sweets, take_stock
+
+router = APIRouter(
+    prefix="/reservations",
+    tags=["Reservations"]
+)
+
+
+async def get_own_reservation(db: AsyncSession, reservation_id: int, current_user: UserSchema) -> models.Reservation:
+    """Loads a reservation with its items. Only its owner or an admin may access it."""
+    reservation = await db.scalar(
+        select(models.Reservation)
+        .where(models.Reservation.id == reservation_id)
+        .options(selectinload(models.Reservation.items))
+    )
+    if reservation is None or (reservation.owner_id != current_user.id and not current_user.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Reservation with ID {reservation_id} not found."
+        )
+    return reservation
+
+
+# --- 1. POST /reservations: Hold stock for a cart ---
+
+@router.post("/", response_model=ReservationSchema, status_code=status.HTTP_201_CREATED)
+async def create_reservation(
+    reservation_in: ReservationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    Takes the requested quantities out of stock and holds them for the current user
+    for RESERVATION_TTL_SECONDS. Check out with POST /orders and {"reservation_id": id};
+    holds that are not checked out are returned to stock when they expire.
+    """
+    # Same validation and conditional stock decrement as POST /orders
+    _, quantities = await load_available_sweets(db, reservation_in.items)
+    await take_stock(db, quantities)
+
+    now = models.utc_now()
+    reservation = models.Reservation(
+        owner_id=current_user.id,
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.RESERVATION_TTL_SECONDS),
+        items=[
+            models.ReservationItem(sweet_id=sweet_id, quantity=quantity)
+            for sweet_id, quantity in quantities.items()
+        ],
+    )
+    db.add(reservation)
+    await db.flush()
+    response = ReservationSchema.model_validate(reservation)
+    await db.commit()
+    # Stock levels changed, so the cached catalog is stale
+    catalog_cache.invalidate()
+    return response
+
+
+# --- 2. GET /reservations/{reservation_id}: Read a reservation ---
+
+@router.get("/{reservation_id}", response_model=ReservationSchema)
+async def read_reservation(
+    reservation_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """Returns a reservation with its status and expiry time (owner or Admin only)."""
+    return await get_own_reservation(db, reservation_id, current_user)
+
+
+# --- 3. DELETE /reservations/{reservation_id}: Release a hold early ---
+
+@router.delete("/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def release_reservation(
+    reservation_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """Returns the held stock right away, e.g. when the cart is emptied (owner or Admin only)."""
+    await get_own_reservation(db, reservation_id, current_user)
+
+    if not await release_reservations(db, [reservation_id], RELEASED, models.utc_now()):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Reservation has already been checked out, released or expired."
+        )
+    await db.commit()
+    catalog_cache.invalidate()
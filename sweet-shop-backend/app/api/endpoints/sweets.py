@@ -1,23 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select, update, case, literal, and_, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
+import base64
+import codecs
+import csv
+import json
 
 # Import your dependencies and database utility
-from ...db.database import get_db
-from ...schemas.sweet import SweetCreate, Sweet, SweetUpdate
+from ...db.catalog import catalog_marker, sync_search_index
+from ...db import database
+from ...db.database import get_db, get_read_db
+from ...schemas.sweet import SweetCreate, Sweet, SweetUpdate, StockAdjustmentBatch, StockLevel
 from ...db.models import Sweet as SweetModel, User as UserModel
 from ...core.security import get_current_active_user # For admin authorization
+from ...core.cache import catalog_cache, etag_matches
+from ...core.search import search_index
 
 router = APIRouter(
     prefix="/sweets",
     tags=["Sweets"]
 )
 
+# Serializer for the cached catalog body (validates from ORM attributes, dumps straight to JSON bytes)
+sweet_list_adapter = TypeAdapter(List[Sweet])
+
 # --- 1. POST /sweets (Create Sweet - ADMIN ONLY) ---
 @router.post("/", response_model=Sweet, status_code=status.HTTP_201_CREATED)
-def create_sweet(
+async def create_sweet(
     sweet_in: SweetCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     # Dependency to ensure only active ADMIN users can create sweets
     current_user: UserModel = Depends(get_current_active_user)
 ):
@@ -28,7 +44,7 @@ def create_sweet(
         )
 
     # Check if a sweet with this name already exists
-    db_sweet = db.query(SweetModel).filter(SweetModel.name == sweet_in.name).first()
+    db_sweet = await db.scalar(select(SweetModel).where(SweetModel.name == sweet_in.name))
     if db_sweet:
         raise HTTPException(status_code=400, detail="Sweet with this name already exists")
 
@@ -36,22 +52,339 @@ def create_sweet(
     db_sweet = SweetModel(**sweet_in.model_dump(), owner_id=current_user.id)
     
     db.add(db_sweet)
-    db.commit()
-    db.refresh(db_sweet)
+    await db.commit()
+    catalog_cache.invalidate()
+    await db.refresh(db_sweet)
+    search_index.add(db_sweet)
     return db_sweet
 
 
-# --- 2. GET /sweets (Read All Sweets - PUBLIC) ---
+# --- 1b. POST /sweets/bulk (Bulk Import / Upsert - ADMIN ONLY) ---
+
+# Rows written (and committed) per multi-row upsert statement.
+BULK_IMPORT_CHUNK_SIZE = 1000
+# The error report lists at most this many rows; the counts always cover every row.
+MAX_REPORTED_ERRORS = 1000
+
+# Columns overwritten when an imported sweet's name already exists. The owner is kept.
+BULK_UPDATE_COLUMNS = ["description", "category", "price", "stock_quantity", "is_available"]
+
+
+async def _iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Splits a streamed UTF-8 request body into lines, keeping line endings."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in body:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _iter_import_records(body: AsyncIterator[bytes], import_format: str) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (row_number, record) for each data row of a CSV or NDJSON upload as it streams in.
+    CSV records are dicts keyed by the header row, with empty cells left out so schema
+    defaults apply. A record that cannot be parsed is yielded as a ValueError.
+    """
+    row_number = 0
+    if import_format == "ndjson":
+        async for line in _iter_lines(body):
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as exc:
+                yield row_number, ValueError(f"Invalid JSON: {exc}")
+        return
+
+    header = None
+    record = ""
+    async for line in _iter_lines(body):
+        # A record continues onto the next line while it has an unterminated quoted field
+        record += line
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            try:
+                values = next(csv.reader([record]))
+            except csv.Error as exc:
+                values = ValueError(f"Invalid CSV: {exc}")
+            if header is None:
+                if isinstance(values, ValueError):
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid CSV header row.")
+                header = [column.strip() for column in values]
+            else:
+                row_number += 1
+                if isinstance(values, ValueError):
+                    yield row_number, values
+                elif len(values) > len(header):
+                    yield row_number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+                else:
+                    yield row_number, {column: value for column, value in zip(header, values) if value != ""}
+        record = ""
+    if record.strip():
+        row_number += 1
+        yield row_number, ValueError("Invalid CSV: unterminated quoted field")
+
+
+def _upsert_statement(dialect_name: str):
+    """
+    An INSERT that updates BULK_UPDATE_COLUMNS (and updated_at, which upserts do not
+    set on their own) of sweets whose name already exists.
+    Executed with a list of rows, so the driver batches them into multi-row statements.
+    """
+    table = SweetModel.__table__
+    if dialect_name in ("mysql", "mariadb"):
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in BULK_UPDATE_COLUMNS + ["updated_at"]})
+    if dialect_name == "sqlite":
+        stmt = sqlite_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={column: stmt.excluded[column] for column in BULK_UPDATE_COLUMNS + ["updated_at"]},
+        )
+    raise HTTPException(
+        status_code=status.HTTP_501_NOT_IMPLEMENTED,
+        detail=f"Bulk import is not supported on the {dialect_name} database."
+    )
+
+
+@router.post("/bulk")
+async def bulk_import_sweets(
+    request: Request,
+    import_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Creates or updates sweets from a streamed CSV (with a header row) or NDJSON upload.
+
+    Each row is validated against SweetCreate and upserted by name in batched multi-row
+    statements, committing per chunk of BULK_IMPORT_CHUNK_SIZE rows. Invalid rows are
+    skipped and listed in the returned report by their 1-based data row number.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can import sweets."
+        )
+
+    upsert = _upsert_statement(db.get_bind().dialect.name)
+    report = {"received": 0, "upserted": 0, "failed": 0, "errors": []}
+
+    def reject(row_number: int, errors: List[str]) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "errors": errors})
+
+    async def flush(chunk: Dict[str, Tuple[int, Dict[str, Any]]]) -> None:
+        # Rows are keyed by name, so a name repeated within a chunk keeps its last row
+        rows = [row for _, row in chunk.values()]
+        try:
+            await db.execute(upsert, rows)
+            await db.commit()
+        except SQLAlchemyError as exc:
+            await db.rollback()
+            for row_number, _ in chunk.values():
+                reject(row_number, [f"Database error: {exc.__class__.__name__}"])
+            return
+        catalog_cache.invalidate()
+        report["upserted"] += len(rows)
+        # Re-read the indexed columns (and IDs of new sweets) to update the search index
+        for sweet in await db.execute(
+            select(SweetModel.id, SweetModel.name, SweetModel.category, SweetModel.description)
+            .where(SweetModel.name.in_(list(chunk)))
+        ):
+            search_index.add(sweet)
+
+    chunk: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    async for row_number, record in _iter_import_records(request.stream(), import_format):
+        report["received"] += 1
+        if isinstance(record, ValueError):
+            reject(row_number, [str(record)])
+            continue
+        try:
+            sweet_in = SweetCreate.model_validate(record)
+        except ValidationError as exc:
+            reject(row_number, [
+                f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+            ])
+            continue
+
+        chunk.pop(sweet_in.name, None)
+        chunk[sweet_in.name] = (row_number, {**sweet_in.model_dump(), "owner_id": current_user.id})
+        if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = {}
+
+    if chunk:
+        await flush(chunk)
+    return report
+
+
+# --- 2. GET /sweets (Read Sweets - PUBLIC) ---
+
+# Page size bounds for filtered/paginated GET /sweets requests.
+DEFAULT_SWEETS_PAGE_SIZE = 50
+MAX_SWEETS_PAGE_SIZE = 200
+
+# Allowed values of the `sort` parameter and the column each one orders by.
+# A leading "-" sorts descending; id is always the tie-breaker.
+SWEET_SORT_COLUMNS = {
+    "id": SweetModel.id,
+    "price": SweetModel.price,
+    "name": SweetModel.name,
+    "stock": SweetModel.stock_quantity,
+}
+SweetSort = Literal["id", "-id", "price", "-price", "name", "-name", "stock", "-stock"]
+
+
+def encode_sweet_cursor(sort: str, sweet: SweetModel) -> str:
+    """Encodes the sort key and id of the last sweet on a page as an opaque cursor."""
+    key = getattr(sweet, SWEET_SORT_COLUMNS[sort.lstrip("-")].key)
+    raw = json.dumps([sort, key, sweet.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_sweet_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """Decodes a cursor produced by encode_sweet_cursor for the same sort order."""
+    try:
+        cursor_sort, key, sweet_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_sort != sort or not isinstance(sweet_id, int) or not isinstance(key, (int, float, str)):
+            raise ValueError(cursor_sort)
+        return key, sweet_id
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor."
+        )
+
+
+# Without parameters the full catalog is returned from an in-memory cache and
+# revalidated with a strong ETag, so a matching If-None-Match gets a 304 without
+# touching the database. Any filter, sort or paging parameter switches to a
+# keyset-paginated query instead; X-Next-Cursor then holds the next page's cursor.
 @router.get("/", response_model=List[Sweet])
-def read_sweets(db: Session = Depends(get_db)):
-    sweets = db.query(SweetModel).all()
+async def read_sweets(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None, max_length=50),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    is_available: Optional[bool] = Query(None),
+    in_stock: Optional[bool] = Query(None, description="true: stock above zero, false: sold out."),
+    sort: Optional[SweetSort] = Query(None, description="Sort key; prefix with '-' for descending."),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_SWEETS_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page."),
+    db: AsyncSession = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    params = (category, min_price, max_price, is_available, in_stock, sort, limit, cursor)
+    if all(param is None for param in params):
+        # A client that just wrote reads through the primary and skips the check
+        # interval, so it sees its write even if another worker took it
+        own_writes = database.session_router.reads_own_writes(request)
+        return await _read_full_catalog(db, if_none_match, revalidate=own_writes)
+
+    # 1. Build the filters
+    filters = []
+    if category is not None:
+        filters.append(SweetModel.category == category)
+    if min_price is not None:
+        filters.append(SweetModel.price >= min_price)
+    if max_price is not None:
+        filters.append(SweetModel.price <= max_price)
+    if is_available is not None:
+        filters.append(SweetModel.is_available == is_available)
+    if in_stock is not None:
+        filters.append(SweetModel.stock_quantity > 0 if in_stock else SweetModel.stock_quantity <= 0)
+
+    # 2. Order by (sort key, id) and continue after the cursor's position
+    sort = sort or "id"
+    descending = sort.startswith("-")
+    sort_column = SWEET_SORT_COLUMNS[sort.lstrip("-")]
+    if cursor is not None:
+        cursor_key, cursor_id = decode_sweet_cursor(cursor, sort)
+        if sort_column is SweetModel.id:
+            filters.append(SweetModel.id < cursor_id if descending else SweetModel.id > cursor_id)
+        elif descending:
+            filters.append(or_(
+                sort_column < cursor_key,
+                and_(sort_column == cursor_key, SweetModel.id < cursor_id),
+            ))
+        else:
+            filters.append(or_(
+                sort_column > cursor_key,
+                and_(sort_column == cursor_key, SweetModel.id > cursor_id),
+            ))
+
+    order_by = [sort_column.desc(), SweetModel.id.desc()] if descending else [sort_column, SweetModel.id]
+    if sort_column is SweetModel.id:
+        order_by = order_by[:1]
+
+    # 3. Fetch one row more than the page size to know whether another page follows
+    limit = limit or DEFAULT_SWEETS_PAGE_SIZE
+    sweets = (await db.scalars(
+        select(SweetModel).where(*filters).order_by(*order_by).limit(limit + 1)
+    )).all()
+    if len(sweets) > limit:
+        sweets = sweets[:limit]
+        response.headers["X-Next-Cursor"] = encode_sweet_cursor(sort, sweets[-1])
     return sweets
 
 
+async def _read_full_catalog(db: AsyncSession, if_none_match: Optional[str], revalidate: bool = False) -> Response:
+    cached = None if revalidate else catalog_cache.get()
+    if cached is None:
+        # Check the cached copy against the change marker read through the same
+        # session, which also moves on writes made by other workers (and as a
+        # lagging replica catches up); rebuild only if it has moved
+        version = catalog_cache.version
+        marker = await catalog_marker(db)
+        cached = catalog_cache.revalidate(marker)
+        if cached is None:
+            sweets = (await db.scalars(select(SweetModel))).all()
+            body = sweet_list_adapter.dump_json(sweet_list_adapter.validate_python(sweets, from_attributes=True))
+            cached = catalog_cache.store(version, marker, body)
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# --- 2b. GET /sweets/search (Full-Text Catalog Search - PUBLIC) ---
+# Ranked matches on name, category and description from the in-memory index
+# (exact, prefix and one-typo matches), then one primary-key lookup for the rows.
+# About once a second the index also picks up writes made by other workers.
+@router.get("/search", response_model=List[Sweet])
+async def search_sweets(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    await sync_search_index(db, search_index)
+    ranked_ids = [sweet_id for sweet_id, _ in search_index.search(q, limit=limit)]
+    if not ranked_ids:
+        return []
+
+    sweets = {
+        sweet.id: sweet
+        for sweet in await db.scalars(select(SweetModel).where(SweetModel.id.in_(ranked_ids)))
+    }
+    return [sweets[sweet_id] for sweet_id in ranked_ids if sweet_id in sweets]
+
+
 # --- 3. GET /sweets/{sweet_id} (Read Single Sweet - PUBLIC) ---
 @router.get("/{sweet_id}", response_model=Sweet)
-def read_sweet_by_id(sweet_id: int, db: Session = Depends(get_db)):
-    db_sweet = db.query(SweetModel).filter(SweetModel.id == sweet_id).first()
+async def read_sweet_by_id(sweet_id: int, db: AsyncSession = Depends(get_read_db)):
+    db_sweet = await db.get(SweetModel, sweet_id)
     if db_sweet is None:
         raise HTTPException(status_code=404, detail="Sweet not found")
     return db_sweet
@@ -59,10 +392,10 @@ def read_sweet_by_id(sweet_id: int, db: Session = Depends(get_db)):
 
 # --- 4. PUT /sweets/{sweet_id} (Update Sweet - ADMIN ONLY) ---
 @router.put("/{sweet_id}", response_model=Sweet)
-def update_sweet(
+async def update_sweet(
     sweet_id: int, 
     sweet_in: SweetUpdate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     current_user: UserModel = Depends(get_current_active_user)
 ):
     if not current_user.is_admin:
@@ -71,7 +404,7 @@ def update_sweet(
             detail="Only administrators can update sweets."
         )
     
-    db_sweet = db.query(SweetModel).filter(SweetModel.id == sweet_id).first()
+    db_sweet = await db.get(SweetModel, sweet_id)
     if db_sweet is None:
         raise HTTPException(status_code=404, detail="Sweet not found")
 
@@ -80,16 +413,107 @@ def update_sweet(
         setattr(db_sweet, key, value)
 
     db.add(db_sweet)
-    db.commit()
-    db.refresh(db_sweet)
+    await db.commit()
+    catalog_cache.invalidate()
+    await db.refresh(db_sweet)
+    search_index.add(db_sweet)
     return db_sweet
 
 
+# --- 4b. POST /sweets/stock-adjustments (Batch Stock Adjustment - ADMIN ONLY) ---
+
+# Sweets updated per UPDATE statement; all statements share one transaction.
+STOCK_ADJUSTMENT_CHUNK_SIZE = 1000
+
+
+@router.post("/stock-adjustments", response_model=List[StockLevel])
+async def adjust_stock(
+    batch: StockAdjustmentBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Applies restocks (delta) and stock counts (set_to) to many sweets in one transaction
+    and returns the resulting stock levels. Deltas are applied in SQL relative to the
+    current level, so they cannot lose concurrent order decrements. Entries for the same
+    sweet apply in order. Nothing is changed if any sweet is missing or would go below zero.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can adjust stock."
+        )
+
+    # 1. Collapse the entries to one (absolute base or None, delta) per sweet
+    targets: Dict[int, Tuple[Optional[int], int]] = {}
+    for adjustment in batch.adjustments:
+        base, delta = targets.get(adjustment.sweet_id, (None, 0))
+        if adjustment.set_to is not None:
+            base, delta = adjustment.set_to, 0
+        else:
+            delta += adjustment.delta
+        targets[adjustment.sweet_id] = (base, delta)
+
+    negative = [sweet_id for sweet_id, (base, delta) in targets.items() if base is not None and base + delta < 0]
+    if negative:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Stock cannot go below zero for sweets: {negative}"
+        )
+
+    # 2. One conditional CASE update per chunk. The WHERE clause refuses any row that would go negative.
+    sweet_ids = list(targets)
+    updated = 0
+    for start in range(0, len(sweet_ids), STOCK_ADJUSTMENT_CHUNK_SIZE):
+        chunk = sweet_ids[start:start + STOCK_ADJUSTMENT_CHUNK_SIZE]
+        new_level = case(
+            {
+                sweet_id: SweetModel.stock_quantity + delta if base is None else literal(base + delta)
+                for sweet_id, (base, delta) in ((sweet_id, targets[sweet_id]) for sweet_id in chunk)
+            },
+            value=SweetModel.id,
+        )
+        result = await db.execute(
+            update(SweetModel)
+            .where(SweetModel.id.in_(chunk), new_level >= 0)
+            .values(stock_quantity=new_level)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+
+    async def read_levels() -> Dict[int, int]:
+        rows = await db.execute(
+            select(SweetModel.id, SweetModel.stock_quantity).where(SweetModel.id.in_(sweet_ids))
+        )
+        return {row.id: row.stock_quantity for row in rows}
+
+    # 3. If any sweet was skipped, undo everything and say why
+    if updated != len(sweet_ids):
+        await db.rollback()
+        levels = await read_levels()
+        missing = [sweet_id for sweet_id in sweet_ids if sweet_id not in levels]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Sweets not found: {missing}")
+        negative = [
+            sweet_id for sweet_id in sweet_ids
+            if targets[sweet_id][0] is None and levels[sweet_id] + targets[sweet_id][1] < 0
+        ]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Stock cannot go below zero for sweets: {negative}"
+        )
+
+    levels = await read_levels()
+    await db.commit()
+    catalog_cache.invalidate()
+    return [{"sweet_id": sweet_id, "stock_quantity": levels[sweet_id]} for sweet_id in sweet_ids]
+
+
 # --- 5. DELETE /sweets/{sweet_id} (Delete Sweet - ADMIN ONLY) ---
 @router.delete("/{sweet_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_sweet(
+async def delete_sweet(
     sweet_id: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     current_user: UserModel = Depends(get_current_active_user)
 ):
     if not current_user.is_admin:
@@ -98,10 +522,12 @@ def delete_sweet(
             detail="Only administrators can delete sweets."
         )
         
-    db_sweet = db.query(SweetModel).filter(SweetModel.id == sweet_id).first()
+    db_sweet = await db.get(SweetModel, sweet_id)
     if db_sweet is None:
         raise HTTPException(status_code=404, detail="Sweet not found")
 
-    db.delete(db_sweet)
-    db.commit()
+    await db.delete(db_sweet)
+    await db.commit()
+    catalog_cache.invalidate()
+    search_index.remove(sweet_id)
     
\ No newline at end of file
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 # Import your dependencies
-from ...db.database import get_db
+from ...db.database import get_db, get_read_db
 from ...db.models import User as UserModel
-from ...schemas.user import UserOut # Import UserOut schema from the schemas folder
+from ...schemas.user import UserOut, UserAdminUpdate # Import schemas from the schemas folder
 from ...core.security import get_current_active_user, get_current_admin_user 
+from ...core.cache import principal_cache
 
 # --- Router Definition ---
 router = APIRouter(
@@ -16,20 +18,47 @@ router = APIRouter(
 
 # --- 1. GET /users/me (Get Current User Profile) ---
 @router.get("/me", response_model=UserOut, status_code=status.HTTP_200_OK)
-def read_users_me(current_user: UserModel = Depends(get_current_active_user)):
+async def read_users_me(current_user: UserModel = Depends(get_current_active_user)):
     """Returns the profile of the currently logged-in active user."""
     return current_user
 
 # --- 2. GET /users/ (Admin only) ---
 # This endpoint handles the root path and resolves the 404 error
 @router.get("/", response_model=List[UserOut])
-def read_all_users(
-    db: Session = Depends(get_db), 
+async def read_all_users(
+    db: AsyncSession = Depends(get_read_db), 
     admin_user: UserModel = Depends(get_current_admin_user)
 ):
     """Returns a list of all users (Admin only)."""
     # Note: get_current_admin_user already ensures the user is an admin,
     # and if not, it raises a 403 Forbidden error.
     
-    users = db.query(UserModel).all()
-    return users
\ No newline at end of file
+    users = (await db.scalars(select(UserModel))).all()
+    return users
+
+# --- 3. PATCH /users/{user_id}/admin (Admin only) ---
+@router.patch("/{user_id}/admin", response_model=UserOut)
+async def update_user_admin_status(
+    user_id: int,
+    admin_update: UserAdminUpdate,
+    db: AsyncSession = Depends(get_db),
+    admin_user: UserModel = Depends(get_current_admin_user)
+):
+    """Promotes or demotes a user (Admin only). Admins cannot change their own status."""
+    if user_id == admin_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You cannot change your own admin status."
+        )
+
+    db_user = await db.get(UserModel, user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    db_user.is_admin = admin_update.is_admin
+    await db.commit()
+    # A promoted user's cached (regular) principal still carries the old flag, so drop
+    # it here; other workers pick the promotion up once their entry expires. Admin
+    # principals are never cached, so a demotion applies everywhere at once.
+    principal_cache.invalidate(db_user.email)
+    return db_user
@@ -0,0 +1,206 @@
+import importlib
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+
+
+class RouteGroup(NamedTuple):
+    """
+    A class of routes with shared admission limits. A request belongs to the first
+    group whose methods (empty = any) and path prefixes match it.
+    """
+    name: str
+    methods: FrozenSet[str]
+    path_prefixes: Tuple[str, ...]
+    rate_per_minute: float  # Sustained requests per client; 0 = no rate limit
+    burst: int              # Requests a client may send at once before the rate applies
+    max_in_flight: int      # Concurrent requests for the whole group; 0 = no cap
+
+
+class AdmissionBackend:
+    """
+    Where admission state lives. The in-memory backend limits each worker process on
+    its own; to share limits between workers, subclass this with a shared store (e.g.
+    Redis) and point ADMISSION_BACKEND at it as "module:ClassName".
+    """
+
+    async def take_token(self, key: str, rate_per_second: float, burst: int) -> float:
+        """Takes a token from the key's bucket. Returns 0 if one was taken, else the seconds until one is available."""
+        raise NotImplementedError
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        """Counts one more request in flight for the key, unless `limit` are already in flight."""
+        raise NotImplementedError
+
+    async def release_slot(self, key: str) -> None:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forgets all buckets and counters."""
+        raise NotImplementedError
+
+
+class MemoryAdmissionBackend(AdmissionBackend):
+    """
+    Token buckets and in-flight counters in the worker's memory. At most `max_buckets`
+    clients are tracked; the least recently seen are forgotten first. Runs on the event
+    loop thread only, so no lock is needed.
+    """
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._in_flight: Dict[str, int] = {}
+
+    async def take_token(self, key: str, rate_per_second: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated_at) * rate_per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate_per_second
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        count = self._in_flight.get(key, 0)
+        if count >= limit:
+            return False
+        self._in_flight[key] = count + 1
+        return True
+
+    async def release_slot(self, key: str) -> None:
+        self._in_flight[key] -= 1
+
+    def reset(self) -> None:
+        self._buckets.clear()
+        self._in_flight.clear()
+
+    def in_flight(self) -> Dict[str, int]:
+        """Current in-flight counts per route group, for monitoring."""
+        return dict(self._in_flight)
+
+
+def default_route_groups() -> List[RouteGroup]:
+    """The route groups and limits configured in settings, most specific first."""
+    return [
+        # Sign-in and registration run bcrypt
+        RouteGroup(
+            "auth", frozenset({"POST"}), ("/api/auth/",),
+            settings.RATE_LIMIT_AUTH_PER_MINUTE, settings.RATE_LIMIT_AUTH_BURST, settings.MAX_IN_FLIGHT_AUTH,
+        ),
+        # Order listings and exports can read every order
+        RouteGroup(
+            "order_reads", frozenset({"GET"}), ("/api/orders",),
+            settings.RATE_LIMIT_ORDER_READS_PER_MINUTE, settings.RATE_LIMIT_ORDER_READS_BURST,
+            settings.MAX_IN_FLIGHT_ORDER_READS,
+        ),
+        RouteGroup(
+            "default", frozenset(), ("/api/",),
+            settings.RATE_LIMIT_DEFAULT_PER_MINUTE, settings.RATE_LIMIT_DEFAULT_BURST, settings.MAX_IN_FLIGHT_DEFAULT,
+        ),
+    ]
+
+
+def load_backend(path: str) -> AdmissionBackend:
+    """Instantiates the backend class named by "module:ClassName", or the in-memory one if empty."""
+    if not path:
+        return MemoryAdmissionBackend()
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class AdmissionController:
+    """Decides whether a request may run, by its route group and client."""
+
+    def __init__(self, groups: List[RouteGroup], backend: AdmissionBackend):
+        self.groups = groups
+        self.backend = backend
+
+    def match(self, method: str, path: str) -> Optional[RouteGroup]:
+        for group in self.groups:
+            if (not group.methods or method in group.methods) and path.startswith(group.path_prefixes):
+                return group
+        return None
+
+
+def request_subject(scope: Scope) -> str:
+    """The client to rate-limit: the verified JWT subject if a bearer token was sent, else the client IP."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    subject = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+                except JWTError:
+                    subject = None
+                if subject:
+                    return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:"
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail}, status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionControlMiddleware:
+    """
+    Rejects requests over their route group's limits before they reach the endpoints:
+    429 when the client's token bucket is empty, 503 when the group already has
+    max_in_flight requests running. Both carry Retry-After. Uses the module-level
+    admission_controller, and does nothing when ADMISSION_CONTROL is off.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.ADMISSION_CONTROL or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        controller = admission_controller
+        group = controller.match(scope["method"], scope["path"])
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        if group.rate_per_minute > 0:
+            wait = await controller.backend.take_token(
+                f"{group.name}:{request_subject(scope)}", group.rate_per_minute / 60, group.burst
+            )
+            if wait > 0:
+                response = _reject(429, "Too many requests. Please slow down.", wait)
+                await response(scope, receive, send)
+                return
+
+        if group.max_in_flight <= 0:
+            await self.app(scope, receive, send)
+            return
+        if not await controller.backend.acquire_slot(group.name, group.max_in_flight):
+            response = _reject(503, "The server is busy. Please retry shortly.", 1)
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await controller.backend.release_slot(group.name)
+
+
+admission_controller = AdmissionController(default_route_groups(), load_backend(settings.ADMISSION_BACKEND))
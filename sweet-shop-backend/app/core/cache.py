@@ -0,0 +1,160 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+
+
+class CatalogCache:
+    """
+    In-process cache for the serialized GET /sweets response.
+
+    Holds the JSON bytes of the full catalog together with a strong ETag and the
+    catalog marker (see db/catalog.py) it was built from. Every write to the sweets
+    table in this process calls invalidate(), which bumps the version so a response
+    built from data read before the write is never stored.
+
+    Each worker process keeps its own copy, and writes made by other workers (or the
+    reservation sweeper) are noticed through the marker: get() only serves an entry
+    for `revalidate_seconds` after it was last checked with revalidate(), and never
+    once it is `max_age_seconds` old, which bounds staleness even if a change slips
+    past the marker (e.g. a transaction committing after a newer one).
+    """
+
+    def __init__(self, revalidate_seconds: float, max_age_seconds: float):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entry: Optional[Tuple[bytes, str, Any, float]] = None  # (body, etag, marker, built at)
+        self._checked_at = 0.0
+        self.revalidate_seconds = revalidate_seconds
+        self.max_age_seconds = max_age_seconds
+
+    @property
+    def version(self) -> int:
+        """The current catalog version. Read it before querying the database."""
+        return self._version
+
+    def get(self) -> Optional[Tuple[bytes, str]]:
+        """Returns the cached (body, etag) pair if it was checked recently, or None if it needs a revalidate()."""
+        entry = self._entry
+        now = time.monotonic()
+        if entry is None or now - self._checked_at >= self.revalidate_seconds or now - entry[3] >= self.max_age_seconds:
+            return None
+        return entry[0], entry[1]
+
+    def revalidate(self, marker: Any) -> Optional[Tuple[bytes, str]]:
+        """
+        Returns the cached (body, etag) pair if it was built from the catalog as of
+        `marker` (the database's current marker) and resets its check interval.
+        Otherwise drops the entry and returns None.
+        """
+        with self._lock:
+            entry = self._entry
+            now = time.monotonic()
+            if entry is not None and entry[2] == marker and now - entry[3] < self.max_age_seconds:
+                self._checked_at = now
+                return entry[0], entry[1]
+            self._entry = None
+            return None
+
+    def store(self, version: int, marker: Any, body: bytes) -> Tuple[bytes, str]:
+        """
+        Caches the body built from the catalog as of `version` and `marker` and returns
+        (body, etag). The body is not cached if the catalog changed while it was being built.
+        """
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        with self._lock:
+            if version == self._version:
+                now = time.monotonic()
+                self._entry = (body, etag, marker, now)
+                self._checked_at = now
+        return body, etag
+
+    def invalidate(self) -> None:
+        """Drops the cached catalog. Call after committing any change to sweets."""
+        with self._lock:
+            self._version += 1
+            self._entry = None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header value against an ETag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in candidates
+
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of authenticated principals keyed by token subject (email).
+
+    Each worker process keeps its own copy, so only regular users are cached (see
+    get_current_user): revoking admin rights must not wait for other workers'
+    entries to expire. Entries expire after `ttl_seconds`, which bounds how long a
+    change made elsewhere (another worker, or outside the API) goes unnoticed.
+    Changes made through the API must call invalidate() so they take effect on the
+    user's next request in this process.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[Any]:
+        """Returns the cached principal for a token subject, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, subject: str, principal: Any) -> None:
+        """Caches a principal, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        """Drops one user's cached principal. Call after changing their admin or active flags."""
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        """Drops every cached principal and resets the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns size, hit/miss counts and hit rate for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+catalog_cache = CatalogCache(settings.CATALOG_CACHE_REVALIDATE_SECONDS, settings.CATALOG_CACHE_MAX_AGE_SECONDS)
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .config import settings
+
+# NOTE: This module is imported by the hashing worker processes, so it must stay
+# light: no FastAPI, database or model imports.
+
+
+@lru_cache(maxsize=None)
+def get_crypt_context(rounds: int) -> CryptContext:
+    """Returns a bcrypt CryptContext for the given cost. Hashes with any other cost need updating."""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def hash_password(password: str, rounds: int) -> str:
+    """Hashes a password with bcrypt at the given cost. Runs inside a worker process."""
+    return get_crypt_context(rounds).hash(password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies a password. Runs inside a worker process.
+    Returns (valid, new_hash), where new_hash is set when the stored hash used a different cost.
+    """
+    return get_crypt_context(rounds).verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashing jobs are already queued."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, bounded process pool so hashing never holds an
+    event-loop thread or the GIL of the API process.
+
+    At most `max_pending` jobs may be queued or running at once. Further calls fail
+    fast with PasswordHasherBusy instead of queueing without limit (back-pressure).
+    With workers=0, jobs run on the default thread pool instead of separate processes.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.workers > 0 and self._executor is None:
+            # "spawn" keeps the workers free of state forked from the running event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hashes a password at the configured cost."""
+        return await self._submit(hash_password, password, self.rounds)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verifies a password and returns a replacement hash if the configured cost has changed."""
+        return await self._submit(verify_and_update_password, plain_password, hashed_password, self.rounds)
+
+    def shutdown(self) -> None:
+        """Stops the worker processes. Called on application shutdown."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+)
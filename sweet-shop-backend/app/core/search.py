@@ -0,0 +1,379 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Relative weight of a term by the field it appears in
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+
+# How much a query term contributes depending on how it matched an indexed term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+TYPO_MATCH = 0.5
+
+MIN_PREFIX_LENGTH = 2   # Shorter query terms only match exactly
+MIN_TYPO_LENGTH = 4     # Shorter query terms are not corrected
+MAX_EXPANSIONS = 50     # Cap on indexed terms one query term may expand to
+
+# Bounds on the work one multi-term query may do while holding the index lock
+MAX_QUERY_TERMS = 5               # Further query terms are ignored
+MAX_MULTI_TERM_EXPANSIONS = 8     # Best matches kept per query term (exact, then prefix, then typo)
+MAX_LEVEL_COMBINATIONS = 256      # Score-level combinations walked before falling back to candidate scoring
+MAX_POSTINGS_VISITED = 100_000    # Sweet IDs intersected during the walk before falling back
+MAX_SCORED_CANDIDATES = 5_000     # Sweets scored one by one in the fallback
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cases, strips accents and splits text into alphanumeric tokens."""
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return _TOKEN_RE.findall(normalized)
+
+
+def _deletes(term: str) -> Set[str]:
+    """All variants of a term with one character removed (symmetric-delete typo lookup)."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by one insertion, deletion, substitution or adjacent transposition."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (
+            i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+        )
+    return a[i:] == b[i + 1:]
+
+
+class CatalogSearchIndex:
+    """
+    In-memory inverted index over Sweet.name, category and description.
+
+    Queries match every query term against the index exactly, by prefix, or with
+    one typo, and rank sweets by the summed, field-weighted match scores. Each worker
+    process holds its own copy. The sweet endpoints update it on every write made in
+    this process, and sync_search_index (db/catalog.py) picks up writes made by other
+    workers by comparing `marker` with the database's catalog marker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = {}  # term -> {sweet_id: field-weighted score}
+        self._doc_terms: Dict[int, Set[str]] = {}         # sweet_id -> indexed terms (for removal)
+        self._sorted_terms: List[str] = []                # vocabulary, sorted for prefix lookups
+        self._delete_map: Dict[str, Set[str]] = {}        # one-delete variant -> vocabulary terms
+        self._ranked: Dict[str, List[Tuple[float, int]]] = {}  # term -> postings sorted best first (lazy)
+        self._levels: Dict[str, List[Tuple[float, frozenset]]] = {}  # term -> sweet IDs grouped by score, best first (lazy)
+        self.marker: Optional[tuple] = None  # Catalog marker the index was last synced to; None = never synced
+        self._checked_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def doc_ids(self) -> Set[int]:
+        with self._lock:
+            return set(self._doc_terms)
+
+    def claim_check(self, interval_seconds: float) -> bool:
+        """
+        True if the index is due to be checked against the database, i.e. it was last
+        checked over `interval_seconds` ago. Records the check, so concurrent requests
+        don't all run it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < interval_seconds:
+                return False
+            self._checked_at = now
+            return True
+
+    # --- Maintenance ---
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._sorted_terms.clear()
+            self._delete_map.clear()
+            self._ranked.clear()
+            self._levels.clear()
+            self.marker = None
+            self._checked_at = float("-inf")
+
+    def rebuild(self, sweets: Iterable) -> None:
+        """Replaces the index contents with the given sweets."""
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._delete_map.clear()
+            self._ranked.clear()
+            self._levels.clear()
+            self._sorted_terms = []
+            for sweet in sweets:
+                self._index(sweet, keep_sorted=False)
+            self._sorted_terms = sorted(self._postings)
+
+    def add(self, sweet) -> None:
+        """Indexes a new sweet or re-indexes an updated one."""
+        with self._lock:
+            self._unindex(sweet.id)
+            self._index(sweet, keep_sorted=True)
+
+    def remove(self, sweet_id: int) -> None:
+        with self._lock:
+            self._unindex(sweet_id)
+
+    def _index(self, sweet, keep_sorted: bool) -> None:
+        scores: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(getattr(sweet, field)):
+                scores[term] = scores.get(term, 0.0) + weight
+
+        for term, score in scores.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self._sorted_terms, term)
+                for variant in _deletes(term):
+                    self._delete_map.setdefault(variant, set()).add(term)
+            postings[sweet.id] = score
+            self._ranked.pop(term, None)
+            self._levels.pop(term, None)
+        self._doc_terms[sweet.id] = set(scores)
+
+    def _unindex(self, sweet_id: int) -> None:
+        for term in self._doc_terms.pop(sweet_id, ()):
+            postings = self._postings[term]
+            del postings[sweet_id]
+            self._ranked.pop(term, None)
+            self._levels.pop(term, None)
+            if postings:
+                continue
+            # Last sweet using this term: drop it from the vocabulary
+            del self._postings[term]
+            del self._sorted_terms[bisect.bisect_left(self._sorted_terms, term)]
+            for variant in _deletes(term):
+                terms = self._delete_map[variant]
+                terms.discard(term)
+                if not terms:
+                    del self._delete_map[variant]
+
+    # --- Querying ---
+
+    def _expand(self, query_term: str) -> Dict[str, float]:
+        """Maps a query term to the indexed terms it matches and the weight of each match."""
+        matches: Dict[str, float] = {}
+        if query_term in self._postings:
+            matches[query_term] = EXACT_MATCH
+
+        if len(query_term) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self._sorted_terms, query_term)
+            for term in self._sorted_terms[start:start + MAX_EXPANSIONS]:
+                if not term.startswith(query_term):
+                    break
+                matches.setdefault(term, PREFIX_MATCH)
+
+        if len(query_term) >= MIN_TYPO_LENGTH:
+            candidates = set(self._delete_map.get(query_term, ()))
+            for variant in _deletes(query_term):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._delete_map.get(variant, ()))
+            for term in candidates:
+                if term not in matches and _within_one_edit(query_term, term):
+                    matches[term] = TYPO_MATCH
+        return matches
+
+    def _ranked_postings(self, term: str) -> List[Tuple[float, int]]:
+        """A term's postings as (-score, sweet_id), best first. Built lazily and dropped when the term changes."""
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            ranked = self._ranked[term] = sorted((-score, doc) for doc, score in self._postings[term].items())
+        return ranked
+
+    def _score_levels(self, term: str) -> List[Tuple[float, frozenset]]:
+        """A term's postings grouped into (score, sweet IDs), best first. Built lazily and dropped when the term changes."""
+        levels = self._levels.get(term)
+        if levels is None:
+            by_score: Dict[float, List[int]] = {}
+            for doc, score in self._postings[term].items():
+                by_score.setdefault(score, []).append(doc)
+            levels = self._levels[term] = [
+                (score, frozenset(docs)) for score, docs in sorted(by_score.items(), reverse=True)
+            ]
+        return levels
+
+    def _top_single_term(self, expansions: Dict[str, float], limit: int) -> List[Tuple[int, float]]:
+        """
+        Top matches for a one-term query, read off the pre-sorted postings of each
+        expansion. A sweet's first appearance in the merged stream is its best score,
+        so only about `limit` postings are visited regardless of catalog size.
+        """
+        def weighted(term: str, match_weight: float):
+            for neg_score, doc in self._ranked_postings(term):
+                yield neg_score * match_weight, doc
+
+        streams = [weighted(term, match_weight) for term, match_weight in expansions.items()]
+        results: List[Tuple[int, float]] = []
+        seen: Set[int] = set()
+        for neg_score, doc in heapq.merge(*streams):
+            if doc in seen:
+                continue
+            seen.add(doc)
+            results.append((doc, -neg_score))
+            if len(results) == limit:
+                break
+        return results
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """Returns up to `limit` (sweet_id, score) pairs matching every query term, best first."""
+        query_terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not query_terms:
+            return []
+
+        with self._lock:
+            per_term = []
+            for query_term in query_terms:
+                expansions = self._expand(query_term)
+                if not expansions:
+                    return []
+                per_term.append(expansions)
+
+            if len(per_term) == 1:
+                return self._top_single_term(per_term[0], limit)
+
+            # Each query term multiplies the combinations to walk: keep only its best matches
+            per_term = [
+                dict(sorted(expansions.items(), key=lambda item: -item[1])[:MAX_MULTI_TERM_EXPANSIONS])
+                for expansions in per_term
+            ]
+            results = self._top_multi_term(per_term, limit)
+            if results is None:
+                results = self._score_candidates(per_term, limit)
+            return results
+
+    def _top_multi_term(self, per_term: List[Dict[str, float]], limit: int) -> Optional[List[Tuple[int, float]]]:
+        """
+        Top matches for a multi-term query. Each query term contributes a list of
+        (weighted score, sweet IDs) levels, best first. Level combinations are visited
+        in descending order of their summed score and each one costs a single C-level
+        set intersection (smallest set first). A sweet's first appearance is its best
+        score, so the walk stops as soon as no unvisited combination can beat or tie
+        the `limit`-th result; only the few top levels are usually touched.
+
+        When the terms share few sweets the walk may never reach `limit` results, so it
+        gives up (returns None) after MAX_LEVEL_COMBINATIONS combinations or
+        MAX_POSTINGS_VISITED intersected IDs and the caller scores candidates instead.
+        """
+        term_levels = []
+        for expansions in per_term:
+            levels = [
+                (score * match_weight, docs)
+                for term, match_weight in expansions.items()
+                for score, docs in self._score_levels(term)
+            ]
+            levels.sort(key=lambda level: level[0], reverse=True)
+            term_levels.append(levels)
+
+        def total(combination: Tuple[int, ...]) -> float:
+            return sum(levels[i][0] for levels, i in zip(term_levels, combination))
+
+        start = (0,) * len(term_levels)
+        frontier = [(-total(start), start)]
+        queued = {start}
+        groups: List[Tuple[float, Set[int]]] = []  # (total, sweets first seen at that total), best first
+        seen: Set[int] = set()
+        found = 0
+        kth_total: Optional[float] = None  # Total at which `limit` sweets were found; lower totals can't rank
+        combinations = visited = 0
+        while frontier:
+            neg_total, combination = heapq.heappop(frontier)
+            if kth_total is not None and -neg_total < kth_total:
+                break
+            sets = sorted((levels[i][1] for levels, i in zip(term_levels, combination)), key=len)
+            combinations += 1
+            visited += len(sets[0])
+            if combinations > MAX_LEVEL_COMBINATIONS or visited > MAX_POSTINGS_VISITED:
+                return None
+            new = sets[0].intersection(*sets[1:]).difference(seen)
+            if new:
+                seen |= new
+                if groups and groups[-1][0] == -neg_total:
+                    groups[-1][1].update(new)
+                else:
+                    groups.append((-neg_total, set(new)))
+                found += len(new)
+                if kth_total is None and found >= limit:
+                    kth_total = -neg_total
+            for position, levels in enumerate(term_levels):
+                if combination[position] + 1 < len(levels):
+                    successor = combination[:position] + (combination[position] + 1,) + combination[position + 1:]
+                    if successor not in queued:
+                        queued.add(successor)
+                        heapq.heappush(frontier, (-total(successor), successor))
+
+        # Sweets with equal totals rank by ID
+        results: List[Tuple[int, float]] = []
+        for group_total, docs in groups:
+            results.extend((doc, group_total) for doc in sorted(docs)[:limit - len(results)])
+            if len(results) == limit:
+                break
+        return results
+
+    def _score_candidates(self, per_term: List[Dict[str, float]], limit: int) -> List[Tuple[int, float]]:
+        """
+        Fallback for multi-term queries the level walk gave up on. Starts from the sweets
+        matching the query term with the fewest postings, narrows them to the sweets
+        matching every other term (C-level intersections, each bounded by the candidate
+        count) and scores the survivors one by one. At most MAX_SCORED_CANDIDATES sweets
+        (the lowest IDs) are scored, so a query matching more is ranked among those only.
+        """
+        def posting_count(expansions: Dict[str, float]) -> int:
+            return sum(len(self._postings[term]) for term in expansions)
+
+        def matching(expansions: Dict[str, float], docs: frozenset) -> Iterable[Tuple[int, float]]:
+            """(sweet ID, weighted score) for each of `docs` an expansion matches, one C-level intersection per score level."""
+            for term, match_weight in expansions.items():
+                for score, level in self._score_levels(term):
+                    for doc in docs.intersection(level):
+                        yield doc, score * match_weight
+
+        by_size = sorted(per_term, key=posting_count)
+        candidates = frozenset().union(*(self._postings[term] for term in by_size[0]))
+        for expansions in by_size[1:]:
+            candidates = frozenset().union(*(
+                candidates.intersection(level)
+                for term in expansions
+                for _, level in self._score_levels(term)
+            ))
+            if not candidates:
+                return []
+        if len(candidates) > MAX_SCORED_CANDIDATES:
+            candidates = frozenset(sorted(candidates)[:MAX_SCORED_CANDIDATES])
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for expansions in per_term:
+            best: Dict[int, float] = {}
+            for doc, score in matching(expansions, candidates):
+                if score > best.get(doc, 0.0):
+                    best[doc] = score
+            for doc, score in best.items():
+                scores[doc] += score
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+search_index = CatalogSearchIndex()
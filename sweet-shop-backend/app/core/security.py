@@ -1,8 +1,8 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone 
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt, JWTError 
-from sqlalchemy.orm import Session 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # REQUIRED IMPORTS FOR AUTH DEPENDENCIES
 from fastapi import Depends, HTTPException, status
@@ -10,23 +10,50 @@ from fastapi.security import OAuth2PasswordBearer
 # End of new imports
 
 from .config import settings
+from .hashing import PasswordHasherBusy, get_crypt_context, hash_password, password_hasher
+from .cache import principal_cache
+from ..schemas.user import User as UserSchema
 # Import your database and model dependencies (these should exist in your project structure)
 from ..db.database import get_db
 # Note: Since the User model is imported locally in get_user_by_email, 
 # we don't need a top-level import here, which helps avoid circular imports.
 # from ..db.models import User # (Keep this commented out)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # --- 1. Password Hashing/Verification ---
+# bcrypt runs on the bounded process pool in app/core/hashing.py. The async helpers
+# are used by the endpoints; the sync ones are kept for scripts and tests.
 
 def get_password_hash(password: str) -> str:
     """Hashes a password."""
-    return pwd_context.hash(password)
+    return hash_password(password, settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against a hashed one."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_crypt_context(settings.BCRYPT_ROUNDS).verify(plain_password, hashed_password)
+
+def _hasher_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests in progress. Please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+async def get_password_hash_async(password: str) -> str:
+    """Hashes a password on the hashing pool. Raises 503 when the pool is saturated."""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy_exception()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies a password on the hashing pool. Raises 503 when the pool is saturated.
+    Returns (valid, new_hash); new_hash is set when the hash should be upgraded to the configured cost.
+    """
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy_exception()
 
 # --- 2. Token Creation ---
 
@@ -47,17 +74,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
-def get_user_by_email(db: Session, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Utility function to retrieve a user by email."""
     # Local import is safer here to prevent issues with module loading order
     from app.db.models import User as UserModel # <-- Use an alias for clarity
-    return db.query(UserModel).filter(UserModel.email == email).first()
+    return await db.scalar(select(UserModel).where(UserModel.email == email))
 
-def get_current_user(
-    db: Session = Depends(get_db), 
+async def get_current_user(
+    db: AsyncSession = Depends(get_db), 
     token: str = Depends(oauth2_scheme)
 ):
-    """Retrieves the user associated with the access token by decoding the JWT."""
+    """
+    Retrieves the user associated with the access token by decoding the JWT.
+    Returns a cached principal (id, email, is_admin, is_active) when available,
+    so most authenticated requests skip the users lookup. Admin principals are
+    never cached: a demoted or deactivated admin loses their rights on the next
+    request in every worker, not once a per-process cache entry expires.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -73,12 +106,21 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
-    return user
-
-def get_current_active_user(current_user: get_current_user = Depends(get_current_user)):
+    principal = principal_cache.get(email)
+    if principal is None:
+        user = await get_user_by_email(db, email=email)
+        if user is None:
+            raise credentials_exception
+        principal = UserSchema.model_validate(user)
+        # End the lookup's read-only transaction so its connection goes back to the
+        # pool. Read endpoints do their work on a second (replica) session, and a
+        # request must not hold two connections at once.
+        await db.rollback()
+        if not principal.is_admin:
+            principal_cache.put(email, principal)
+    return principal
+
+async def get_current_active_user(current_user: get_current_user = Depends(get_current_user)):
     """Ensures the user retrieved by the token is active."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -86,7 +128,7 @@ def get_current_active_user(current_user: get_current_user = Depends(get_current
 
 # --- 4. NEW FUNCTION TO RESOLVE THE IMPORT ERROR ---
 
-def get_current_admin_user(current_user: get_current_user = Depends(get_current_active_user)):
+async def get_current_admin_user(current_user: get_current_user = Depends(get_current_active_user)):
     """
     Dependency that verifies the token, finds the active user, 
     and checks if the user has admin privileges.
@@ -0,0 +1,66 @@
+from datetime import UTC, datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from ..core.config import settings
+from ..core.search import CatalogSearchIndex
+
+# (number of sweets, latest Sweet.updated_at)
+CatalogMarker = Tuple[int, Optional[datetime]]
+
+# The columns the search index reads
+SEARCH_COLUMNS = (models.Sweet.id, models.Sweet.name, models.Sweet.category, models.Sweet.description)
+
+
+async def catalog_marker(db: AsyncSession) -> CatalogMarker:
+    """
+    A cheap fingerprint of the sweets table that every worker reads from the database.
+    Inserts and updates move the latest updated_at; deletes change the count. Each
+    worker compares it with the marker its in-process copies were built from, so a
+    write made by another worker is noticed without any cross-process messaging.
+    """
+    count, latest = (await db.execute(
+        select(func.count(models.Sweet.id), func.max(models.Sweet.updated_at))
+    )).one()
+    return count, latest
+
+
+async def sync_search_index(db: AsyncSession, index: CatalogSearchIndex) -> None:
+    """
+    Brings a worker's search index up to date with writes made by other workers.
+
+    Runs at most every SEARCH_INDEX_REFRESH_SECONDS. The first sync builds the whole
+    index; later ones re-index only the sweets updated since the previous marker
+    (minus SEARCH_INDEX_OVERLAP_SECONDS, for transactions that commit out of
+    timestamp order) and reconcile the sweet IDs when the count disagrees, which is
+    how deletes are noticed. Rebuilding 100k sweets takes seconds, so a request
+    never does more than that incremental pass once the index exists.
+    """
+    if not index.claim_check(settings.SEARCH_INDEX_REFRESH_SECONDS):
+        return
+    marker = await catalog_marker(db)
+    previous = index.marker
+    if previous is None or previous[1] is None:
+        index.rebuild((await db.execute(select(*SEARCH_COLUMNS))).all())
+        index.marker = marker
+        return
+
+    count, latest = marker
+    overlap = timedelta(seconds=settings.SEARCH_INDEX_OVERLAP_SECONDS)
+    if marker == previous and (latest is None or latest.replace(tzinfo=UTC) < datetime.now(UTC) - overlap):
+        return  # Nothing changed, and no write is recent enough to still be committing out of order
+
+    for sweet in await db.execute(select(*SEARCH_COLUMNS).where(models.Sweet.updated_at >= previous[1] - overlap)):
+        index.add(sweet)
+    if len(index) != count:
+        stored = set(await db.scalars(select(models.Sweet.id)))
+        indexed = index.doc_ids()
+        for sweet_id in indexed - stored:
+            index.remove(sweet_id)
+        if stored - indexed:
+            for sweet in await db.execute(select(*SEARCH_COLUMNS).where(models.Sweet.id.in_(stored - indexed))):
+                index.add(sweet)
+    index.marker = marker
@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import logging
+from typing import Awaitable, Callable, Generic, List, Optional, Tuple, TypeVar, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Writes one batch in the given session without committing. Returns one entry per
+# payload: its result, or the exception to raise to that payload's caller.
+BatchHandler = Callable[[AsyncSession, List[T]], Awaitable[List[Union[R, Exception]]]]
+
+
+class GroupCommitter(Generic[T, R]):
+    """
+    Commits many callers' writes in one transaction (group commit).
+
+    Callers submit a payload and wait for its result. A single writer task collects
+    payloads for up to `max_wait_seconds` or until `max_batch_size` are queued, runs
+    `handler` on the whole batch and commits once, so one fsync covers the batch.
+    If the batch fails as a whole, each payload is retried in a transaction of its
+    own, so a bad payload only fails its own caller.
+
+    The writer task starts with the first submit on the running event loop.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        handler: BatchHandler,
+        max_batch_size: int = 100,
+        max_wait_seconds: float = 0.005,
+    ):
+        self.session_factory = session_factory
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, payload: T) -> R:
+        """Queues the payload and returns its result once its batch has committed."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            # Run the writer in a fresh context so it does not inherit the first
+            # caller's per-request state (e.g. its metrics query counter)
+            self._task = loop.create_task(self._run(self._queue), context=contextvars.Context())
+        future = loop.create_future()
+        self._queue.put_nowait((payload, future))
+        return await future
+
+    def stop(self) -> None:
+        """Cancels the writer task. Payloads still queued fail with CancelledError."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
+            self._queue = None
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            async with self.session_factory() as db:
+                results = await self.handler(db, [payload for payload, _ in batch])
+                await db.commit()
+        except Exception as exc:
+            if len(batch) > 1:
+                logger.warning("Group commit of %d payloads failed; retrying them one by one", len(batch), exc_info=True)
+                for entry in batch:
+                    await self._commit([entry])
+                return
+            results = [exc]
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # The caller went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PENDING = "Pending"
+COMPLETED = "Completed"
+
+# Expired keys deleted per purge transaction
+PURGE_BATCH_SIZE = 1000
+
+# A stored response: (status code, body)
+StoredResponse = Tuple[int, bytes]
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The key was already used with a different request body."""
+
+
+class IdempotencyKeyInProgress(Exception):
+    """The first request with this key was still running when the wait ran out."""
+
+
+def request_fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _key_filter(owner_id: int, key: str):
+    return and_(models.IdempotencyKey.owner_id == owner_id, models.IdempotencyKey.key == key)
+
+
+async def claim_idempotency_key(
+    db: AsyncSession, owner_id: int, key: str, fingerprint: str
+) -> Optional[StoredResponse]:
+    """
+    Claims the key for this request and returns None; the caller then runs the request
+    and calls complete_idempotency_key in the same transaction, or release_idempotency_key
+    if it fails. If the key was already used, returns the stored response instead,
+    waiting up to IDEMPOTENCY_WAIT_SECONDS while the first request is still running.
+
+    The claim is committed at once so concurrent duplicates can see it.
+    Raises IdempotencyKeyMismatch or IdempotencyKeyInProgress.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        now = models.utc_now()
+        claim = {
+            "request_hash": fingerprint,
+            "status": PENDING,
+            "locked_until": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+            "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        }
+        try:
+            await db.execute(insert(models.IdempotencyKey).values(owner_id=owner_id, key=key, created_at=now, **claim))
+            await db.commit()
+            return None
+        except IntegrityError:
+            await db.rollback()
+
+        # Take over a key that has expired or whose first request was abandoned
+        result = await db.execute(
+            update(models.IdempotencyKey)
+            .where(
+                _key_filter(owner_id, key),
+                or_(
+                    models.IdempotencyKey.expires_at <= now,
+                    and_(models.IdempotencyKey.status == PENDING, models.IdempotencyKey.locked_until <= now),
+                ),
+            )
+            .values(created_at=now, response_status=None, response_body=None, **claim)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            await db.commit()
+            return None
+
+        row = (await db.execute(
+            select(
+                models.IdempotencyKey.request_hash,
+                models.IdempotencyKey.status,
+                models.IdempotencyKey.response_status,
+                models.IdempotencyKey.response_body,
+            ).where(_key_filter(owner_id, key))
+        )).one_or_none()
+        # End the transaction so the next poll sees the first request's commit
+        await db.rollback()
+
+        if row is None:
+            continue  # Released by a failed first request; claim it again
+        if row.request_hash != fingerprint:
+            raise IdempotencyKeyMismatch(key)
+        if row.status == COMPLETED:
+            return row.response_status, row.response_body
+        if time.monotonic() >= deadline:
+            raise IdempotencyKeyInProgress(key)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+async def complete_idempotency_key(db: AsyncSession, owner_id: int, key: str, response: StoredResponse) -> None:
+    """Stores the response for replay. Runs in the caller's transaction, so it commits with the request's writes."""
+    status_code, body = response
+    await db.execute(
+        update(models.IdempotencyKey)
+        .where(_key_filter(owner_id, key))
+        .values(status=COMPLETED, response_status=status_code, response_body=body, locked_until=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def release_idempotency_key(db: AsyncSession, owner_id: int, key: str) -> None:
+    """Rolls back a failed request and frees its key, so a retry runs the request again."""
+    await db.rollback()
+    await db.execute(
+        delete(models.IdempotencyKey)
+        .where(_key_filter(owner_id, key), models.IdempotencyKey.status == PENDING)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def purge_expired_idempotency_keys(db: AsyncSession, now: datetime, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Deletes up to `batch_size` expired keys and returns how many were deleted. The caller commits."""
+    expired_ids = list(await db.scalars(
+        select(models.IdempotencyKey.id)
+        .where(models.IdempotencyKey.expires_at <= now)
+        .order_by(models.IdempotencyKey.expires_at)
+        .limit(batch_size)
+    ))
+    if expired_ids:
+        await db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.id.in_(expired_ids), models.IdempotencyKey.expires_at <= now)
+            .execution_options(synchronize_session=False)
+        )
+    return len(expired_ids)
+
+
+async def run_idempotency_key_purger(session_factory: async_sessionmaker, interval_seconds: float) -> None:
+    """Background task: every `interval_seconds`, deletes all expired idempotency keys."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with session_factory() as db:
+                while True:
+                    purged = await purge_expired_idempotency_keys(db, models.utc_now())
+                    await db.commit()
+                    if purged < PURGE_BATCH_SIZE:
+                        break
+        except Exception:
+            logger.exception("Idempotency key purge failed")
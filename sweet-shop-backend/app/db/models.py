@@ -1,9 +1,21 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Text 
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, Date, DateTime, Text, Index, LargeBinary 
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship 
 from sqlalchemy.sql import func
 from datetime import datetime, UTC 
 from .database import Base
 
+
+def utc_now() -> datetime:
+    """Column default: the current UTC time, evaluated when each row is written."""
+    return datetime.now(UTC)
+
+
+# Timestamps that keep microseconds on MySQL too (DATETIME defaults to whole seconds
+# there), so a row reads back with exactly the timestamps the API returned when writing it
+PreciseDateTime = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql", "mariadb")
+
+
 # --- User Model (Updated) ---
 class User(Base):
     __tablename__ = "users"
@@ -12,7 +24,7 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     
     # --- NEW: Add username field for display (Required for Order Admin View) ---
-    username = Column(String(50), unique=True, index=True, nullable=False)
+    username = Column(String(50), unique=True, index=True, nullable=True)
     # -------------------------------------------------------------------------
     
     hashed_password = Column(String, nullable=False)
@@ -23,7 +35,8 @@ class User(Base):
     # Using func.now() and DateTime without explicit timezone setting is fine for SQL default generation
     # if you are setting the timezone behavior in the database connection/config, 
     # but using Python's datetime.now(UTC) is safer for FastAPI default behavior.
-    registered_on = Column(DateTime, default=datetime.now(UTC))
+    # NOTE: Pass a callable so the timestamp is taken per row, not once at import time.
+    registered_on = Column(DateTime, default=utc_now)
     # ------------------------------------------------------------
     
     # Relationship for all the sweets this user/admin manages
@@ -44,6 +57,10 @@ class Sweet(Base):
     stock_quantity = Column(Integer, default=0) 
     is_available = Column(Boolean, default=True)
 
+    # Set on every insert and update (stock changes included). With the row count it
+    # forms the catalog change marker that other workers' caches revalidate against.
+    updated_at = Column(PreciseDateTime, default=utc_now, onupdate=utc_now, nullable=False, index=True)
+
     # Link to the User/Admin who manages this sweet
     owner_id = Column(Integer, ForeignKey("users.id")) 
     
@@ -53,6 +70,17 @@ class Sweet(Base):
     # NEW: Relationship to track which order items reference this sweet
     order_items = relationship("OrderItem", back_populates="sweet")
 
+    # Composite indexes backing the filtered, sorted and keyset-paginated GET /sweets:
+    # each sort key (with id as tie-breaker), alone and behind the category filter.
+    # Sorting by name alone uses the unique index on name.
+    __table_args__ = (
+        Index("ix_sweets_price_id", "price", "id"),
+        Index("ix_sweets_stock_quantity_id", "stock_quantity", "id"),
+        Index("ix_sweets_category_price_id", "category", "price", "id"),
+        Index("ix_sweets_category_name_id", "category", "name", "id"),
+        Index("ix_sweets_category_stock_quantity_id", "category", "stock_quantity", "id"),
+    )
+
 # --- NEW: Order Model ---
 class Order(Base):
     __tablename__ = "orders"
@@ -66,8 +94,8 @@ class Order(Base):
     total_price = Column(Float, nullable=False)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.now(UTC))
-    updated_at = Column(DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC))
+    created_at = Column(PreciseDateTime, default=utc_now, nullable=False)
+    updated_at = Column(PreciseDateTime, default=utc_now, onupdate=utc_now)
     
     # Foreign Key to link to the User who placed the order
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -76,6 +104,14 @@ class Order(Base):
     owner = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    # Composite indexes backing keyset pagination on (created_at, id) for GET /orders,
+    # alone and combined with the status and owner filters.
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_owner_id_created_at_id", "owner_id", "created_at", "id"),
+    )
+
 # --- NEW: OrderItem Model ---
 # This table stores the specific sweets, quantity, and the price at the time of purchase.
 class OrderItem(Base):
@@ -83,8 +119,8 @@ class OrderItem(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     
-    # Foreign Key to link to the specific order
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    # Foreign Key to link to the specific order (indexed: items are always looked up by order)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     
     # Foreign Key to link to the sweet product being ordered
     sweet_id = Column(Integer, ForeignKey("sweets.id"), nullable=False)
@@ -92,7 +128,104 @@ class OrderItem(Base):
     # Data captured at the time of purchase
     quantity = Column(Integer, nullable=False)
     price_at_purchase = Column(Float, nullable=False) 
+    # The sweet's category when sold, so the category sales rollups stay keyed on it
+    # if the sweet is recategorised later (NULL on items stored before this was recorded)
+    category = Column(String(50), nullable=True)
     
     # Relationships
     order = relationship("Order", back_populates="items")
-    sweet = relationship("Sweet", back_populates="order_items")
\ No newline at end of file
+    sweet = relationship("Sweet", back_populates="order_items")
+
+# --- NEW: Stock Reservations ---
+# A reservation holds stock for a customer's cart until it expires. The held
+# quantities are taken out of Sweet.stock_quantity when the reservation is made,
+# so checkout only has to consume the reservation. Released and expired
+# reservations give their quantities back.
+class Reservation(Base):
+    __tablename__ = "reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # "Active", "Consumed" (turned into an order), "Released" (by the customer) or "Expired"
+    status = Column(String(20), default="Active", nullable=False)
+
+    created_at = Column(PreciseDateTime, default=utc_now, nullable=False)
+    expires_at = Column(PreciseDateTime, nullable=False)
+    released_at = Column(PreciseDateTime, nullable=True)  # When the stock was given back
+    release_token = Column(String(32), nullable=True)     # Identifies the release call that gave it back
+
+    items = relationship("ReservationItem", back_populates="reservation", cascade="all, delete-orphan")
+
+    # The expiry sweeper looks up active reservations by expiry time
+    __table_args__ = (
+        Index("ix_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+
+class ReservationItem(Base):
+    __tablename__ = "reservation_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    reservation_id = Column(Integer, ForeignKey("reservations.id"), nullable=False, index=True)
+    sweet_id = Column(Integer, ForeignKey("sweets.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+
+    reservation = relationship("Reservation", back_populates="items")
+
+# --- NEW: Idempotency Keys ---
+# One row per (customer, Idempotency-Key) sent to POST /orders. The row is claimed
+# before the order runs and gets the response in the order's own transaction, so a
+# retried request replays the stored response instead of placing a second order.
+# Rows expire after IDEMPOTENCY_KEY_TTL_SECONDS and are purged in the background.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # SHA-256 of the request body
+
+    # "Pending" while the first request runs, then "Completed"
+    status = Column(String(20), default="Pending", nullable=False)
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary(16 * 1024 * 1024), nullable=True)
+
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+    locked_until = Column(DateTime, nullable=True)  # A pending claim older than this was abandoned
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_owner_id_key", "owner_id", "key", unique=True),
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+# --- NEW: Daily Sales Rollups ---
+# Pre-aggregated sales, updated in the same transaction as order creation and
+# status changes (cancelled orders are subtracted again), so reporting reads
+# a few rows per day instead of scanning order_items. Days are UTC order dates.
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class DailySweetSales(Base):
+    __tablename__ = "daily_sweet_sales"
+
+    day = Column(Date, primary_key=True)
+    sweet_id = Column(Integer, ForeignKey("sweets.id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class DailyCategorySales(Base):
+    __tablename__ = "daily_category_sales"
+
+    day = Column(Date, primary_key=True)
+    category = Column(String(50), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+# Upper bounds (in milliseconds) of the checkout wait-time histogram buckets
+WAIT_BUCKETS_MS: List[float] = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class PoolWaitHistogram:
+    """Cumulative histogram of how long requests waited to check out a pooled connection."""
+
+    def __init__(self, buckets_ms: List[float] = WAIT_BUCKETS_MS):
+        self._lock = threading.Lock()
+        self.buckets_ms = list(buckets_ms)
+        self._counts = [0] * (len(self.buckets_ms) + 1)  # Last slot is +Inf
+        self._sum_ms = 0.0
+        self._timeouts = 0
+
+    def observe(self, wait_ms: float) -> None:
+        with self._lock:
+            for index, bound in enumerate(self.buckets_ms):
+                if wait_ms <= bound:
+                    self._counts[index] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum_ms += wait_ms
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._timeouts += 1
+
+    def snapshot(self) -> Dict:
+        """Returns cumulative bucket counts (Prometheus style), total count, sum and timeouts."""
+        with self._lock:
+            buckets = {}
+            running = 0
+            for bound, count in zip(self.buckets_ms + ["+Inf"], self._counts):
+                running += count
+                buckets[str(bound)] = running
+            return {
+                "buckets_ms": buckets,
+                "count": running,
+                "sum_ms": round(self._sum_ms, 3),
+                "timeouts": self._timeouts,
+            }
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_histogram = PoolWaitHistogram()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_histogram.record_timeout()
+            raise
+        self.wait_histogram.observe((time.perf_counter() - start) * 1000)
+        return connection
+
+    def recreate(self):
+        # Keep collecting into the same histogram when the pool is recreated (e.g. after dispose)
+        pool = super().recreate()
+        pool.wait_histogram = self.wait_histogram
+        return pool
+
+
+def pool_status(pool: Pool) -> Dict:
+    """Reports current pool occupancy and, when available, the checkout wait-time histogram."""
+    status = {"pool_class": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # QueuePool.overflow() counts up from -pool_size, so clamp to connections actually open beyond it
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    if hasattr(pool, "wait_histogram"):
+        status["checkout_wait"] = pool.wait_histogram.snapshot()
+    return status
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+from ..core.cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = "Active"
+CONSUMED = "Consumed"
+RELEASED = "Released"
+EXPIRED = "Expired"
+
+# Expired reservations reclaimed per sweeper transaction
+SWEEP_BATCH_SIZE = 1000
+
+
+async def return_stock(db: AsyncSession, quantities: Dict[int, int]) -> None:
+    """Adds quantities back to the given sweets with one relative CASE update."""
+    if not quantities:
+        return
+    increment = case(quantities, value=models.Sweet.id)
+    await db.execute(
+        update(models.Sweet)
+        .where(models.Sweet.id.in_(quantities))
+        .values(stock_quantity=models.Sweet.stock_quantity + increment)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def consume_reservation(
+    db: AsyncSession, reservation_id: int, owner_id: int, now: datetime
+) -> Optional[List[Tuple[int, int]]]:
+    """
+    Marks an active, unexpired reservation of the owner as consumed and returns its
+    (sweet_id, quantity) items, or None if there is no such reservation. The conditional
+    UPDATE makes this safe against a concurrent checkout, release or sweep.
+    """
+    result = await db.execute(
+        update(models.Reservation)
+        .where(
+            models.Reservation.id == reservation_id,
+            models.Reservation.owner_id == owner_id,
+            models.Reservation.status == ACTIVE,
+            models.Reservation.expires_at > now,
+        )
+        .values(status=CONSUMED)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return None
+    rows = await db.execute(
+        select(models.ReservationItem.sweet_id, models.ReservationItem.quantity)
+        .where(models.ReservationItem.reservation_id == reservation_id)
+        .order_by(models.ReservationItem.id)
+    )
+    return [tuple(row) for row in rows]
+
+
+async def release_reservations(db: AsyncSession, reservation_ids: List[int], new_status: str, now: datetime) -> List[int]:
+    """
+    Moves the still-active reservations among `reservation_ids` to `new_status` and gives
+    their stock back. Returns the IDs that were released; reservations consumed or
+    released concurrently are left alone. Runs in the caller's transaction.
+    """
+    if not reservation_ids:
+        return []
+    # A fresh token marks exactly the rows this call flipped, even if another
+    # sweeper or checkout touches the same reservations at the same time
+    token = uuid.uuid4().hex
+    await db.execute(
+        update(models.Reservation)
+        .where(models.Reservation.id.in_(reservation_ids), models.Reservation.status == ACTIVE)
+        .values(status=new_status, released_at=now, release_token=token)
+        .execution_options(synchronize_session=False)
+    )
+    released = list(await db.scalars(
+        select(models.Reservation.id)
+        .where(models.Reservation.id.in_(reservation_ids), models.Reservation.release_token == token)
+    ))
+    if released:
+        rows = await db.execute(
+            select(models.ReservationItem.sweet_id, func.sum(models.ReservationItem.quantity))
+            .where(models.ReservationItem.reservation_id.in_(released))
+            .group_by(models.ReservationItem.sweet_id)
+        )
+        await return_stock(db, {sweet_id: quantity for sweet_id, quantity in rows})
+    return released
+
+
+async def sweep_expired_reservations(db: AsyncSession, now: datetime, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """
+    Releases up to `batch_size` expired reservations in bulk and returns how many were
+    released. Rows locked by another sweeper are skipped (FOR UPDATE SKIP LOCKED on MySQL).
+    The caller commits.
+    """
+    expired_ids = list(await db.scalars(
+        select(models.Reservation.id)
+        .where(models.Reservation.status == ACTIVE, models.Reservation.expires_at <= now)
+        .order_by(models.Reservation.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ))
+    return len(await release_reservations(db, expired_ids, EXPIRED, now))
+
+
+async def run_reservation_sweeper(session_factory: async_sessionmaker, interval_seconds: float) -> None:
+    """Background task: every `interval_seconds`, reclaims the stock of all expired reservations."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with session_factory() as db:
+                while True:
+                    released = await sweep_expired_reservations(db, models.utc_now())
+                    await db.commit()
+                    if released:
+                        catalog_cache.invalidate()
+                    if released < SWEEP_BATCH_SIZE:
+                        break
+        except Exception:
+            logger.exception("Reservation sweep failed")
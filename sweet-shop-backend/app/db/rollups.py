@@ -0,0 +1,153 @@
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Table, delete, func, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Status whose orders do not count as sales
+CANCELLED = "Cancelled"
+# Rollup key used for sweets without a category
+UNCATEGORIZED = "Uncategorized"
+
+# One sold order line: (sweet_id, category, quantity, price_at_purchase)
+SaleLine = Tuple[int, Optional[str], int, float]
+
+# Databases whose upsert syntax the rollups know
+ROLLUP_DIALECTS = ("mysql", "mariadb", "sqlite")
+
+
+def check_rollup_support(dialect_name: str) -> None:
+    """
+    Fails application startup on a database the rollups cannot upsert into. Every
+    order updates them in its own transaction, so the app cannot take orders there.
+    """
+    if dialect_name not in ROLLUP_DIALECTS:
+        raise RuntimeError(
+            f"Sales rollups are not supported on the {dialect_name} database "
+            f"(supported: {', '.join(ROLLUP_DIALECTS)})."
+        )
+
+
+@lru_cache(maxsize=None)
+def _increment_upsert(dialect_name: str, table: Table):
+    """
+    An INSERT that adds to the counters of an existing rollup row instead of failing
+    on its key. The dialect was checked at startup (check_rollup_support).
+    """
+    counters = [column.name for column in table.c if not column.primary_key]
+    if dialect_name == "sqlite":
+        stmt = sqlite_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[column for column in table.primary_key],
+            set_={name: table.c[name] + stmt.excluded[name] for name in counters},
+        )
+    stmt = mysql_insert(table)
+    return stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in counters})
+
+
+async def record_order_sales(
+    db: AsyncSession, day: date, lines: Iterable[SaleLine], sign: int = 1, order_count: int = 1
+) -> None:
+    """
+    Adds one order's lines to the daily rollups, or subtracts them with sign=-1 (cancellation).
+    A batch of orders from the same day can be recorded at once by passing all of their
+    lines and their number as `order_count`. Runs in the caller's transaction, so the
+    rollups commit or roll back with the order.
+    """
+    units = 0
+    revenue = 0.0
+    by_sweet: Dict[int, List] = {}
+    by_category: Dict[str, List] = {}
+    for sweet_id, category, quantity, price in lines:
+        line_units, line_revenue = sign * quantity, sign * quantity * price
+        units += line_units
+        revenue += line_revenue
+        for totals in (by_sweet.setdefault(sweet_id, [0, 0.0]),
+                       by_category.setdefault(category or UNCATEGORIZED, [0, 0.0])):
+            totals[0] += line_units
+            totals[1] += line_revenue
+
+    dialect_name = db.get_bind().dialect.name
+    await db.execute(
+        _increment_upsert(dialect_name, models.DailySales.__table__),
+        [{"day": day, "orders": sign * order_count, "units": units, "revenue": revenue}],
+    )
+    await db.execute(
+        _increment_upsert(dialect_name, models.DailySweetSales.__table__),
+        [{"day": day, "sweet_id": sweet_id, "units": u, "revenue": r} for sweet_id, (u, r) in by_sweet.items()],
+    )
+    await db.execute(
+        _increment_upsert(dialect_name, models.DailyCategorySales.__table__),
+        [{"day": day, "category": category, "units": u, "revenue": r} for category, (u, r) in by_category.items()],
+    )
+
+
+async def order_sale_lines(db: AsyncSession, order_id: int) -> List[SaleLine]:
+    """
+    The sale lines of a stored order, with the categories recorded when it was sold, so a
+    cancellation is netted out of the category the sale was counted in even if the sweet
+    has moved since. Items stored before categories were recorded fall back to the
+    sweet's current category.
+    """
+    return (await orders_sale_lines(db, [order_id])).get(order_id, [])
+
+
+async def orders_sale_lines(db: AsyncSession, order_ids: List[int]) -> Dict[int, List[SaleLine]]:
+    """The sale lines of several stored orders in one query, keyed by order ID (see order_sale_lines)."""
+    rows = await db.execute(
+        select(
+            models.OrderItem.order_id,
+            models.OrderItem.sweet_id,
+            func.coalesce(models.OrderItem.category, models.Sweet.category),
+            models.OrderItem.quantity,
+            models.OrderItem.price_at_purchase,
+        ).outerjoin(models.Sweet, models.OrderItem.sweet_id == models.Sweet.id)
+        .where(models.OrderItem.order_id.in_(order_ids))
+    )
+    lines: Dict[int, List[SaleLine]] = {}
+    for order_id, *line in rows:
+        lines.setdefault(order_id, []).append(tuple(line))
+    return lines
+
+
+async def rebuild_sales_rollups(db: AsyncSession) -> None:
+    """
+    Recomputes every rollup table from orders and order_items, e.g. after deploying the
+    rollups onto an existing database. Runs in the caller's transaction.
+    """
+    order_day = func.date(models.Order.created_at)
+    line_revenue = models.OrderItem.quantity * models.OrderItem.price_at_purchase
+    sold = select().select_from(models.Order) \
+        .join(models.OrderItem, models.OrderItem.order_id == models.Order.id) \
+        .where(models.Order.status != CANCELLED)
+
+    for model in (models.DailySales, models.DailySweetSales, models.DailyCategorySales):
+        await db.execute(delete(model))
+
+    await db.execute(insert(models.DailySales).from_select(
+        ["day", "orders", "units", "revenue"],
+        sold.add_columns(
+            order_day, func.count(func.distinct(models.Order.id)),
+            func.sum(models.OrderItem.quantity), func.sum(line_revenue),
+        ).group_by(order_day),
+    ))
+    await db.execute(insert(models.DailySweetSales).from_select(
+        ["day", "sweet_id", "units", "revenue"],
+        sold.add_columns(
+            order_day, models.OrderItem.sweet_id,
+            func.sum(models.OrderItem.quantity), func.sum(line_revenue),
+        ).group_by(order_day, models.OrderItem.sweet_id),
+    ))
+    category = func.coalesce(models.OrderItem.category, models.Sweet.category, UNCATEGORIZED)
+    await db.execute(insert(models.DailyCategorySales).from_select(
+        ["day", "category", "units", "revenue"],
+        sold.outerjoin(models.Sweet, models.OrderItem.sweet_id == models.Sweet.id).add_columns(
+            order_day, category,
+            func.sum(models.OrderItem.quantity), func.sum(line_revenue),
+        ).group_by(order_day, category),
+    ))
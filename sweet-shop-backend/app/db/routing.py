@@ -0,0 +1,102 @@
+import itertools
+import math
+import time
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Header carrying the Unix time of the client's last committed write. Responses to
+# writes set it and the client echoes the latest value back on every request, so any
+# worker can honour read-your-writes without sharing state with the worker that took
+# the write. A header (not a cookie) also works for cross-origin clients that don't
+# send credentials; CORS exposes it in main.py.
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+def mark_write(request: Request) -> None:
+    """Records that the request committed a write; ReadYourWritesMiddleware reports it in LAST_WRITE_HEADER."""
+    request.state.last_write_at = time.time()
+
+
+def last_write_at(request: Request) -> Optional[float]:
+    """The time of the client's last write, from the header it echoed, or None if it sent none (or garbage)."""
+    value = request.headers.get(LAST_WRITE_HEADER)
+    try:
+        written = float(value) if value else None
+    except ValueError:
+        return None
+    return written if written is not None and math.isfinite(written) else None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Sets LAST_WRITE_HEADER on responses to requests that committed a write.
+
+    SessionRouter checks the time the client echoes back against its window, so a
+    replayed or forged value can at most send that one client's own reads to the
+    primary for one window.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})  # Shared with request.state in the endpoints
+
+        async def send_with_last_write(message: Message) -> None:
+            if message["type"] == "http.response.start" and "last_write_at" in state:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (LAST_WRITE_HEADER.lower().encode(), f"{state['last_write_at']:.6f}".encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_last_write)
+
+
+class SessionRouter:
+    """
+    Hands out sessions on the primary for writes and on the read replicas for reads.
+
+    Replicas are used round-robin. A read from a client whose LAST_WRITE_HEADER says
+    it committed a write within the read-your-writes window goes to the primary
+    instead, whichever worker serves it. Without replicas, every session is a
+    primary session.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        replicas: Optional[List[async_sessionmaker]] = None,
+        read_your_writes_seconds: float = 5.0,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas or [])
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._next_replica = itertools.cycle(self.replicas) if self.replicas else None
+
+    def reads_own_writes(self, request: Request) -> bool:
+        """True if the client committed a write within the read-your-writes window."""
+        written = last_write_at(request)
+        if written is None:
+            return False
+        # Allow as much clock skew between workers as the window itself
+        return abs(time.time() - written) < self.read_your_writes_seconds
+
+    def write_session(self, request: Request) -> AsyncSession:
+        """A primary session. Commits on it start the client's read-your-writes window."""
+        db = self.primary()
+        event.listen(db.sync_session, "after_commit", lambda _session: mark_write(request))
+        return db
+
+    def read_session(self, request: Request) -> AsyncSession:
+        """A replica session, or a primary one if the client wrote within the read-your-writes window."""
+        if self._next_replica is None or self.reads_own_writes(request):
+            return self.primary()
+        return next(self._next_replica)()
@@ -1,17 +1,72 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware # <-- ADDED IMPORT
-from .db.database import Base, engine
+from .db.database import Base, engine, SessionLocal
 from .api.endpoints import auth 
 from .api.endpoints import sweets
 from .api.endpoints import user
 from .api.endpoints import orders 
+from .api.endpoints import admin
+from .api.endpoints import analytics
+from .api.endpoints import reservations
+from .api.endpoints import metrics
 from app.db import models
+from .core.hashing import password_hasher
+from .core.search import search_index
+from .core.config import settings
+from .core.admission import AdmissionControlMiddleware
+from .core.metrics import MetricsMiddleware
+from .db.reservations import run_reservation_sweeper
+from .db.idempotency import run_idempotency_key_purger
+from .db.rollups import check_rollup_support
+from .db.catalog import sync_search_index
+from .db.routing import ReadYourWritesMiddleware
+
+logger = logging.getLogger(__name__)
 
 # FIX: Temporarily comment out the table creation so the app can start without 
 # connecting to the real database during testing (pytest will use its own setup).
 # Base.metadata.create_all(bind=engine) 
 
-app = FastAPI(title="Sweet Shop Management System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks."""
+    # Refuse to start on a database the sales rollups (updated by every order) can't use
+    check_rollup_support(engine.dialect.name)
+    # Build the catalog search index. If the database is unreachable, start with an
+    # empty index; the first search builds it instead.
+    try:
+        async with SessionLocal() as db:
+            await sync_search_index(db, search_index)
+    except Exception:
+        logger.exception("Could not build the catalog search index at startup")
+    # Reclaim the stock of expired cart reservations in the background
+    sweeper = asyncio.create_task(
+        run_reservation_sweeper(SessionLocal, settings.RESERVATION_SWEEP_INTERVAL_SECONDS)
+    )
+    # Delete expired idempotency keys so the table stays bounded
+    purger = asyncio.create_task(
+        run_idempotency_key_purger(SessionLocal, settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+    )
+    yield
+    sweeper.cancel()
+    purger.cancel()
+    # Fail any orders still queued for a group commit
+    orders.order_committer.stop()
+    # Stop the bcrypt worker processes
+    password_hasher.shutdown()
+
+app = FastAPI(title="Sweet Shop Management System", lifespan=lifespan)
+
+# Read-your-writes: responses to requests that committed a write carry X-Last-Write;
+# clients echo it back, which sends their reads to the primary on every worker
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Admission control: per-client rate limits and per-route-group concurrency caps.
+# Added before CORS so that CORS wraps it and 429/503 responses carry CORS headers.
+app.add_middleware(AdmissionControlMiddleware)
 
 # --- START OF CORS CONFIGURATION ---
 # This block allows your frontend (running on a different port) to access the backend API.
@@ -29,11 +84,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, OPTIONS, etc.)
     allow_headers=["*"],  # Allows all headers needed for communication
+    expose_headers=["X-Next-Cursor", "Retry-After", "X-Last-Write", "X-DB-Queries", "X-DB-Time", "X-DB-Repeated"],  # Pagination cursor, back-off hints, read-your-writes, SQL profile
 )
 # --- END OF CORS CONFIGURATION ---
 
+# Request metrics for GET /metrics. Added last so it is outermost and also
+# times requests rejected by admission control.
+app.add_middleware(MetricsMiddleware)
+
 # Include the authentication router
 app.include_router(auth.router, prefix="/api")
 app.include_router(sweets.router, prefix="/api") 
 app.include_router(user.router, prefix="/api")
-app.include_router(orders.router, prefix="/api")
\ No newline at end of file
+app.include_router(orders.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
+app.include_router(reservations.router, prefix="/api")
+app.include_router(metrics.router)
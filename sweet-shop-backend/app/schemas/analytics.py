@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import date
+
+# --- 1. Sales Report Row ---
+
+class SalesRow(BaseModel):
+    """
+    One row of GET /analytics/sales. Which key fields are set depends on group_by:
+    day (with orders), sweet_id and name, or category.
+    """
+    day: Optional[date] = None
+    sweet_id: Optional[int] = None
+    name: Optional[str] = None
+    category: Optional[str] = None
+    orders: Optional[int] = None
+    units: int
+    revenue: float
@@ -1,6 +1,25 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict, PlainSerializer, TypeAdapter, model_validator
+from typing import Annotated, List, Optional
+from typing_extensions import NotRequired, TypedDict
+from datetime import datetime, UTC
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Order timestamps are stored as naive UTC; attach the zone so they serialize with a Z suffix. None passes through."""
+    if value is None:
+        return None
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value.astimezone(UTC)
+
+
+def format_utc(value: datetime) -> str:
+    """ISO 8601 in UTC with a Z suffix, as the order serializer writes it (for hand-built output)."""
+    return as_utc(value).isoformat().replace("+00:00", "Z")
+
+
+# Order timestamps are always emitted as UTC ("...Z"), whether they come from the
+# database (naive) or from an order just built in memory (aware). Nullable columns
+# (Order.updated_at) are typed Optional[UtcDatetime].
+UtcDatetime = Annotated[datetime, PlainSerializer(as_utc, return_type=datetime)]
 
 # --- 1. Order Item Schemas ---
 
@@ -39,7 +58,8 @@ class OrderBase(BaseModel):
 
 class OrderCreate(OrderBase):
     """Schema for receiving order creation data from the client."""
-    items: List[OrderItemCreate] = Field(..., description="A list of items and quantities for the order.")
+    items: List[OrderItemCreate] = Field(default_factory=list, description="A list of items and quantities for the order.")
+    reservation_id: Optional[int] = Field(None, description="Check out this active reservation instead of sending items.")
 
 
 class Order(OrderBase):
@@ -48,8 +68,8 @@ class Order(OrderBase):
     owner_id: int
     status: str
     total_price: float
-    created_at: datetime
-    updated_at: datetime
+    created_at: UtcDatetime
+    updated_at: Optional[UtcDatetime]
     
     # Embeds the OrderItem schema to show what's in the order (now includes 'name')
     items: List[OrderItem] = []
@@ -64,6 +84,41 @@ class OrderStatusUpdate(BaseModel):
     status: str = Field(..., description="The new status for the order (e.g., Pending, Shipped, Delivered).")
 
 
+# Most orders one POST /orders/status-batch call may change
+MAX_STATUS_BATCH_SIZE = 1000
+
+
+class OrderStatusBatchFilter(BaseModel):
+    """Selects orders by the same fields GET /orders filters on."""
+    status: Optional[str] = Field(None, description="Only orders currently in this status.")
+    owner_id: Optional[int] = Field(None, description="Only this customer's orders.")
+    created_from: Optional[datetime] = Field(None, description="Only orders created at or after this time.")
+    created_to: Optional[datetime] = Field(None, description="Only orders created before this time.")
+
+
+class OrderStatusBatchUpdate(BaseModel):
+    """Schema for moving many orders to one status (Admin POST /orders/status-batch)."""
+    status: str = Field(..., description="The new status for every selected order.")
+    order_ids: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_STATUS_BATCH_SIZE)
+    filter: Optional[OrderStatusBatchFilter] = Field(
+        None, description=f"Select the orders by filter instead (at most {MAX_STATUS_BATCH_SIZE} may match)."
+    )
+
+    @model_validator(mode="after")
+    def check_exactly_one_selection(self):
+        if (self.order_ids is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of 'order_ids' or 'filter'.")
+        return self
+
+
+class OrderStatusBatchResult(BaseModel):
+    """The outcome for each selected order ID."""
+    status: str
+    updated: List[int] = Field(..., description="Orders moved to the new status.")
+    unchanged: List[int] = Field(..., description="Orders that already had the new status.")
+    not_found: List[int] = Field(..., description="Requested IDs with no order.")
+
+
 class OrderAdmin(Order):
     """
     Schema for reading a full existing order, including the associated user's email.
@@ -74,4 +129,71 @@ class OrderAdmin(Order):
     
     # Inherits all other fields (id, owner_id, total_price, items, etc.) from the base Order schema
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderSummary(BaseModel):
+    """
+    Schema for one line of a customer's order history (GET /orders/history).
+    Items are left out; fetch them with GET /orders/{order_id}.
+    """
+    id: int
+    status: str
+    total_price: float
+    item_count: int = Field(..., description="Number of sweets in the order (the sum of item quantities).")
+    created_at: UtcDatetime
+    updated_at: Optional[UtcDatetime]
+
+
+# --- 4. Response Serializer ---
+# Order responses are built as plain dicts straight from Core result rows and
+# encoded by these precompiled adapters. The dicts already hold database-typed
+# values, so they are serialized without being validated into models first.
+# The keys mirror the Order/OrderItem/OrderAdmin/OrderSummary schemas above.
+
+class OrderItemRow(TypedDict):
+    id: int
+    order_id: int
+    sweet_id: int
+    name: Optional[str]
+    quantity: int
+    price_at_purchase: float
+
+
+class OrderRow(TypedDict):
+    id: int
+    owner_id: int
+    status: str
+    total_price: float
+    created_at: UtcDatetime
+    updated_at: Optional[UtcDatetime]
+    items: List[OrderItemRow]
+    user_email: NotRequired[Optional[str]]
+
+
+class OrderSummaryRow(TypedDict):
+    id: int
+    status: str
+    total_price: float
+    item_count: int
+    created_at: UtcDatetime
+    updated_at: Optional[UtcDatetime]
+
+
+order_adapter = TypeAdapter(OrderRow)
+order_list_adapter = TypeAdapter(List[OrderRow])
+order_summary_list_adapter = TypeAdapter(List[OrderSummaryRow])
+
+
+def dump_order(order: OrderRow) -> bytes:
+    """Encodes one order dict as JSON."""
+    return order_adapter.dump_json(order)
+
+
+def dump_orders(orders: List[OrderRow]) -> bytes:
+    """Encodes a list of order dicts as JSON."""
+    return order_list_adapter.dump_json(orders)
+
+
+def dump_order_summaries(summaries: List[OrderSummaryRow]) -> bytes:
+    """Encodes a list of order summary dicts as JSON."""
+    return order_summary_list_adapter.dump_json(summaries)
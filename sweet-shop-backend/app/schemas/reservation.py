@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List
+
+from .order import OrderItemCreate, UtcDatetime
+
+# --- 1. Reservation Item Schemas ---
+
+class ReservationItem(BaseModel):
+    """A quantity of one sweet held by a reservation."""
+    sweet_id: int
+    quantity: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# --- 2. Reservation Schemas ---
+
+class ReservationCreate(BaseModel):
+    """Schema for holding the stock of a cart."""
+    items: List[OrderItemCreate] = Field(..., min_length=1, description="The sweets and quantities to hold.")
+
+
+class Reservation(BaseModel):
+    """Schema for reading a reservation. Check it out with POST /orders and its reservation_id."""
+    id: int
+    owner_id: int
+    status: str
+    created_at: UtcDatetime
+    expires_at: UtcDatetime
+    items: List[ReservationItem] = []
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import List, Optional
 
 #---1.Base schema (used for common attributes)---
 class SweetBase(BaseModel):
@@ -26,4 +26,23 @@ class Sweet(SweetBase):
     id: int
     owner_id: int#we assume sweets are managed by a user/admin
 
-    model_config= ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config= ConfigDict(from_attributes=True)
+
+#--- 5. Schemas for batch stock adjustments(restocks and stock counts)---
+class StockAdjustment(BaseModel):
+    sweet_id: int
+    delta: Optional[int]= Field(None, description="Amount to add (negative to remove).")
+    set_to: Optional[int]= Field(None, ge=0, description="Absolute stock level, e.g. from a stock count.")
+
+    @model_validator(mode="after")
+    def check_exactly_one_change(self):
+        if (self.delta is None) == (self.set_to is None):
+            raise ValueError("Provide exactly one of 'delta' or 'set_to'.")
+        return self
+
+class StockAdjustmentBatch(BaseModel):
+    adjustments: List[StockAdjustment]= Field(..., min_length=1, max_length=10000)
+
+class StockLevel(BaseModel):
+    sweet_id: int
+    stock_quantity: int
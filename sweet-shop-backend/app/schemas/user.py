@@ -41,6 +41,11 @@ class UserOut(User):
     """Schema for public user output (excludes sensitive info like hashed_password)."""
     pass
 
+# Schema for changing a user's admin flag (Admin PATCH)
+class UserAdminUpdate(BaseModel):
+    """Schema for promoting or demoting a user."""
+    is_admin: bool
+
 # --- Token Schemas ---
 
 # Schema for the JWT token response (Output)
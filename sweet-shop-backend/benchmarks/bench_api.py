@@ -0,0 +1,285 @@
+"""
+Mixed-workload load benchmark for the API, with regression checks against baselines.
+
+Seeds a file-backed SQLite database (or the database given by --database-url,
+e.g. a local MySQL) with realistic volumes, then drives a fixed mix of requests
+through the ASGI app with an async HTTP client at fixed concurrency:
+
+    browse        GET /api/sweets/ (full catalog, or a filtered page)
+    login         POST /api/auth/token
+    place_order   POST /api/orders/
+    list_orders   GET /api/orders/ as admin
+    update_status PATCH /api/orders/{id}/status as admin
+
+and reports throughput and p50/p95/p99 latency per route as JSON. With
+--baseline, the run fails (exit status 1) when a route's p95 latency rises or its
+throughput drops by more than --threshold against the stored baseline; refresh
+the baseline with --update-baseline after an intended change. Baselines are only
+comparable on the same machine and settings.
+
+The request sequence is fixed by --seed. bcrypt runs at --rounds (default 4) so
+that logins do not drown out the other routes.
+
+Usage (from sweet-shop-backend/):
+    python benchmarks/bench_api.py --baseline benchmarks/baselines/api_sqlite.json
+    python benchmarks/bench_api.py --baseline benchmarks/baselines/api_sqlite.json --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+# Hash on threads: a process pool is not worth spawning for a benchmark run
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.cache import catalog_cache, principal_cache
+from app.core.config import settings
+from app.core.hashing import hash_password, password_hasher
+from app.core.search import search_index
+from app.core.security import create_access_token
+from app.db import database, models
+from app.db.models import Base
+from app.db.rollups import rebuild_sales_rollups
+from app.db.routing import SessionRouter
+from app.main import app
+
+PASSWORD = "benchmarkpassword123"
+CATEGORIES = ["Fudge", "Indian", "Chocolate", "Baked", "Candy", "Seasonal"]
+STATUSES = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
+
+# Share of each route in the workload
+WORKLOAD_MIX = {
+    "browse": 50,
+    "login": 5,
+    "place_order": 25,
+    "list_orders": 10,
+    "update_status": 10,
+}
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def seed(engine, args, rng: random.Random) -> None:
+    """Creates the schema and bulk-inserts users, sweets, orders and their rollups."""
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+        hashed = hash_password(PASSWORD, args.rounds)
+        await connection.execute(insert(models.User), [
+            {"id": i, "email": f"user{i}@bench-sweetshop.com", "hashed_password": hashed, "is_admin": i == 1, "is_active": True}
+            for i in range(1, args.users + 1)
+        ])
+        await connection.execute(insert(models.Sweet), [
+            {"id": i, "name": f"Sweet {i}", "category": CATEGORIES[i % len(CATEGORIES)],
+             "price": round(rng.uniform(1, 20), 2), "stock_quantity": 1_000_000, "is_available": True, "owner_id": 1}
+            for i in range(1, args.sweets + 1)
+        ])
+
+        started = models.utc_now() - timedelta(days=90)
+        orders, items = [], []
+        for order_id in range(1, args.orders + 1):
+            created_at = started + timedelta(seconds=order_id * 90 * 86400 // args.orders)
+            lines = [(rng.randint(1, args.sweets), rng.randint(1, 5)) for _ in range(rng.randint(1, 4))]
+            total = 0.0
+            for sweet_id, quantity in lines:
+                price = 1.0 + sweet_id % 20
+                total += price * quantity
+                items.append({"order_id": order_id, "sweet_id": sweet_id, "quantity": quantity, "price_at_purchase": price})
+            orders.append({
+                "id": order_id, "owner_id": rng.randint(1, args.users), "status": rng.choice(STATUSES),
+                "total_price": round(total, 2), "created_at": created_at, "updated_at": created_at,
+            })
+        for start in range(0, len(orders), 5000):
+            await connection.execute(insert(models.Order), orders[start:start + 5000])
+        for start in range(0, len(items), 5000):
+            await connection.execute(insert(models.OrderItem), items[start:start + 5000])
+
+
+class Workload:
+    """Issues the requests of one benchmark run and records their latencies."""
+
+    def __init__(self, client: AsyncClient, args, tokens: Dict[int, str]):
+        self.client = client
+        self.args = args
+        self.tokens = tokens
+        self.admin_headers = {"Authorization": f"Bearer {tokens[1]}"}
+        self.latencies: Dict[str, List[float]] = {route: [] for route in WORKLOAD_MIX}
+        self.errors: Dict[str, int] = {route: 0 for route in WORKLOAD_MIX}
+
+    async def request(self, route: str, rng: random.Random) -> None:
+        client, args = self.client, self.args
+        started = time.perf_counter()
+        if route == "browse":
+            if rng.random() < 0.5:
+                response = await client.get("/api/sweets/")
+            else:
+                response = await client.get(
+                    "/api/sweets/", params={"category": rng.choice(CATEGORIES), "sort": "price", "limit": 50}
+                )
+        elif route == "login":
+            response = await client.post(
+                "/api/auth/token",
+                data={"username": f"user{rng.randint(1, args.users)}@bench-sweetshop.com", "password": PASSWORD},
+            )
+        elif route == "place_order":
+            user_id = rng.randint(2, args.users)
+            items = [{"sweet_id": rng.randint(1, args.sweets), "quantity": rng.randint(1, 3)} for _ in range(rng.randint(1, 4))]
+            response = await client.post(
+                "/api/orders/", json={"items": items}, headers={"Authorization": f"Bearer {self.tokens[user_id]}"}
+            )
+        elif route == "list_orders":
+            response = await client.get("/api/orders/", params={"limit": 50}, headers=self.admin_headers)
+        else:
+            response = await client.patch(
+                f"/api/orders/{rng.randint(1, args.orders)}/status",
+                json={"status": rng.choice(STATUSES)}, headers=self.admin_headers,
+            )
+        self.latencies[route].append((time.perf_counter() - started) * 1000)
+        # 409 means another worker changed the same order's status first
+        if response.status_code >= 400 and response.status_code != 409:
+            self.errors[route] += 1
+
+    async def run(self, plan: List[str]) -> float:
+        """Sends the planned requests at fixed concurrency; returns the elapsed seconds."""
+        position = iter(enumerate(plan))
+
+        async def worker():
+            for index, route in position:
+                await self.request(route, random.Random(self.args.seed * 1_000_003 + index))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return time.perf_counter() - started
+
+
+def make_plan(requests: int, rng: random.Random) -> List[str]:
+    routes = list(WORKLOAD_MIX)
+    return rng.choices(routes, weights=[WORKLOAD_MIX[route] for route in routes], k=requests)
+
+
+def report(workload: Workload, elapsed: float, args) -> Dict:
+    routes = {}
+    for route, samples in workload.latencies.items():
+        if not samples:
+            continue
+        routes[route] = {
+            "requests": len(samples),
+            "errors": workload.errors[route],
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(statistics.median(samples), 2),
+            "p95_ms": round(percentile(samples, 0.95), 2),
+            "p99_ms": round(percentile(samples, 0.99), 2),
+        }
+    total = sum(len(samples) for samples in workload.latencies.values())
+    return {
+        "config": {key: getattr(args, key) for key in ("requests", "concurrency", "users", "sweets", "orders", "rounds", "seed")},
+        "database": args.database_url.split("://")[0],
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 1),
+        "routes": routes,
+    }
+
+
+def regressions(result: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Routes whose p95 latency or throughput is more than `threshold` worse than the baseline, or that failed more often."""
+    found = []
+    if baseline.get("config") != result["config"]:
+        found.append(f"run settings {result['config']} differ from the baseline's {baseline.get('config')}")
+    for route, stored in baseline.get("routes", {}).items():
+        current = result["routes"].get(route)
+        if current is None:
+            continue
+        if current["errors"] > stored["errors"]:
+            found.append(f"{route}: {current['errors']} failed requests vs baseline {stored['errors']}")
+        if current["p95_ms"] > stored["p95_ms"] * (1 + threshold):
+            found.append(f"{route}: p95 {current['p95_ms']} ms vs baseline {stored['p95_ms']} ms")
+        if current["throughput_rps"] < stored["throughput_rps"] * (1 - threshold):
+            found.append(f"{route}: {current['throughput_rps']} req/s vs baseline {stored['throughput_rps']} req/s")
+    return found
+
+
+async def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    if args.database_url.startswith("sqlite"):
+        # SQLite has one writer at a time and fails rather than waits when two open
+        # transactions both try to write, so hand out a single connection
+        engine = create_async_engine(args.database_url, pool_size=1, max_overflow=0, pool_timeout=60)
+    else:
+        engine = create_async_engine(args.database_url)
+    await seed(engine, args, rng)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+    async with session_factory() as db:
+        await rebuild_sales_rollups(db)
+        await db.commit()
+        search_index.rebuild(await db.scalars(select(models.Sweet)))
+
+    # Send every session to the benchmark database, as tests/conftest.py does
+    database.session_router = SessionRouter(session_factory)
+    settings.ADMISSION_CONTROL = False
+    password_hasher.rounds = args.rounds
+    password_hasher.max_pending = max(password_hasher.max_pending, args.concurrency)
+    catalog_cache.invalidate()
+    principal_cache.clear()
+
+    tokens = {user_id: create_access_token({"sub": f"user{user_id}@bench-sweetshop.com"}) for user_id in range(1, args.users + 1)}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench") as client:
+            # Warm up caches and connections, then measure
+            await Workload(client, args, tokens).run(make_plan(max(args.requests // 10, args.concurrency), rng))
+            workload = Workload(client, args, tokens)
+            elapsed = await workload.run(make_plan(args.requests, rng))
+    finally:
+        password_hasher.shutdown()
+        await engine.dispose()
+    return report(workload, elapsed, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--sweets", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=20000, help="Seeded orders")
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt cost")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against (or write with --update-baseline)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed regression, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.database_url = args.database_url or f"sqlite+aiosqlite:///{tmp}/bench.db"
+        result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(result, baseline_file, indent=2)
+            baseline_file.write("\n")
+    elif args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = regressions(result, json.load(baseline_file), args.threshold)
+        if found:
+            print("Regressions against " + args.baseline + ":\n  " + "\n  ".join(found), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
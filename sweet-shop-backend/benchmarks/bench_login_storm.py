@@ -0,0 +1,135 @@
+"""
+Catalog latency during a login storm.
+
+Fires a burst of concurrent logins at POST /api/auth/token while a poller keeps
+requesting GET /api/sweets, then reports catalog latency percentiles and login
+throughput. It runs once with bcrypt on the thread pool (workers=0, the previous
+behaviour) and once on the hashing process pool.
+
+Usage (from sweet-shop-backend/):
+    python benchmarks/bench_login_storm.py --logins 200 --concurrency 32 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.cache import catalog_cache, principal_cache
+from app.core.hashing import hash_password, password_hasher
+from app.db.database import get_db
+from app.db.models import Base, Sweet, User
+from app.main import app
+
+PASSWORD = "benchmarkpassword123"
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def seed(engine, users: int, rounds: int):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        hashed = hash_password(PASSWORD, rounds)
+        await connection.execute(insert(User), [
+            {"email": f"user{i}@bench.local", "hashed_password": hashed, "is_admin": i == 0, "is_active": True}
+            for i in range(users)
+        ])
+        await connection.execute(insert(Sweet), [
+            {"name": f"Sweet {i}", "category": f"Category {i % 10}", "price": 1.0 + i % 20,
+             "stock_quantity": 1000, "is_available": True, "owner_id": 1}
+            for i in range(200)
+        ])
+
+
+async def run_storm(client: AsyncClient, logins: int, concurrency: int, users: int):
+    catalog_latencies = []
+    storm_done = asyncio.Event()
+
+    async def poll_catalog():
+        while not storm_done.is_set():
+            start = time.perf_counter()
+            response = await client.get("/api/sweets/")
+            catalog_latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200
+            await asyncio.sleep(0.005)
+
+    slots = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def login(i: int):
+        async with slots:
+            response = await client.post(
+                "/api/auth/token",
+                data={"username": f"user{i % users}@bench.local", "password": PASSWORD},
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    poller = asyncio.create_task(poll_catalog())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    storm_done.set()
+    await poller
+
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "login_statuses": statuses,
+        "catalog_requests": len(catalog_latencies),
+        "catalog_p50_ms": round(statistics.median(catalog_latencies), 2),
+        "catalog_p95_ms": round(percentile(catalog_latencies, 0.95), 2),
+        "catalog_p99_ms": round(percentile(catalog_latencies, 0.99), 2),
+    }
+
+
+async def main(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        await seed(engine, args.users, args.rounds)
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+
+        async def _get_db():
+            async with session_factory() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = _get_db
+        password_hasher.rounds = args.rounds
+        password_hasher.max_pending = max(password_hasher.max_pending, args.concurrency)
+
+        for mode, workers in (("thread_pool", 0), ("process_pool", args.workers)):
+            password_hasher.shutdown()
+            password_hasher.workers = workers
+            catalog_cache.invalidate()
+            principal_cache.clear()
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+                # Warm up worker processes and the catalog cache before measuring
+                await run_storm(client, logins=max(workers, 1) * 2, concurrency=max(workers, 1), users=args.users)
+                results[mode] = await run_storm(client, args.logins, args.concurrency, args.users)
+
+        password_hasher.shutdown()
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+    print(json.dumps({"rounds": args.rounds, "logins": args.logins, "concurrency": args.concurrency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200, help="Total logins in the storm")
+    parser.add_argument("--concurrency", type=int, default=32, help="Logins in flight at once")
+    parser.add_argument("--users", type=int, default=50, help="Distinct seeded users")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost")
+    parser.add_argument("--workers", type=int, default=password_hasher.workers or 2, help="Hashing processes")
+    asyncio.run(main(parser.parse_args()))
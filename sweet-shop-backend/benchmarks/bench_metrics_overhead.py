@@ -0,0 +1,100 @@
+"""
+Per-request cost of the /metrics instrumentation.
+
+Drives a minimal ASGI app directly (no HTTP, no routing) with and without
+MetricsMiddleware and reports the difference per request. Also times the
+SQLAlchemy cursor hooks per statement against in-memory SQLite. The request
+overhead must stay under 50 µs.
+
+Usage (from sweet-shop-backend/):
+    python benchmarks/bench_metrics_overhead.py --requests 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+from app.core import metrics
+from app.core.metrics import MetricsMiddleware
+
+
+class FakeRoute:
+    path = "/orders/{order_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = FakeRoute  # What routing adds to the scope
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def time_requests(app, count: int) -> float:
+    """Microseconds per request."""
+    started = time.perf_counter()
+    for _ in range(count):
+        await app({"type": "http", "method": "GET", "path": "/api/orders/42"}, receive, send)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def time_queries(count: int, hooked: bool) -> float:
+    """Microseconds per statement."""
+    if not hooked:
+        event.remove(Engine, "before_cursor_execute", metrics._before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", metrics._after_cursor_execute)
+    try:
+        engine = create_engine("sqlite://")
+        with engine.connect() as connection:
+            statement = text("SELECT 1")
+            started = time.perf_counter()
+            for _ in range(count):
+                connection.execute(statement)
+            return (time.perf_counter() - started) / count * 1e6
+    finally:
+        if not hooked:
+            event.listen(Engine, "before_cursor_execute", metrics._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", metrics._after_cursor_execute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    instrumented = MetricsMiddleware(endpoint)
+    bare, wrapped = [], []
+    for _ in range(args.repeat):
+        bare.append(asyncio.run(time_requests(endpoint, args.requests)))
+        wrapped.append(asyncio.run(time_requests(instrumented, args.requests)))
+
+    plain_queries = [time_queries(args.queries, hooked=False) for _ in range(args.repeat)]
+    hooked_queries = [time_queries(args.queries, hooked=True) for _ in range(args.repeat)]
+
+    request_overhead = statistics.median(wrapped) - statistics.median(bare)
+    print(json.dumps({
+        "request_overhead_us": round(request_overhead, 2),
+        "query_hook_overhead_us": round(statistics.median(hooked_queries) - statistics.median(plain_queries), 2),
+        "budget_us": 50,
+        "within_budget": request_overhead < 50,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
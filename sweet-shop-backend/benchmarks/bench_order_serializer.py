@@ -0,0 +1,126 @@
+"""
+CPU cost of turning a page of orders into the GET /orders JSON body.
+
+Compares the previous mapping (copy each ORM object's __dict__, build
+OrderAdmin models, then let FastAPI validate and encode them again through
+response_model) with the shared serializer, which encodes dicts built from
+Core rows with a precompiled TypeAdapter. No database is involved.
+
+Usage (from sweet-shop-backend/):
+    python benchmarks/bench_order_serializer.py --orders 10000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+
+from app.api.endpoints.orders import order_row
+from app.db import models
+from app.schemas.order import Order as OrderSchema, OrderAdmin, dump_orders
+
+
+def make_orders(count: int, items_per_order: int, rng: random.Random):
+    """Returns the same synthetic orders as ORM objects and as Core-style rows."""
+    start = datetime(2025, 1, 1)
+    orm_orders, rows, item_rows = [], [], {}
+    for order_id in range(1, count + 1):
+        created_at = start + timedelta(seconds=order_id)
+        order = models.Order(
+            id=order_id, owner_id=rng.randint(1, 500), status="Pending",
+            total_price=0.0, created_at=created_at, updated_at=created_at,
+        )
+        items = []
+        for n in range(items_per_order):
+            sweet = models.Sweet(id=rng.randint(1, 2000), name=f"Sweet {n}")
+            item = models.OrderItem(
+                id=order_id * items_per_order + n, order_id=order_id, sweet_id=sweet.id,
+                quantity=rng.randint(1, 5), price_at_purchase=round(rng.uniform(1, 20), 2),
+            )
+            item.sweet = sweet
+            items.append(item)
+        order.items = items
+        orm_orders.append((order, f"user{order.owner_id}@example.com"))
+
+        rows.append(SimpleNamespace(
+            id=order_id, owner_id=order.owner_id, status=order.status, total_price=order.total_price,
+            created_at=created_at, updated_at=created_at, user_email=f"user{order.owner_id}@example.com",
+        ))
+        item_rows[order_id] = [
+            {"id": item.id, "order_id": order_id, "sweet_id": item.sweet_id, "name": item.sweet.name,
+             "quantity": item.quantity, "price_at_purchase": item.price_at_purchase}
+            for item in items
+        ]
+    return orm_orders, rows, item_rows
+
+
+def previous_mapping(orm_orders, response_adapter: TypeAdapter) -> bytes:
+    """The __dict__.copy() mapping, followed by FastAPI's response_model validation and encoding."""
+    orders_list = []
+    for order_obj, user_email in orm_orders:
+        order_dict = order_obj.__dict__.copy()
+        items_list_for_pydantic = []
+        for item in order_obj.items:
+            item_dict = item.__dict__.copy()
+            item_dict['name'] = item.sweet.name
+            items_list_for_pydantic.append(item_dict)
+        order_dict['items'] = items_list_for_pydantic
+        order_dict['user_email'] = user_email
+        orders_list.append(OrderAdmin(**order_dict))
+    content = [order.model_dump() for order in orders_list]
+    validated = response_adapter.validate_python(content)
+    return json.dumps(response_adapter.dump_python(validated, mode="json")).encode()
+
+
+def shared_serializer(rows, item_rows) -> bytes:
+    orders_list = []
+    for row in rows:
+        order = order_row(row, item_rows[row.id])
+        order["user_email"] = row.user_email
+        orders_list.append(order)
+    return dump_orders(orders_list)
+
+
+def time_ms(fn, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=3, help="Items per order")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    orm_orders, rows, item_rows = make_orders(args.orders, args.items, random.Random(args.seed))
+    response_adapter = TypeAdapter(List[OrderSchema])
+
+    results = {}
+    for name, fn in (
+        ("previous_mapping", lambda: previous_mapping(orm_orders, response_adapter)),
+        ("shared_serializer", lambda: shared_serializer(rows, item_rows)),
+    ):
+        timings = time_ms(fn, args.repeat)
+        results[name] = {"median_ms": round(statistics.median(timings), 2), "min_ms": round(min(timings), 2)}
+
+    results["speedup"] = round(results["previous_mapping"]["median_ms"] / results["shared_serializer"]["median_ms"], 1)
+    print(json.dumps({"orders": args.orders, "items_per_order": args.items, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
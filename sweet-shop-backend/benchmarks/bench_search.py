@@ -0,0 +1,67 @@
+"""
+Query latency of the in-memory catalog search index.
+
+Builds the index over a synthetic catalog and times a mix of exact, prefix,
+typo and multi-term queries.
+
+Usage (from sweet-shop-backend/):
+    python benchmarks/bench_search.py --skus 100000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.search import CatalogSearchIndex
+
+FLAVOURS = ["chocolate", "vanilla", "mango", "pistachio", "caramel", "strawberry", "coconut", "almond",
+            "hazelnut", "saffron", "rose", "cardamom", "lemon", "raspberry", "walnut", "honey"]
+KINDS = ["fudge", "barfi", "toffee", "truffle", "brownie", "laddoo", "halwa", "nougat", "praline", "macaron"]
+CATEGORIES = ["Fudge", "Indian", "Chocolate", "Baked", "Candy", "Seasonal"]
+QUERIES = ["mango", "choc", "pistacho", "caramel toffee", "rasp truf", "almnd barfi", "hazelnut", "saf",
+           "10 20 30 40"]  # Last: terms that share almost no sweets (bounded fallback)
+
+
+def make_catalog(skus: int, rng: random.Random):
+    for sweet_id in range(1, skus + 1):
+        flavour, kind = rng.choice(FLAVOURS), rng.choice(KINDS)
+        yield SimpleNamespace(
+            id=sweet_id,
+            name=f"{flavour.title()} {kind.title()} {sweet_id}",
+            category=rng.choice(CATEGORIES),
+            description=f"Handmade {kind} with {rng.choice(FLAVOURS)} and {rng.choice(FLAVOURS)}.",
+        )
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    index = CatalogSearchIndex()
+
+    start = time.perf_counter()
+    index.rebuild(make_catalog(args.skus, rng))
+    build_seconds = time.perf_counter() - start
+
+    results = {}
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            index.search(query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[query] = {"median_ms": round(statistics.median(timings), 3), "max_ms": round(max(timings), 3)}
+
+    print(json.dumps({"skus": args.skus, "build_seconds": round(build_seconds, 2), "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
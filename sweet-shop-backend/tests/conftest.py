@@ -1,59 +1,55 @@
 import sys
 import os
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from starlette.testclient import TestClient
-from typing import Dict # Added for type hinting clarity
+from httpx import ASGITransport, AsyncClient, Response
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from typing import Callable, Dict # Added for type hinting clarity
 
 # This allows imports like 'from app.main import app' to resolve correctly 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Use the cheapest bcrypt cost so registering and logging in does not dominate test time
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 # --- IMPORTS FROM YOUR PROJECT ---
 from app.main import app
-from app.db.database import get_db
+from app.db import database
+from app.db.routing import SessionRouter
+from app.core.cache import catalog_cache, principal_cache
+from app.core.config import settings
+from app.core.search import search_index
 # Import the base class for model creation (check your structure if Base is in database.py)
 from app.db.models import Base 
 # ---------------------------------
 
 # --- 1. SETUP THE TEST DATABASE ENGINE ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-
-@pytest.fixture(scope="session")
-def engine():
-    """Create a new database engine for the entire test session."""
-    return create_engine(
-        SQLALCHEMY_DATABASE_URL, 
-        connect_args={"check_same_thread": False}
-    )
+# Each test gets its own SQLite file through the aiosqlite driver, so no live server is needed
+# and requests and assertions can use separate sessions just like in production.
 
-@pytest.fixture(scope="session")
-def setup_db(engine):
+@pytest.fixture(scope="function")
+async def engine(tmp_path):
     """
-    Creates all tables before the tests run and drops them after the session ends.
+    Creates a fresh database with all tables for a single test and disposes of it afterwards.
     """
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+@pytest.fixture(scope="function")
+def session_factory(engine):
+    """Session factory bound to the test engine, configured like app.db.database.SessionLocal."""
+    return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 @pytest.fixture(scope="function") # Changed scope to 'function' for better isolation!
-def session(engine, setup_db):
+async def session(session_factory):
     """
-    Creates a new database session, rolls back at the end of the test.
+    Creates a database session for assertions inside a test.
     We use 'function' scope to ensure fresh data for every single test.
     """
-    connection = engine.connect()
-    transaction = connection.begin()
-    
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=connection)
-    db = SessionLocal()
-
-    try:
+    async with session_factory() as db:
         yield db
-    finally:
-        db.close()
-        transaction.rollback()
-        connection.close()
 
 
 # --- FIXTURE ALIASES (Fixes 'db' not found error) ---
@@ -64,32 +60,27 @@ def db(session):
     yield session
 
 
-# --- 2. OVERRIDE THE FastAPI DEPENDENCY ---
-def override_get_db_dependency(db): # Changed parameter name to 'db' for consistency
-    """A closure to return a generator that yields the test session."""
-    def _get_db_override():
-        try:
-            yield db
-        finally:
-            pass 
-    return _get_db_override
-
-
-# --- 3. TEST CLIENT FIXTURE ---
+# --- 2. TEST CLIENT FIXTURE ---
 # Changed scope to 'function' to ensure a fresh client and DB override for each test.
 @pytest.fixture(scope="function") 
-def client(db):
+async def client(session_factory, monkeypatch):
     """
-    Creates a TestClient that uses the overridden database dependency.
+    Creates an async HTTP client that calls the app in-process against the test database
+    (primary only; see test_read_replicas.py for replica routing).
     """
-    app.dependency_overrides[get_db] = override_get_db_dependency(db)
-
-    with TestClient(app) as test_client:
+    # get_db and get_read_db hand out sessions through database.session_router; send them all to the test database
+    monkeypatch.setattr(database, "session_router", SessionRouter(session_factory))
+    # Each test uses a fresh database, so start every test with empty caches and search index
+    catalog_cache.invalidate()
+    principal_cache.clear()
+    search_index.clear()
+    # Every test client shares one address; rate limits are tested in test_admission.py
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL", False)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
         yield test_client
-    
-    app.dependency_overrides.clear()
 
-# --- 4. AUTHENTICATION FIXTURES ---
+# --- 3. AUTHENTICATION FIXTURES ---
 # Changed scope to 'function' so users are re-registered for each test group, ensuring the admin status is always correct.
 
 @pytest.fixture(scope="function")
@@ -109,14 +100,14 @@ def regular_user_data() -> Dict[str, str]:
     }
 
 @pytest.fixture(scope="function")
-def admin_auth_headers(client: TestClient, admin_user_data: Dict[str, str]) -> Dict[str, str]: 
+async def admin_auth_headers(client: AsyncClient, admin_user_data: Dict[str, str]) -> Dict[str, str]: 
     """Registers the first user (admin) and logs them in, returning authorization headers."""
     # 1. Register the admin user
     # NOTE: This ensures the user is the FIRST user, making them an admin per auth.py logic
-    client.post("/api/auth/register", json=admin_user_data)
+    await client.post("/api/auth/register", json=admin_user_data)
     
     # 2. Log in the admin user to get a token
-    response = client.post(
+    response = await client.post(
         "/api/auth/token",
         data={"username": admin_user_data["email"], "password": admin_user_data["password"]},
     )
@@ -130,15 +121,15 @@ def admin_auth_headers(client: TestClient, admin_user_data: Dict[str, str]) -> D
     return {"Authorization": f"Bearer {access_token}"}
     
 @pytest.fixture(scope="function")
-def regular_user_auth_headers(client: TestClient, admin_auth_headers: Dict[str, str], regular_user_data: Dict[str, str]) -> Dict[str, str]:
+async def regular_user_auth_headers(client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_data: Dict[str, str]) -> Dict[str, str]:
     """Registers a second user (regular user) and logs them in."""
     # Dependency on admin_auth_headers ensures the admin is registered first.
     
     # 1. Register the regular user (will not be admin)
-    client.post("/api/auth/register", json=regular_user_data)
+    await client.post("/api/auth/register", json=regular_user_data)
     
     # 2. Log in the regular user
-    response = client.post(
+    response = await client.post(
         "/api/auth/token",
         data={"username": regular_user_data["email"], "password": regular_user_data["password"]},
     )
@@ -160,4 +151,28 @@ def admin_token(admin_auth_headers: Dict[str, str]) -> str:
 @pytest.fixture(scope="function")
 def regular_user_token(regular_user_auth_headers: Dict[str, str]) -> str:
     """Returns just the raw access token string for the regular user."""
-    return regular_user_auth_headers["Authorization"].split(" ")[1]
\ No newline at end of file
+    return regular_user_auth_headers["Authorization"].split(" ")[1]
+
+
+# --- 4. QUERY BUDGET FIXTURE ---
+# Turns on the SQL profiler (X-DB-* response headers) and checks a response against
+# its endpoint's query budget, so N+1 regressions fail the suite.
+
+@pytest.fixture(scope="function")
+def query_budget(monkeypatch) -> Callable[..., Response]:
+    """
+    Returns check(response, max_queries, max_repeated=0). It fails the test if the
+    request ran more than max_queries statements, or ran statements of an already-seen
+    shape more than max_repeated times (e.g. one SELECT per order item).
+    """
+    monkeypatch.setattr(settings, "SQL_PROFILING", True)
+
+    def check(response: Response, max_queries: int, max_repeated: int = 0) -> Response:
+        endpoint = f"{response.request.method} {response.request.url.path}"
+        queries = int(response.headers["X-DB-Queries"])
+        repeated = int(response.headers["X-DB-Repeated"])
+        assert queries <= max_queries, f"{endpoint} ran {queries} queries; its budget is {max_queries}"
+        assert repeated <= max_repeated, f"{endpoint} repeated statements {repeated} times (possible N+1)"
+        return response
+
+    return check
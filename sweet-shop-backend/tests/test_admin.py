@@ -0,0 +1,50 @@
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from typing import Dict
+
+from app.db.pool_stats import TimedAsyncAdaptedQueuePool, pool_status
+
+
+# --- 1. GET /api/admin/db-pool ---
+
+async def test_db_pool_status_admin_success(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Test that an admin can read the connection pool statistics."""
+    response = await client.get("/api/admin/db-pool", headers=admin_auth_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    for key in ("size", "checked_out", "idle", "overflow", "checkout_wait"):
+        assert key in data
+    assert "+Inf" in data["checkout_wait"]["buckets_ms"]
+
+async def test_db_pool_status_regular_user_fails(client: AsyncClient, regular_user_auth_headers: Dict[str, str]):
+    """Test that a regular user cannot read the connection pool statistics."""
+    response = await client.get("/api/admin/db-pool", headers=regular_user_auth_headers)
+    assert response.status_code == 403
+
+
+# --- 2. Pool wait-time recording ---
+
+async def test_timed_pool_records_checkouts(tmp_path):
+    """Test that every checkout is recorded and that occupancy is reported while a connection is held."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=2,
+        max_overflow=1,
+    )
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            status = pool_status(engine.sync_engine.pool)
+            assert status["checked_out"] == 1
+            assert status["overflow"] == 0
+
+        status = pool_status(engine.sync_engine.pool)
+        assert status["checked_out"] == 0
+        assert status["idle"] == 1
+        assert status["checkout_wait"]["count"] == 1
+        assert status["checkout_wait"]["buckets_ms"]["+Inf"] == 1
+    finally:
+        await engine.dispose()
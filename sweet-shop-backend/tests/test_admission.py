@@ -0,0 +1,58 @@
+import pytest
+from httpx import AsyncClient
+from typing import Dict
+
+from app.core import admission
+from app.core.admission import AdmissionController, MemoryAdmissionBackend, RouteGroup, request_subject
+from app.core.config import settings
+
+
+@pytest.fixture(scope="function")
+def limits(monkeypatch) -> MemoryAdmissionBackend:
+    """Turns admission control on with tight limits for sign-in and the orders listing."""
+    backend = MemoryAdmissionBackend()
+    groups = [
+        RouteGroup("auth", frozenset({"POST"}), ("/api/auth/",), rate_per_minute=60, burst=2, max_in_flight=0),
+        RouteGroup("order_reads", frozenset({"GET"}), ("/api/orders",), rate_per_minute=0, burst=0, max_in_flight=1),
+    ]
+    monkeypatch.setattr(admission, "admission_controller", AdmissionController(groups, backend))
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL", True)
+    return backend
+
+
+async def test_rate_limit_per_client(client: AsyncClient, admin_auth_headers: Dict[str, str], limits):
+    credentials = {"username": "admin@sweetshop.com", "password": "wrong password"}
+
+    codes = [(await client.post("/api/auth/token", data=credentials)).status_code for _ in range(3)]
+    assert codes == [401, 401, 429]
+    response = await client.post("/api/auth/token", data=credentials)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    # Other route groups are not affected
+    assert (await client.get("/api/sweets/")).status_code == 200
+
+
+async def test_concurrency_cap_per_route_group(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], limits, monkeypatch
+):
+    # With the one slot taken by a request in flight, the next one is turned away
+    await limits.acquire_slot("order_reads", 1)
+    response = await client.get("/api/orders/", headers=admin_auth_headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    await limits.release_slot("order_reads")
+    response = await client.get("/api/orders/", headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert limits.in_flight() == {"order_reads": 0}
+
+
+def test_clients_are_keyed_by_token_subject(admin_auth_headers: Dict[str, str]):
+    token_header = (b"authorization", admin_auth_headers["Authorization"].encode())
+    scope = {"headers": [token_header], "client": ("10.0.0.1", 1234)}
+    assert request_subject(scope) == "user:admin@sweetshop.com"
+
+    # A forged or expired token counts against the client address instead
+    scope = {"headers": [(b"authorization", b"Bearer not-a-jwt")], "client": ("10.0.0.1", 1234)}
+    assert request_subject(scope) == "ip:10.0.0.1"
@@ -0,0 +1,102 @@
+from httpx import AsyncClient
+from datetime import datetime, UTC
+from typing import Dict
+import pytest
+import uuid
+
+from app.db.rollups import check_rollup_support
+
+
+async def create_sweet(client: AsyncClient, headers: Dict[str, str], category: str, price: float) -> int:
+    sweet = {"name": f"Sweet {uuid.uuid4()}", "category": category, "price": price, "stock_quantity": 100}
+    return (await client.post("/api/sweets/", json=sweet, headers=headers)).json()["id"]
+
+
+# --- 1. GET /api/analytics/sales ---
+
+async def test_sales_rollups_follow_orders_and_cancellations(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    fudge = await create_sweet(client, admin_auth_headers, "Fudge", 2.0)
+    barfi = await create_sweet(client, admin_auth_headers, "Indian", 5.0)
+
+    orders = [
+        {"items": [{"sweet_id": fudge, "quantity": 3}, {"sweet_id": barfi, "quantity": 1}]},  # 11.0
+        {"items": [{"sweet_id": barfi, "quantity": 2}]},                                     # 10.0
+        {"items": [{"sweet_id": fudge, "quantity": 10}]},                                    # 20.0, cancelled below
+    ]
+    order_ids = []
+    for order in orders:
+        response = await client.post("/api/orders/", json=order, headers=regular_user_auth_headers)
+        order_ids.append(response.json()["id"])
+
+    response = await client.patch(
+        f"/api/orders/{order_ids[2]}/status", json={"status": "Cancelled"}, headers=admin_auth_headers
+    )
+    assert response.status_code == 200
+
+    today = datetime.now(UTC).date().isoformat()
+    response = await client.get("/api/analytics/sales", params={"from": today, "to": today}, headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert response.json() == [{"day": today, "orders": 2, "units": 6, "revenue": 21.0}]
+
+    by_sweet = (await client.get("/api/analytics/sales?group_by=sweet", headers=admin_auth_headers)).json()
+    assert [(row["sweet_id"], row["units"], row["revenue"]) for row in by_sweet] == [(barfi, 3, 15.0), (fudge, 3, 6.0)]
+
+    by_category = (await client.get("/api/analytics/sales?group_by=category", headers=admin_auth_headers)).json()
+    assert by_category == [
+        {"category": "Indian", "units": 3, "revenue": 15.0},
+        {"category": "Fudge", "units": 3, "revenue": 6.0},
+    ]
+
+    # Reinstating the order adds it back
+    await client.patch(f"/api/orders/{order_ids[2]}/status", json={"status": "Pending"}, headers=admin_auth_headers)
+    by_day = (await client.get("/api/analytics/sales", headers=admin_auth_headers)).json()
+    assert by_day == [{"day": today, "orders": 3, "units": 16, "revenue": 41.0}]
+
+    # Rebuilding from the orders table gives the same figures
+    response = await client.post("/api/analytics/sales/rebuild", headers=admin_auth_headers)
+    assert response.status_code == 204
+    assert (await client.get("/api/analytics/sales", headers=admin_auth_headers)).json() == by_day
+    rebuilt = (await client.get("/api/analytics/sales?group_by=category", headers=admin_auth_headers)).json()
+    assert rebuilt == [
+        {"category": "Fudge", "units": 13, "revenue": 26.0},
+        {"category": "Indian", "units": 3, "revenue": 15.0},
+    ]
+
+
+async def test_cancellation_nets_out_of_the_category_at_sale_time(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    """Recategorising a sweet and then cancelling an order must not shift sales between categories."""
+    fudge = await create_sweet(client, admin_auth_headers, "Fudge", 2.0)
+    kept = await client.post("/api/orders/", json={"items": [{"sweet_id": fudge, "quantity": 1}]}, headers=regular_user_auth_headers)
+    cancelled = await client.post("/api/orders/", json={"items": [{"sweet_id": fudge, "quantity": 4}]}, headers=regular_user_auth_headers)
+    assert kept.status_code == cancelled.status_code == 201
+
+    response = await client.put(f"/api/sweets/{fudge}", json={"category": "Seasonal"}, headers=admin_auth_headers)
+    assert response.status_code == 200
+    await client.patch(f"/api/orders/{cancelled.json()['id']}/status", json={"status": "Cancelled"}, headers=admin_auth_headers)
+
+    expected = [{"category": "Fudge", "units": 1, "revenue": 2.0}]
+    by_category = (await client.get("/api/analytics/sales?group_by=category", headers=admin_auth_headers)).json()
+    assert [row for row in by_category if row["units"] or row["revenue"]] == expected
+
+    # A rebuild keys the sales on the same categories
+    await client.post("/api/analytics/sales/rebuild", headers=admin_auth_headers)
+    assert (await client.get("/api/analytics/sales?group_by=category", headers=admin_auth_headers)).json() == expected
+
+
+async def test_sales_regular_user_forbidden(client: AsyncClient, regular_user_auth_headers: Dict[str, str]):
+    response = await client.get("/api/analytics/sales", headers=regular_user_auth_headers)
+    assert response.status_code == 403
+
+
+# --- 2. Database support ---
+
+def test_rollups_refuse_unsupported_databases():
+    """The dialect is checked once at startup, not inside each order's transaction."""
+    check_rollup_support("sqlite")
+    check_rollup_support("mysql")
+    with pytest.raises(RuntimeError, match="postgresql"):
+        check_rollup_support("postgresql")
@@ -1,10 +1,15 @@
 import pytest
-# Import TestClient for type hinting, although we use the fixture
-from starlette.testclient import TestClient 
+# Import AsyncClient for type hinting, although we use the fixture
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.hashing import hash_password, password_hasher
+from app.db.models import User as UserModel
 
 # --- TEST 1: Successful Registration ---
-# FIX: Removed @pytest.mark.asyncio and 'async' keyword
-def test_register_user_success(client: TestClient): 
+async def test_register_user_success(client: AsyncClient): 
     """Test successful user registration (first user should be admin)."""
     
     #Setup : define valid user data
@@ -12,8 +17,7 @@ def test_register_user_success(client: TestClient):
         "email": "testuser@sweetshop.com",
         "password": "securepassword123"
     }
-    # FIX: Removed 'await' keyword
-    response= client.post("/api/auth/register", json=user_data) 
+    response= await client.post("/api/auth/register", json=user_data) 
 
     # Assertions for a successful registration
     assert response.status_code == 201
@@ -28,8 +32,7 @@ def test_register_user_success(client: TestClient):
     assert data["user_role"] == "admin"
 
 # --- TEST 2: Email Already Registered (Failure) ---
-# FIX: Removed @pytest.mark.asyncio and 'async' keyword
-def test_register_user_email_exists(client: TestClient):
+async def test_register_user_email_exists(client: AsyncClient):
     """Test failure when registering a user with an existing email."""
     
     # Setup: Register the user once
@@ -37,13 +40,53 @@ def test_register_user_email_exists(client: TestClient):
         "email": "duplicate@sweetshop.com",
         "password": "securepassword123"
     }
-    # FIX: Removed 'await' keyword
-    client.post("/api/auth/register", json=user_data) 
+    await client.post("/api/auth/register", json=user_data) 
 
     #Action: Attempt to register the same user again
-    # FIX: Removed 'await' keyword
-    response= client.post("/api/auth/register", json=user_data) 
+    response= await client.post("/api/auth/register", json=user_data) 
 
     # Assertions for failure
     assert response.status_code == 400
-    assert response.json()["detail"] == "Email already registered"
\ No newline at end of file
+    assert response.json()["detail"] == "Email already registered"
+# --- TEST 3: Login Upgrades Hashes Made With A Different bcrypt Cost ---
+async def test_login_rehashes_password_with_configured_cost(client: AsyncClient, db: AsyncSession):
+    """Test that logging in replaces a hash made with an old bcrypt cost."""
+    user_data = {
+        "email": "rehash@sweetshop.com",
+        "password": "securepassword123"
+    }
+    await client.post("/api/auth/register", json=user_data)
+
+    # Setup: Store a hash made with a different cost, as if BCRYPT_ROUNDS had changed since
+    old_hash = hash_password(user_data["password"], settings.BCRYPT_ROUNDS + 1)
+    await db.execute(update(UserModel).where(UserModel.email == user_data["email"]).values(hashed_password=old_hash))
+    await db.commit()
+
+    response = await client.post(
+        "/api/auth/token",
+        data={"username": user_data["email"], "password": user_data["password"]},
+    )
+
+    assert response.status_code == 200
+    new_hash = await db.scalar(select(UserModel.hashed_password).where(UserModel.email == user_data["email"]))
+    assert new_hash != old_hash
+    assert new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+# --- TEST 4: Saturated Hashing Pool (Back-Pressure) ---
+async def test_login_rejected_when_hashing_pool_saturated(client: AsyncClient, monkeypatch: pytest.MonkeyPatch):
+    """Test that logins fail fast with 503 and Retry-After when no hashing slots are free."""
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+
+    response = await client.post(
+        "/api/auth/token",
+        data={"username": "anyone@sweetshop.com", "password": "securepassword123"},
+    )
+    # No user exists, so no hash is needed: the unknown user is rejected normally
+    assert response.status_code == 401
+
+    response = await client.post(
+        "/api/auth/register",
+        json={"email": "busy@sweetshop.com", "password": "securepassword123"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
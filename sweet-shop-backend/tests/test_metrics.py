@@ -0,0 +1,32 @@
+from httpx import AsyncClient
+from typing import Dict
+
+from app.core.metrics import metrics_registry
+
+
+async def test_metrics_export_routes_statuses_and_db_work(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    metrics_registry.reset()
+    await client.get("/api/orders/", headers=admin_auth_headers)
+    await client.get("/api/orders/12345", headers=admin_auth_headers)
+    await client.get("/no-such-path")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+
+    # Routes are labelled by their template, not the concrete path
+    assert 'http_responses_total{method="GET",route="/api/orders/",status="200"} 1' in body
+    assert 'http_responses_total{method="GET",route="/api/orders/{order_id}",status="404"} 1' in body
+    assert 'http_responses_total{method="GET",route="<unmatched>",status="404"} 1' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/orders/"} 1' in body
+    assert 'http_requests_in_flight{method="GET"} 1' in body  # The scrape itself
+
+    # The orders listing ran at least one query, all of it attributed to its route
+    queries = metrics_registry.db_queries[("GET", "/api/orders/")]
+    assert queries.sum >= 1
+    assert 'http_request_db_seconds_bucket{method="GET",route="/api/orders/",le="+Inf"} 1' in body
+    assert "db_queries_total " in body
+    assert "db_pool_checked_out " in body
+    assert "# TYPE principal_cache_hits_total counter" in body
+    assert "principal_cache_misses_total " in body
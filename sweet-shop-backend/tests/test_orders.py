@@ -1,8 +1,17 @@
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.endpoints import orders as orders_endpoint
+from app.core.config import settings
 from app.db import models
+from app.db.group_commit import GroupCommitter
+from app.db.idempotency import COMPLETED, PENDING, request_fingerprint
+from app.schemas.order import OrderCreate
+from datetime import timedelta
+import asyncio
 import uuid
+import json
 from typing import Dict, Any
 
 # --- Helper Function for Creating Unique Sweet Data ---
@@ -21,11 +30,11 @@ def get_unique_sweet_data():
 # --- Fixture to Create a Sweet in DB for Testing Orders ---
 # NOTE: This fixture is only used to ensure a sweet exists for order testing.
 @pytest.fixture
-def setup_sweets(client: TestClient, db: Session, admin_token: str):
+async def setup_sweets(client: AsyncClient, db: AsyncSession, admin_token: str):
     """Creates a sweet item required for order testing."""
     sweet_data = get_unique_sweet_data()
     sweet_data["stock_quantity"] = 50
-    response = client.post(
+    response = await client.post(
         "/api/sweets/", 
         headers={"Authorization": f"Bearer {admin_token}"},
         json=sweet_data
@@ -35,7 +44,7 @@ def setup_sweets(client: TestClient, db: Session, admin_token: str):
 
 # --- Core Tests for POST /orders ---
 
-def test_create_order_success(client: TestClient, db: Session, regular_user_token: str, admin_token: str):
+async def test_create_order_success(client: AsyncClient, db: AsyncSession, regular_user_token: str, admin_token: str):
     """Tests successful creation of an order and verifies stock deduction."""
     # 1. SETUP: Create two sweets
     sweet_data_1 = get_unique_sweet_data()
@@ -44,9 +53,9 @@ def test_create_order_success(client: TestClient, db: Session, regular_user_toke
     sweet_data_2["stock_quantity"] = 25
     
     # Use admin token to create the setup sweets
-    response_1 = client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_1)
+    response_1 = await client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_1)
     sweet_1 = response_1.json()
-    response_2 = client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_2)
+    response_2 = await client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_2)
     sweet_2 = response_2.json()
 
     # 2. ACTION: Place an order
@@ -57,7 +66,7 @@ def test_create_order_success(client: TestClient, db: Session, regular_user_toke
         ]
     }
     
-    response = client.post(
+    response = await client.post(
         "/api/orders/",
         headers={"Authorization": f"Bearer {regular_user_token}"},
         json=order_data
@@ -72,14 +81,14 @@ def test_create_order_success(client: TestClient, db: Session, regular_user_toke
     assert len(order["items"]) == 2
 
     # 4. ASSERTION 2: Verify Stock Deduction in the Database (Transaction integrity)
-    db_sweet_1 = db.query(models.Sweet).filter(models.Sweet.id == sweet_1["id"]).first()
-    db_sweet_2 = db.query(models.Sweet).filter(models.Sweet.id == sweet_2["id"]).first()
+    db_sweet_1 = await db.scalar(select(models.Sweet).where(models.Sweet.id == sweet_1["id"]))
+    db_sweet_2 = await db.scalar(select(models.Sweet).where(models.Sweet.id == sweet_2["id"]))
     
     assert db_sweet_1.stock_quantity == 40  # 50 - 10 = 40
     assert db_sweet_2.stock_quantity == 20  # 25 - 5 = 20
 
 
-def test_create_order_insufficient_stock_fails_transaction(client: TestClient, db: Session, regular_user_token: str, admin_token: str):
+async def test_create_order_insufficient_stock_fails_transaction(client: AsyncClient, db: AsyncSession, regular_user_token: str, admin_token: str):
     """
     Tests that an order fails if stock is insufficient and stock is NOT deducted (full rollback).
     """
@@ -87,7 +96,7 @@ def test_create_order_insufficient_stock_fails_transaction(client: TestClient, d
     sweet_data = get_unique_sweet_data()
     sweet_data["stock_quantity"] = 5 
     
-    response_sweet = client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data)
+    response_sweet = await client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data)
     sweet = response_sweet.json()
     
     original_stock = sweet["stock_quantity"]
@@ -95,7 +104,7 @@ def test_create_order_insufficient_stock_fails_transaction(client: TestClient, d
     # 2. ACTION: Try to place an order for more than is available (e.g., 6)
     order_data = {"items": [{"sweet_id": sweet["id"], "quantity": 6}]}
     
-    response = client.post(
+    response = await client.post(
         "/api/orders/",
         headers={"Authorization": f"Bearer {regular_user_token}"},
         json=order_data
@@ -106,15 +115,44 @@ def test_create_order_insufficient_stock_fails_transaction(client: TestClient, d
     assert "Insufficient stock" in response.json()["detail"]
 
     # 4. ASSERTION 2: Verify stock was NOT deducted (check database integrity)
-    db_sweet = db.query(models.Sweet).filter(models.Sweet.id == sweet["id"]).first()
+    db_sweet = await db.scalar(select(models.Sweet).where(models.Sweet.id == sweet["id"]))
     assert db_sweet.stock_quantity == original_stock # Must still be 5
 
-def test_create_order_sweet_not_found(client: TestClient, regular_user_token: str):
+async def test_create_order_repeated_sweet_checks_combined_quantity(client: AsyncClient, db: AsyncSession, regular_user_token: str, admin_token: str):
+    """
+    Tests that repeated lines for the same sweet are checked against stock as one total.
+    """
+    # 1. SETUP: Create one sweet with 5 in stock
+    sweet_data = get_unique_sweet_data()
+    sweet_data["stock_quantity"] = 5
+    sweet = (await client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data)).json()
+
+    # 2. ACTION: Two lines of 3 each (6 in total) must be rejected
+    order_data = {"items": [{"sweet_id": sweet["id"], "quantity": 3}, {"sweet_id": sweet["id"], "quantity": 3}]}
+    response = await client.post("/api/orders/", headers={"Authorization": f"Bearer {regular_user_token}"}, json=order_data)
+
+    assert response.status_code == 400
+    assert "Insufficient stock" in response.json()["detail"]
+
+    # 3. ACTION: Two lines of 2 each (4 in total) succeed and keep both lines
+    order_data = {"items": [{"sweet_id": sweet["id"], "quantity": 2}, {"sweet_id": sweet["id"], "quantity": 2}]}
+    response = await client.post("/api/orders/", headers={"Authorization": f"Bearer {regular_user_token}"}, json=order_data)
+
+    assert response.status_code == 201
+    order = response.json()
+    assert len(order["items"]) == 2
+    assert all(item["name"] == sweet_data["name"] for item in order["items"])
+    assert all(item["order_id"] == order["id"] for item in order["items"])
+
+    db_sweet = await db.scalar(select(models.Sweet).where(models.Sweet.id == sweet["id"]))
+    assert db_sweet.stock_quantity == 1  # 5 - 2 - 2 = 1
+
+async def test_create_order_sweet_not_found(client: AsyncClient, regular_user_token: str):
     """Tests that an order fails if a sweet ID does not exist."""
     
     order_data = {"items": [{"sweet_id": 99999, "quantity": 1}]} # Use a non-existent ID
     
-    response = client.post(
+    response = await client.post(
         "/api/orders/",
         headers={"Authorization": f"Bearer {regular_user_token}"},
         json=order_data
@@ -125,7 +163,7 @@ def test_create_order_sweet_not_found(client: TestClient, regular_user_token: st
 
 # --- Tests for GET /orders and GET /orders/{order_id} (Authorization) ---
 @pytest.fixture
-def setup_orders(client: TestClient, regular_user_token: str, admin_token: str) -> Dict[str, Any]:
+async def setup_orders(client: AsyncClient, regular_user_token: str, admin_token: str) -> Dict[str, Any]:
     """Helper to place a couple of orders for testing retrieval."""
     # Create necessary sweets first
     sweet_data_a = get_unique_sweet_data()
@@ -133,22 +171,22 @@ def setup_orders(client: TestClient, regular_user_token: str, admin_token: str)
     sweet_data_b = get_unique_sweet_data()
     sweet_data_b["stock_quantity"] = 100
     
-    client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_a)
-    client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_b)
+    await client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_a)
+    await client.post("/api/sweets/", headers={"Authorization": f"Bearer {admin_token}"}, json=sweet_data_b)
     
     # NOTE: Relying on the DB order might be fragile. Better to use the returned IDs from POST.
     # For now, we assume the first two GET results are the ones we just posted.
-    all_sweets = client.get("/api/sweets/").json()
+    all_sweets = (await client.get("/api/sweets/")).json()
     sweet_a = all_sweets[0] 
     sweet_b = all_sweets[1] 
 
     # Order 1 (Regular User)
     order_data_1 = {"items": [{"sweet_id": sweet_a["id"], "quantity": 1}]}
-    resp_1 = client.post("/api/orders/", headers={"Authorization": f"Bearer {regular_user_token}"}, json=order_data_1)
+    resp_1 = await client.post("/api/orders/", headers={"Authorization": f"Bearer {regular_user_token}"}, json=order_data_1)
     
     # Order 2 (Admin User)
     order_data_2 = {"items": [{"sweet_id": sweet_b["id"], "quantity": 2}]}
-    resp_2 = client.post("/api/orders/", headers={"Authorization": f"Bearer {admin_token}"}, json=order_data_2)
+    resp_2 = await client.post("/api/orders/", headers={"Authorization": f"Bearer {admin_token}"}, json=order_data_2)
     
     return {
         "regular_user_order": resp_1.json(),
@@ -157,10 +195,10 @@ def setup_orders(client: TestClient, regular_user_token: str, admin_token: str)
         "admin_token": admin_token
     }
 
-def test_read_all_orders_as_admin(client: TestClient, setup_orders: dict):
+async def test_read_all_orders_as_admin(client: AsyncClient, setup_orders: dict):
     """Admin should be able to retrieve ALL orders (both theirs and the regular user's)."""
     
-    response = client.get(
+    response = await client.get(
         "/api/orders/",
         headers={"Authorization": f"Bearer {setup_orders['admin_token']}"}
     )
@@ -172,11 +210,15 @@ def test_read_all_orders_as_admin(client: TestClient, setup_orders: dict):
     assert setup_orders["regular_user_order"]["id"] in order_ids
     assert setup_orders["admin_order"]["id"] in order_ids
 
+    # Admin rows carry the customer's email, and every item carries the sweet name
+    assert all(order["user_email"] for order in orders)
+    assert all(item["name"] for order in orders for item in order["items"])
+
 
-def test_read_orders_as_regular_user(client: TestClient, setup_orders: dict):
+async def test_read_orders_as_regular_user(client: AsyncClient, setup_orders: dict):
     """Regular user should only be able to retrieve their own orders."""
     
-    response = client.get(
+    response = await client.get(
         "/api/orders/",
         headers={"Authorization": f"Bearer {setup_orders['regular_user_token']}"}
     )
@@ -189,13 +231,14 @@ def test_read_orders_as_regular_user(client: TestClient, setup_orders: dict):
     order_ids = [order["id"] for order in orders]
     assert setup_orders["regular_user_order"]["id"] in order_ids
     assert setup_orders["admin_order"]["id"] not in order_ids # Must NOT see the admin's order
+    assert all("user_email" not in order for order in orders)
 
 
-def test_read_specific_order_success_as_owner(client: TestClient, setup_orders: dict):
+async def test_read_specific_order_success_as_owner(client: AsyncClient, setup_orders: dict):
     """Owner should be able to retrieve their specific order."""
     order_id = setup_orders["regular_user_order"]["id"]
     
-    response = client.get(
+    response = await client.get(
         f"/api/orders/{order_id}",
         headers={"Authorization": f"Bearer {setup_orders['regular_user_token']}"}
     )
@@ -204,11 +247,11 @@ def test_read_specific_order_success_as_owner(client: TestClient, setup_orders:
     assert response.json()["id"] == order_id
 
 
-def test_read_specific_order_success_as_admin(client: TestClient, setup_orders: dict):
+async def test_read_specific_order_success_as_admin(client: AsyncClient, setup_orders: dict):
     """Admin should be able to retrieve ANY specific order."""
     order_id = setup_orders["regular_user_order"]["id"] # Try to view the regular user's order
     
-    response = client.get(
+    response = await client.get(
         f"/api/orders/{order_id}",
         headers={"Authorization": f"Bearer {setup_orders['admin_token']}"}
     )
@@ -217,7 +260,7 @@ def test_read_specific_order_success_as_admin(client: TestClient, setup_orders:
     assert response.json()["id"] == order_id
 
 
-def test_read_specific_order_forbidden_non_owner(client: TestClient, setup_orders: dict, regular_user_token: str):
+async def test_read_specific_order_forbidden_non_owner(client: AsyncClient, setup_orders: dict, regular_user_token: str):
     # FIX APPLIED: Changed 'user_token' to 'regular_user_token' (must be a user other than the order owner or admin)
     """A non-owner user should NOT be able to retrieve another user's order."""
     # The 'regular_user_token' is now used as the non-owner if the admin placed the order.
@@ -230,10 +273,375 @@ def test_read_specific_order_forbidden_non_owner(client: TestClient, setup_order
     admin_order_id = setup_orders["admin_order"]["id"] 
     
     # The 'regular_user_token' is the non-owner for the admin's order.
-    response = client.get(
+    response = await client.get(
         f"/api/orders/{admin_order_id}",
         headers={"Authorization": f"Bearer {regular_user_token}"}
     )
     
     assert response.status_code == 403
-    assert "Not authorized to view this order." in response.json()["detail"]
\ No newline at end of file
+    assert "Not authorized to view this order." in response.json()["detail"]
+
+# --- Tests for GET /orders pagination and filters ---
+
+async def test_read_orders_keyset_pagination(client: AsyncClient, setup_orders: dict):
+    """Pages follow X-Next-Cursor newest first, without gaps or duplicates."""
+    headers = {"Authorization": f"Bearer {setup_orders['regular_user_token']}"}
+    sweet_id = setup_orders["regular_user_order"]["items"][0]["sweet_id"]
+    for _ in range(3):
+        await client.post("/api/orders/", headers=headers, json={"items": [{"sweet_id": sweet_id, "quantity": 1}]})
+
+    # Page through the user's 4 orders two at a time
+    first_page = await client.get("/api/orders/?limit=2", headers=headers)
+    assert first_page.status_code == 200
+    assert len(first_page.json()) == 2
+    cursor = first_page.headers["X-Next-Cursor"]
+
+    second_page = await client.get("/api/orders/", params={"limit": 2, "cursor": cursor}, headers=headers)
+    assert second_page.status_code == 200
+    assert len(second_page.json()) == 2
+    assert "X-Next-Cursor" not in second_page.headers
+
+    orders = first_page.json() + second_page.json()
+    assert len({order["id"] for order in orders}) == 4
+    # Every order gets its own timestamp, newest first
+    created = [order["created_at"] for order in orders]
+    assert created == sorted(created, reverse=True)
+    assert len(set(created)) == 4
+
+
+async def test_read_orders_filters(client: AsyncClient, setup_orders: dict):
+    """Admins can filter by owner and status; regular users are always limited to their own orders."""
+    admin_headers = {"Authorization": f"Bearer {setup_orders['admin_token']}"}
+    user_order = setup_orders["regular_user_order"]
+    admin_order = setup_orders["admin_order"]
+
+    response = await client.get("/api/orders/", params={"owner_id": user_order["owner_id"]}, headers=admin_headers)
+    assert [order["id"] for order in response.json()] == [user_order["id"]]
+
+    await client.patch(f"/api/orders/{admin_order['id']}/status", json={"status": "Shipped"}, headers=admin_headers)
+    response = await client.get("/api/orders/", params={"status": "Shipped"}, headers=admin_headers)
+    assert [order["id"] for order in response.json()] == [admin_order["id"]]
+
+    response = await client.get("/api/orders/", params={"created_to": "2000-01-01T00:00:00"}, headers=admin_headers)
+    assert response.json() == []
+
+    # A regular user asking for another owner's orders still only gets their own
+    user_headers = {"Authorization": f"Bearer {setup_orders['regular_user_token']}"}
+    response = await client.get("/api/orders/", params={"owner_id": admin_order["owner_id"]}, headers=user_headers)
+    assert [order["id"] for order in response.json()] == [user_order["id"]]
+
+
+async def test_read_orders_invalid_cursor(client: AsyncClient, regular_user_token: str):
+    """A malformed cursor is rejected with 400."""
+    response = await client.get(
+        "/api/orders/",
+        params={"cursor": "not-a-cursor"},
+        headers={"Authorization": f"Bearer {regular_user_token}"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor."
+
+
+# --- Tests for GET /orders/export ---
+
+async def test_export_orders_csv(client: AsyncClient, setup_orders: dict):
+    """Admin CSV export has a header plus one row per order item."""
+    response = await client.get(
+        "/api/orders/export?format=csv",
+        headers={"Authorization": f"Bearer {setup_orders['admin_token']}"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("order_id,created_at")
+    order_ids = {int(line.split(",")[0]) for line in lines[1:]}
+    assert setup_orders["regular_user_order"]["id"] in order_ids
+    assert setup_orders["admin_order"]["id"] in order_ids
+
+
+async def test_export_orders_ndjson(client: AsyncClient, setup_orders: dict):
+    """Admin NDJSON export has one JSON object per order with nested items."""
+    response = await client.get(
+        "/api/orders/export?format=ndjson",
+        headers={"Authorization": f"Bearer {setup_orders['admin_token']}"}
+    )
+
+    assert response.status_code == 200
+    orders = {order["id"]: order for order in map(json.loads, response.text.splitlines())}
+    exported = orders[setup_orders["admin_order"]["id"]]
+    assert exported["user_email"] is not None
+    assert exported["items"][0]["quantity"] == 2
+    assert exported["items"][0]["name"] == setup_orders["admin_order"]["items"][0]["name"]
+
+
+async def test_export_orders_regular_user_forbidden(client: AsyncClient, regular_user_token: str):
+    """Regular users cannot export orders."""
+    response = await client.get(
+        "/api/orders/export",
+        headers={"Authorization": f"Bearer {regular_user_token}"}
+    )
+    assert response.status_code == 403
+
+
+# --- Tests for Idempotency-Key on POST /orders ---
+
+async def test_create_order_idempotency_key_replays_response(client: AsyncClient, setup_sweets: dict, regular_user_token: str):
+    """A retried request with the same key returns the first order and takes stock once."""
+    headers = {"Authorization": f"Bearer {regular_user_token}", "Idempotency-Key": str(uuid.uuid4())}
+    order = {"items": [{"sweet_id": setup_sweets["id"], "quantity": 3}]}
+
+    first = await client.post("/api/orders/", headers=headers, json=order)
+    assert first.status_code == 201
+    retry = await client.post("/api/orders/", headers=headers, json=order)
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+    sweet = (await client.get(f"/api/sweets/{setup_sweets['id']}")).json()
+    assert sweet["stock_quantity"] == 47
+
+    # The same key cannot be reused for a different order
+    response = await client.post("/api/orders/", headers=headers, json={"items": [{"sweet_id": setup_sweets["id"], "quantity": 1}]})
+    assert response.status_code == 422
+
+
+async def test_create_order_idempotency_key_released_on_failure(client: AsyncClient, setup_sweets: dict, regular_user_token: str):
+    """A failed request does not store its error, so the retry runs the order again."""
+    headers = {"Authorization": f"Bearer {regular_user_token}", "Idempotency-Key": str(uuid.uuid4())}
+    order = {"items": [{"sweet_id": setup_sweets["id"], "quantity": 3}]}
+
+    sweet_id = setup_sweets["id"]
+    response = await client.post("/api/orders/", headers=headers, json={"items": [{"sweet_id": sweet_id, "quantity": 999}]})
+    assert response.status_code == 400
+    response = await client.post("/api/orders/", headers=headers, json={"items": [{"sweet_id": sweet_id, "quantity": 999}]})
+    assert response.status_code == 400
+    assert "Idempotent-Replayed" not in response.headers
+
+    # After the failures the key is free again
+    response = await client.post("/api/orders/", headers=headers, json=order)
+    assert response.status_code == 201
+
+
+async def test_create_order_idempotency_key_waits_for_first_request(
+    client: AsyncClient, session_factory, setup_sweets: dict, regular_user_token: str, monkeypatch
+):
+    """A duplicate sent while the first request runs waits for its response."""
+    key = str(uuid.uuid4())
+    headers = {"Authorization": f"Bearer {regular_user_token}", "Idempotency-Key": key}
+    order = {"items": [{"sweet_id": setup_sweets["id"], "quantity": 2}]}
+    owner_id = (await client.get("/api/users/me", headers=headers)).json()["id"]
+    now = models.utc_now()
+
+    # Simulate a first request that holds the key while it is running
+    async with session_factory() as session:
+        session.add(models.IdempotencyKey(
+            owner_id=owner_id, key=key, status=PENDING,
+            request_hash=request_fingerprint(OrderCreate(**order).model_dump_json().encode()),
+            locked_until=now + timedelta(seconds=60), expires_at=now + timedelta(days=1),
+        ))
+        await session.commit()
+
+    async def finish_first_request():
+        await asyncio.sleep(0.2)
+        async with session_factory() as session:
+            key_row = await session.scalar(select(models.IdempotencyKey).where(models.IdempotencyKey.key == key))
+            key_row.status, key_row.response_status, key_row.response_body = COMPLETED, 201, b'{"id": -1}'
+            await session.commit()
+
+    finisher = asyncio.create_task(finish_first_request())
+    response = await client.post("/api/orders/", headers=headers, json=order)
+    await finisher
+    assert response.status_code == 201
+    assert response.json() == {"id": -1}
+
+    # A duplicate that outwaits IDEMPOTENCY_WAIT_SECONDS is told to retry
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0.1)
+    async with session_factory() as session:
+        key_row = await session.scalar(select(models.IdempotencyKey).where(models.IdempotencyKey.key == key))
+        key_row.status = PENDING
+        await session.commit()
+    response = await client.post("/api/orders/", headers=headers, json=order)
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+
+
+# --- Tests for group commit (ORDER_GROUP_COMMIT) ---
+
+async def test_create_order_group_commit(
+    client: AsyncClient, setup_sweets: dict, regular_user_token: str, admin_token: str, monkeypatch
+):
+    """Concurrent orders are committed together and each caller gets its own outcome."""
+    batch_sizes = []
+
+    async def recording_handler(session, pending):
+        batch_sizes.append(len(pending))
+        return await orders_endpoint.place_order_batch(session, pending)
+
+    committer = GroupCommitter(
+        lambda: orders_endpoint.database.session_router.primary(), recording_handler,
+        max_batch_size=100, max_wait_seconds=0.05,
+    )
+    monkeypatch.setattr(settings, "ORDER_GROUP_COMMIT", True)
+    monkeypatch.setattr(orders_endpoint, "order_committer", committer)
+
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    sweet_id = setup_sweets["id"]  # 50 in stock
+    responses = await asyncio.gather(*[
+        client.post("/api/orders/", headers=headers, json={"items": [{"sweet_id": sweet_id, "quantity": 8}]})
+        for _ in range(8)
+    ] + [
+        client.post("/api/orders/", headers=headers, json={"items": [{"sweet_id": 987654, "quantity": 1}]})
+    ])
+    committer.stop()
+
+    codes = [response.status_code for response in responses]
+    assert codes.count(201) == 6  # 6 x 8 = 48 of the 50 fit
+    assert codes.count(400) == 2
+    assert codes[-1] == 404
+    assert sum(batch_sizes) == len(responses)
+    assert max(batch_sizes) > 1
+
+    sweet = (await client.get(f"/api/sweets/{sweet_id}")).json()
+    assert sweet["stock_quantity"] == 2
+    order_ids = {response.json()["id"] for response in responses if response.status_code == 201}
+    assert len(order_ids) == 6
+
+    # The batch is counted once per order in the sales rollups
+    sales = (await client.get("/api/analytics/sales", headers={"Authorization": f"Bearer {admin_token}"})).json()
+    assert [(row["orders"], row["units"]) for row in sales] == [(6, 48)]
+
+
+async def test_order_timestamps_match_across_endpoints(client: AsyncClient, setup_sweets: dict, regular_user_token: str):
+    """POST returns the same UTC timestamps (with a Z suffix) as the endpoints that read the order back."""
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    created = (await client.post(
+        "/api/orders/", headers=headers, json={"items": [{"sweet_id": setup_sweets["id"], "quantity": 1}]}
+    )).json()
+    assert created["created_at"].endswith("Z")
+
+    fetched = (await client.get(f"/api/orders/{created['id']}", headers=headers)).json()
+    listed = (await client.get("/api/orders/", headers=headers)).json()[0]
+    summary = (await client.get("/api/orders/history", headers=headers)).json()[0]
+    for order in (fetched, listed, summary):
+        assert (order["created_at"], order["updated_at"]) == (created["created_at"], created["updated_at"])
+
+
+
+async def test_orders_without_updated_at_serialize(
+    client: AsyncClient, db: AsyncSession, setup_sweets: dict, regular_user_token: str
+):
+    """Order.updated_at is nullable (e.g. rows written before it existed): it comes back as null, not a 500."""
+    headers = {"Authorization": f"Bearer {regular_user_token}"}
+    created = (await client.post(
+        "/api/orders/", headers=headers, json={"items": [{"sweet_id": setup_sweets["id"], "quantity": 1}]}
+    )).json()
+    await db.execute(update(models.Order).where(models.Order.id == created["id"]).values(updated_at=None))
+    await db.commit()
+
+    for path in (f"/api/orders/{created['id']}", "/api/orders/", "/api/orders/history"):
+        response = await client.get(path, headers=headers)
+        assert response.status_code == 200
+        order = response.json() if path.endswith(str(created["id"])) else response.json()[0]
+        assert (order["created_at"], order["updated_at"]) == (created["created_at"], None)
+
+# --- Tests for POST /orders/status-batch ---
+
+async def test_order_status_batch_by_ids(client: AsyncClient, setup_sweets: dict, regular_user_token: str, admin_token: str):
+    """Each ID is reported as updated, unchanged or not found; cancellations leave the sales rollups."""
+    user_headers = {"Authorization": f"Bearer {regular_user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    order_ids = []
+    for quantity in (1, 2, 3):
+        response = await client.post(
+            "/api/orders/", headers=user_headers, json={"items": [{"sweet_id": setup_sweets["id"], "quantity": quantity}]}
+        )
+        order_ids.append(response.json()["id"])
+    await client.patch(f"/api/orders/{order_ids[2]}/status", json={"status": "Cancelled"}, headers=admin_headers)
+
+    response = await client.post(
+        "/api/orders/status-batch",
+        json={"order_ids": [order_ids[0], 987654, order_ids[1], order_ids[2], order_ids[0]], "status": "Cancelled"},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "Cancelled", "updated": order_ids[:2], "unchanged": [order_ids[2]], "not_found": [987654],
+    }
+    for order_id in order_ids:
+        order = (await client.get(f"/api/orders/{order_id}", headers=admin_headers)).json()
+        assert order["status"] == "Cancelled"
+    assert (await client.get("/api/analytics/sales", headers=admin_headers)).json()[0]["orders"] == 0
+
+    # Reinstating them adds all three back
+    response = await client.post(
+        "/api/orders/status-batch", json={"order_ids": order_ids, "status": "Processing"}, headers=admin_headers
+    )
+    assert response.json()["updated"] == order_ids
+    sales = (await client.get("/api/analytics/sales", headers=admin_headers)).json()
+    assert [(row["orders"], row["units"]) for row in sales] == [(3, 6)]
+
+
+async def test_order_status_batch_by_filter(client: AsyncClient, setup_sweets: dict, regular_user_token: str, admin_token: str):
+    user_headers = {"Authorization": f"Bearer {regular_user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    order_ids = []
+    for _ in range(3):
+        response = await client.post(
+            "/api/orders/", headers=user_headers, json={"items": [{"sweet_id": setup_sweets["id"], "quantity": 1}]}
+        )
+        order_ids.append(response.json()["id"])
+    await client.patch(f"/api/orders/{order_ids[0]}/status", json={"status": "Delivered"}, headers=admin_headers)
+
+    response = await client.post(
+        "/api/orders/status-batch", json={"filter": {"status": "Pending"}, "status": "Shipped"}, headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {"status": "Shipped", "updated": order_ids[1:], "unchanged": [], "not_found": []}
+
+
+async def test_order_status_batch_validation(client: AsyncClient, regular_user_token: str, admin_token: str):
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    response = await client.post(
+        "/api/orders/status-batch", json={"order_ids": [1], "status": "Shipped"},
+        headers={"Authorization": f"Bearer {regular_user_token}"},
+    )
+    assert response.status_code == 403
+
+    response = await client.post("/api/orders/status-batch", json={"order_ids": [1], "status": "Lost"}, headers=admin_headers)
+    assert response.status_code == 400
+
+    for selection in ({}, {"order_ids": [1], "filter": {"status": "Pending"}}, {"order_ids": []}):
+        response = await client.post("/api/orders/status-batch", json={"status": "Shipped", **selection}, headers=admin_headers)
+        assert response.status_code == 422
+
+
+# --- Tests for GET /orders/history ---
+
+async def test_order_history_summaries(client: AsyncClient, setup_sweets: dict, regular_user_token: str, admin_token: str):
+    """Customers page through summaries of their own orders, newest first and without items."""
+    user_headers = {"Authorization": f"Bearer {regular_user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    sweet_id = setup_sweets["id"]
+    orders = []
+    for quantities in ([1], [2, 3], [4]):
+        items = [{"sweet_id": sweet_id, "quantity": quantity} for quantity in quantities]
+        response = await client.post("/api/orders/", headers=user_headers, json={"items": items})
+        orders.append(response.json())
+    await client.post("/api/orders/", headers=admin_headers, json={"items": [{"sweet_id": sweet_id, "quantity": 1}]})
+
+    first_page = await client.get("/api/orders/history", params={"limit": 2}, headers=user_headers)
+    assert first_page.status_code == 200
+    second_page = await client.get(
+        "/api/orders/history", params={"limit": 2, "cursor": first_page.headers["X-Next-Cursor"]}, headers=user_headers
+    )
+    assert "X-Next-Cursor" not in second_page.headers
+
+    summaries = first_page.json() + second_page.json()
+    assert [summary["id"] for summary in summaries] == [order["id"] for order in reversed(orders)]
+    assert [summary["item_count"] for summary in summaries] == [4, 5, 1]
+    # Items are fetched per order on demand
+    full_order = (await client.get(f"/api/orders/{orders[1]['id']}", headers=user_headers)).json()
+    assert summaries[1] == {
+        key: full_order[key] for key in ("id", "status", "total_price", "created_at", "updated_at")
+    } | {"item_count": 5}
@@ -0,0 +1,74 @@
+from httpx import AsyncClient
+from typing import Dict
+import time
+import uuid
+
+# Query budgets per endpoint, checked with the query_budget fixture from conftest.py.
+# A budget that no longer holds usually means a new lazy load or a per-row query.
+
+
+async def create_sweets(client: AsyncClient, headers: Dict[str, str], count: int):
+    ids = []
+    for _ in range(count):
+        sweet = {"name": f"Sweet {uuid.uuid4()}", "category": "Fudge", "price": 2.0, "stock_quantity": 50}
+        ids.append((await client.post("/api/sweets/", json=sweet, headers=headers)).json()["id"])
+    return ids
+
+
+async def test_order_endpoints_query_budgets(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str], query_budget
+):
+    sweet_ids = await create_sweets(client, admin_auth_headers, 3)
+    items = [{"sweet_id": sweet_id, "quantity": 1} for sweet_id in sweet_ids]
+
+    # Principal, sweets, stock update, order, rollups; the ORM inserts one order_items
+    # row per statement because it needs each generated id back
+    order = query_budget(
+        await client.post("/api/orders/", json={"items": items}, headers=regular_user_auth_headers),
+        max_queries=10, max_repeated=len(items) - 1,
+    ).json()
+    others = [
+        (await client.post("/api/orders/", json={"items": items}, headers=regular_user_auth_headers)).json()["id"]
+        for _ in range(5)
+    ]
+
+    # Listing more orders must not cost more queries. Admin requests also look up
+    # their principal, which is never cached.
+    query_budget(await client.get("/api/orders/", headers=admin_auth_headers), max_queries=3)
+    query_budget(await client.get("/api/orders/", headers=regular_user_auth_headers), max_queries=2)
+    query_budget(await client.get(f"/api/orders/{order['id']}", headers=regular_user_auth_headers), max_queries=2)
+    query_budget(await client.get("/api/orders/history", headers=regular_user_auth_headers), max_queries=1)
+    query_budget(
+        await client.patch(f"/api/orders/{order['id']}/status", json={"status": "Cancelled"}, headers=admin_auth_headers),
+        max_queries=9,
+    )
+    # Principal, select, one UPDATE, sale lines and the three rollups, however many orders are cancelled
+    query_budget(
+        await client.post("/api/orders/status-batch", json={"order_ids": others, "status": "Cancelled"}, headers=admin_auth_headers),
+        max_queries=7,
+    )
+
+
+async def test_catalog_endpoints_query_budgets(client: AsyncClient, admin_auth_headers: Dict[str, str], query_budget):
+    sweet_ids = await create_sweets(client, admin_auth_headers, 5)
+
+    # The catalog change marker, then the catalog
+    query_budget(await client.get("/api/sweets/"), max_queries=2)
+    # Served from the catalog cache
+    query_budget(await client.get("/api/sweets/"), max_queries=0)
+    # A client that just wrote checks the cache against the marker, so it sees its own writes
+    query_budget(await client.get("/api/sweets/", headers={"X-Last-Write": str(time.time())}), max_queries=1)
+    query_budget(await client.get("/api/sweets/?category=Fudge&sort=price&limit=2"), max_queries=1)
+    # The first search in a worker builds its index (catalog marker, then the rows)
+    query_budget(await client.get("/api/sweets/search?q=Sweet"), max_queries=3)
+    query_budget(await client.get("/api/sweets/search?q=Sweet"), max_queries=1)
+    query_budget(await client.get(f"/api/sweets/{sweet_ids[0]}"), max_queries=1)
+    query_budget(
+        await client.post(
+            "/api/sweets/stock-adjustments",
+            json={"adjustments": [{"sweet_id": sweet_id, "delta": 2} for sweet_id in sweet_ids]},
+            headers=admin_auth_headers,
+        ),
+        max_queries=3,
+    )
+    query_budget(await client.get("/api/users/", headers=admin_auth_headers), max_queries=2)
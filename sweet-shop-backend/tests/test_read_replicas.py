@@ -0,0 +1,102 @@
+import pytest
+import time
+import uuid
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from typing import Dict
+
+from app.db import database
+from app.db.models import Base
+from app.db.routing import LAST_WRITE_HEADER, SessionRouter
+
+# A second SQLite file stands in for the read replica. Nothing replicates into it,
+# so a read served by the replica cannot see rows written to the primary.
+
+
+@pytest.fixture(scope="function")
+async def replica_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def router(client: AsyncClient, session_factory, replica_engine, monkeypatch) -> SessionRouter:
+    """Routes the app's sessions between the test primary and the replica file."""
+    replica = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+    router = SessionRouter(session_factory, [replica], read_your_writes_seconds=60)
+    monkeypatch.setattr(database, "session_router", router)
+    return router
+
+
+def sweet_data() -> Dict:
+    return {"name": f"Kaju Katli {uuid.uuid4()}", "category": "Barfi", "price": 3.5, "stock_quantity": 10}
+
+
+async def test_reads_go_to_replica_but_writer_reads_its_own_writes(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], router: SessionRouter, monkeypatch
+):
+    response = await client.post("/api/sweets/", json=sweet_data(), headers=admin_auth_headers)
+    assert response.status_code == 201
+    sweet_id = response.json()["id"]
+    written = {**admin_auth_headers, LAST_WRITE_HEADER: response.headers[LAST_WRITE_HEADER]}
+
+    # The admin just wrote and echoes X-Last-Write, so their reads stay on the primary
+    response = await client.get(f"/api/sweets/{sweet_id}", headers=written)
+    assert response.status_code == 200
+    assert LAST_WRITE_HEADER not in response.headers  # Reads don't extend the window
+
+    # Anyone else reads from the (never-updated) replica
+    response = await client.get(f"/api/sweets/{sweet_id}")
+    assert response.status_code == 404
+
+    # Once the read-your-writes window has passed, the admin reads from the replica too
+    expired = {**admin_auth_headers, LAST_WRITE_HEADER: str(time.time() - 120)}
+    response = await client.get(f"/api/sweets/{sweet_id}", headers=expired)
+    assert response.status_code == 404
+
+    # The header is honoured by every worker, not just the one that took the write
+    other_worker = SessionRouter(router.primary, router.replicas, read_your_writes_seconds=60)
+    monkeypatch.setattr(database, "session_router", other_worker)
+    response = await client.get(f"/api/sweets/{sweet_id}", headers=written)
+    assert response.status_code == 200
+
+
+async def test_last_write_header_crosses_cors(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], router: SessionRouter
+):
+    """The frontend runs on another origin: it must be able to read X-Last-Write and send it back."""
+    origin = {"Origin": "http://localhost:5173"}
+    response = await client.post("/api/sweets/", json=sweet_data(), headers={**admin_auth_headers, **origin})
+    assert response.status_code == 201
+    assert LAST_WRITE_HEADER.lower() in response.headers["access-control-expose-headers"].lower()
+    sweet_id = response.json()["id"]
+
+    preflight = await client.options(
+        f"/api/sweets/{sweet_id}",
+        headers={**origin, "Access-Control-Request-Method": "GET", "Access-Control-Request-Headers": "authorization,x-last-write"},
+    )
+    assert preflight.status_code == 200
+
+    response = await client.get(
+        f"/api/sweets/{sweet_id}", headers={**origin, LAST_WRITE_HEADER: response.headers[LAST_WRITE_HEADER]}
+    )
+    assert response.status_code == 200
+
+
+async def test_full_catalog_follows_the_read_session(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], router: SessionRouter
+):
+    response = await client.post("/api/sweets/", json=sweet_data(), headers=admin_auth_headers)
+    written = {LAST_WRITE_HEADER: response.headers[LAST_WRITE_HEADER]}
+
+    # Other clients get the catalog as the replica has it, cached against the replica's marker
+    response = await client.get("/api/sweets/")
+    assert response.status_code == 200
+    assert response.json() == []
+
+    # The writer skips the cached copy and sees its own write
+    response = await client.get("/api/sweets/", headers=written)
+    assert len(response.json()) == 1
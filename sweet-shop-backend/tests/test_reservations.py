@@ -0,0 +1,154 @@
+from httpx import AsyncClient
+from datetime import timedelta
+from typing import Dict
+import uuid
+
+from app.db import models
+from app.db.reservations import sweep_expired_reservations
+
+
+async def create_sweet(client: AsyncClient, headers: Dict[str, str], stock: int) -> int:
+    sweet = {"name": f"Sweet {uuid.uuid4()}", "category": "Fudge", "price": 2.5, "stock_quantity": stock}
+    return (await client.post("/api/sweets/", json=sweet, headers=headers)).json()["id"]
+
+
+async def stock_of(client: AsyncClient, sweet_id: int) -> int:
+    return (await client.get(f"/api/sweets/{sweet_id}")).json()["stock_quantity"]
+
+
+# --- 1. POST /api/reservations and checkout ---
+
+async def test_reservation_holds_stock_until_checkout(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    sweet_id = await create_sweet(client, admin_auth_headers, 10)
+
+    response = await client.post(
+        "/api/reservations/", json={"items": [{"sweet_id": sweet_id, "quantity": 4}]}, headers=regular_user_auth_headers
+    )
+    assert response.status_code == 201
+    reservation = response.json()
+    assert reservation["status"] == "Active"
+    assert reservation["items"] == [{"sweet_id": sweet_id, "quantity": 4}]
+    assert await stock_of(client, sweet_id) == 6
+
+    # More than the remaining stock cannot be held
+    response = await client.post(
+        "/api/reservations/", json={"items": [{"sweet_id": sweet_id, "quantity": 7}]}, headers=regular_user_auth_headers
+    )
+    assert response.status_code == 400
+
+    # Checkout turns the hold into an order without taking the stock twice
+    response = await client.post(
+        "/api/orders/", json={"reservation_id": reservation["id"]}, headers=regular_user_auth_headers
+    )
+    assert response.status_code == 201
+    order = response.json()
+    assert order["total_price"] == 10.0
+    assert [(item["sweet_id"], item["quantity"]) for item in order["items"]] == [(sweet_id, 4)]
+    assert await stock_of(client, sweet_id) == 6
+
+    # A reservation is checked out once
+    response = await client.post(
+        "/api/orders/", json={"reservation_id": reservation["id"]}, headers=regular_user_auth_headers
+    )
+    assert response.status_code == 409
+
+
+async def test_reservation_belongs_to_its_owner(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    sweet_id = await create_sweet(client, admin_auth_headers, 10)
+    reservation = (await client.post(
+        "/api/reservations/", json={"items": [{"sweet_id": sweet_id, "quantity": 1}]}, headers=admin_auth_headers
+    )).json()
+
+    response = await client.get(f"/api/reservations/{reservation['id']}", headers=regular_user_auth_headers)
+    assert response.status_code == 404
+    response = await client.post(
+        "/api/orders/", json={"reservation_id": reservation["id"]}, headers=regular_user_auth_headers
+    )
+    assert response.status_code == 409
+    response = await client.post(
+        "/api/orders/",
+        json={"reservation_id": reservation["id"], "items": [{"sweet_id": sweet_id, "quantity": 1}]},
+        headers=admin_auth_headers,
+    )
+    assert response.status_code == 400
+
+
+
+async def test_reservation_timestamps_are_utc(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    """POST and GET return the same instants, marked as UTC, so clients can count down to expiry."""
+    sweet_id = await create_sweet(client, admin_auth_headers, 5)
+    created = (await client.post(
+        "/api/reservations/", json={"items": [{"sweet_id": sweet_id, "quantity": 1}]}, headers=regular_user_auth_headers
+    )).json()
+    read = (await client.get(f"/api/reservations/{created['id']}", headers=regular_user_auth_headers)).json()
+
+    assert created["expires_at"].endswith("Z")
+    assert (read["created_at"], read["expires_at"]) == (created["created_at"], created["expires_at"])
+
+
+async def test_checkout_with_a_deleted_sweet_releases_the_reservation(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    kept, deleted = await create_sweet(client, admin_auth_headers, 5), await create_sweet(client, admin_auth_headers, 5)
+    reservation = (await client.post(
+        "/api/reservations/",
+        json={"items": [{"sweet_id": kept, "quantity": 2}, {"sweet_id": deleted, "quantity": 1}]},
+        headers=regular_user_auth_headers,
+    )).json()
+    assert (await client.delete(f"/api/sweets/{deleted}", headers=admin_auth_headers)).status_code == 204
+
+    response = await client.post(
+        "/api/orders/", json={"reservation_id": reservation["id"]}, headers=regular_user_auth_headers
+    )
+    assert response.status_code == 409
+    response = await client.get(f"/api/reservations/{reservation['id']}", headers=regular_user_auth_headers)
+    assert response.json()["status"] == "Released"
+    assert await stock_of(client, kept) == 5
+
+# --- 2. Releasing holds ---
+
+async def test_release_returns_stock(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    sweet_id = await create_sweet(client, admin_auth_headers, 5)
+    reservation = (await client.post(
+        "/api/reservations/", json={"items": [{"sweet_id": sweet_id, "quantity": 5}]}, headers=regular_user_auth_headers
+    )).json()
+    assert await stock_of(client, sweet_id) == 0
+
+    response = await client.delete(f"/api/reservations/{reservation['id']}", headers=regular_user_auth_headers)
+    assert response.status_code == 204
+    assert await stock_of(client, sweet_id) == 5
+
+    response = await client.delete(f"/api/reservations/{reservation['id']}", headers=regular_user_auth_headers)
+    assert response.status_code == 409
+    response = await client.get(f"/api/reservations/{reservation['id']}", headers=regular_user_auth_headers)
+    assert response.json()["status"] == "Released"
+
+
+async def test_sweeper_reclaims_expired_reservations(
+    client: AsyncClient, session_factory, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    sweet_id = await create_sweet(client, admin_auth_headers, 8)
+    for quantity in (2, 3):
+        await client.post(
+            "/api/reservations/", json={"items": [{"sweet_id": sweet_id, "quantity": quantity}]},
+            headers=regular_user_auth_headers,
+        )
+    assert await stock_of(client, sweet_id) == 3
+
+    async with session_factory() as db:
+        # Nothing has expired yet
+        assert await sweep_expired_reservations(db, models.utc_now()) == 0
+        later = models.utc_now() + timedelta(days=1)
+        assert await sweep_expired_reservations(db, later, batch_size=1) == 1
+        assert await sweep_expired_reservations(db, later) == 1
+        await db.commit()
+
+    assert await stock_of(client, sweet_id) == 8
@@ -1,7 +1,17 @@
-from starlette.testclient import TestClient
+from httpx import AsyncClient
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from types import SimpleNamespace
 from typing import Dict, Any
+import json
+import time
 import uuid # Essential for generating unique test data
 
+from app.core.cache import catalog_cache
+from app.core.config import settings
+from app.core.search import CatalogSearchIndex
+from app.db import models
+
 # Base data for a sweet product (name will be added dynamically)
 BASE_SWEET_DATA = {
     "category": "Fudge",
@@ -20,12 +30,12 @@ def get_unique_sweet_data() -> Dict[str, Any]:
 
 # --- 1. CREATE TESTS (POST /api/sweets/) ---
 
-def test_create_sweet_regular_user_fails(client: TestClient, regular_user_auth_headers: Dict[str, str]):
+async def test_create_sweet_regular_user_fails(client: AsyncClient, regular_user_auth_headers: Dict[str, str]):
     """
     Test that a regular (non-admin) user cannot create a sweet.
     Expected result: 403 Forbidden.
     """
-    response = client.post(
+    response = await client.post(
         "/api/sweets/",
         json=get_unique_sweet_data(), # Use unique data
         headers=regular_user_auth_headers 
@@ -34,11 +44,11 @@ def test_create_sweet_regular_user_fails(client: TestClient, regular_user_auth_h
     assert response.status_code == 403
     assert "Only administrators can create sweets." in response.json()["detail"]
 
-def test_create_sweet_admin_success(client: TestClient, admin_auth_headers: Dict[str, str]):
+async def test_create_sweet_admin_success(client: AsyncClient, admin_auth_headers: Dict[str, str]):
     """
     Test that an admin user CAN successfully create a sweet.
     """
-    response = client.post(
+    response = await client.post(
         "/api/sweets/",
         json=get_unique_sweet_data(), # Use unique data
         headers=admin_auth_headers
@@ -55,53 +65,100 @@ def test_create_sweet_admin_success(client: TestClient, admin_auth_headers: Dict
 
 # --- 2. READ TESTS (GET /api/sweets/) ---
 
-def test_get_all_sweets_success(client: TestClient, admin_auth_headers: Dict[str, str]):
+async def test_get_all_sweets_success(client: AsyncClient, admin_auth_headers: Dict[str, str]):
     """Test that all users (even unauthenticated) can read the list of sweets."""
     # Ensure a sweet exists for the list (using unique data)
-    client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
     
-    response = client.get("/api/sweets/")
+    response = await client.get("/api/sweets/")
     
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
     assert len(data) > 0
 
-def test_get_single_sweet_success(client: TestClient, admin_auth_headers: Dict[str, str]):
+async def test_get_all_sweets_etag_not_modified(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Test that a matching If-None-Match gets a 304 and that writes change the ETag."""
+    await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+
+    response = await client.get("/api/sweets/")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    # 1. Revalidating with the same ETag returns 304 with no body
+    not_modified = await client.get("/api/sweets/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+    # 2. Updating a sweet invalidates the cache, so the old ETag no longer matches
+    sweet_id = response.json()[0]["id"]
+    await client.put(f"/api/sweets/{sweet_id}", json={"stock_quantity": 7}, headers=admin_auth_headers)
+
+    refreshed = await client.get("/api/sweets/", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+    assert refreshed.json()[0]["stock_quantity"] == 7
+
+
+async def test_get_all_sweets_sees_writes_from_other_workers(
+    client: AsyncClient, db: AsyncSession, admin_auth_headers: Dict[str, str], monkeypatch
+):
+    """Writes that never called this process's invalidate() show up once the cache revalidates."""
+    for _ in range(2):
+        await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    response = await client.get("/api/sweets/")
+    etag = response.headers["ETag"]
+    first, second = (sweet["id"] for sweet in response.json())
+
+    # Another worker changes stock and deletes a sweet, straight through the database
+    await db.execute(update(models.Sweet).where(models.Sweet.id == first).values(stock_quantity=3))
+    await db.execute(delete(models.Sweet).where(models.Sweet.id == second))
+    await db.commit()
+
+    # Within the revalidation interval the cached copy is still served
+    assert (await client.get("/api/sweets/", headers={"If-None-Match": etag})).status_code == 304
+
+    monkeypatch.setattr(catalog_cache, "revalidate_seconds", 0)
+    refreshed = await client.get("/api/sweets/", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert [(sweet["id"], sweet["stock_quantity"]) for sweet in refreshed.json()] == [(first, 3)]
+
+async def test_get_single_sweet_success(client: AsyncClient, admin_auth_headers: Dict[str, str]):
     """Test that a single sweet can be retrieved by ID."""
     # 1. Create a sweet to get its ID (using unique data)
-    create_response = client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    create_response = await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
     assert create_response.status_code == 201
     sweet_id = create_response.json()["id"] # Now this key should exist!
     
     # 2. Get the sweet by ID
-    get_response = client.get(f"/api/sweets/{sweet_id}")
+    get_response = await client.get(f"/api/sweets/{sweet_id}")
     
     assert get_response.status_code == 200
     assert get_response.json()["id"] == sweet_id
     assert get_response.json()["price"] == BASE_SWEET_DATA["price"] # Check a base field
 
-def test_get_non_existent_sweet_fails(client: TestClient):
+async def test_get_non_existent_sweet_fails(client: AsyncClient):
     """Test retrieving a sweet with an ID that doesn't exist returns a 404."""
     # Note: No authentication is needed for a public check
-    response = client.get("/api/sweets/99999") 
+    response = await client.get("/api/sweets/99999") 
     assert response.status_code == 404
     assert "Sweet not found" in response.json()["detail"]
 
 
 # --- 3. UPDATE TESTS (PUT /api/sweets/{sweet_id}) ---
 
-def test_update_sweet_admin_success(client: TestClient, admin_auth_headers: Dict[str, str]):
+async def test_update_sweet_admin_success(client: AsyncClient, admin_auth_headers: Dict[str, str]):
     """Test that an admin can successfully update a sweet."""
     # 1. Create a sweet (using unique data)
-    create_response = client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    create_response = await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
     assert create_response.status_code == 201
     sweet_id = create_response.json()["id"] # Now this key should exist!
     
     # 2. Update data
     UPDATE_DATA = {"price": 7.50, "description": "New richer, updated fudge.", "stock_quantity": 50}
     
-    response = client.put(
+    response = await client.put(
         f"/api/sweets/{sweet_id}",
         json=UPDATE_DATA,
         headers=admin_auth_headers
@@ -114,15 +171,15 @@ def test_update_sweet_admin_success(client: TestClient, admin_auth_headers: Dict
     assert data["description"] == "New richer, updated fudge."
     assert data["stock_quantity"] == 50
 
-def test_update_sweet_regular_user_fails(client: TestClient, regular_user_auth_headers: Dict[str, str], admin_auth_headers: Dict[str, str]):
+async def test_update_sweet_regular_user_fails(client: AsyncClient, regular_user_auth_headers: Dict[str, str], admin_auth_headers: Dict[str, str]):
     """Test that a regular user cannot update a sweet."""
     # 1. Create a sweet (needs admin headers, using unique data)
-    create_response = client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    create_response = await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
     assert create_response.status_code == 201
     sweet_id = create_response.json()["id"] # Now this key should exist!
 
     # 2. Attempt update with regular user
-    response = client.put(
+    response = await client.put(
         f"/api/sweets/{sweet_id}",
         json={"price": 100.0},
         headers=regular_user_auth_headers
@@ -134,33 +191,239 @@ def test_update_sweet_regular_user_fails(client: TestClient, regular_user_auth_h
 
 # --- 4. DELETE TESTS (DELETE /api/sweets/{sweet_id}) ---
 
-def test_delete_sweet_admin_success(client: TestClient, admin_auth_headers: Dict[str, str]):
+async def test_delete_sweet_admin_success(client: AsyncClient, admin_auth_headers: Dict[str, str]):
     """Test that an admin can successfully delete a sweet (204 No Content)."""
     # 1. Create a sweet (using unique data)
-    create_response = client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    create_response = await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
     assert create_response.status_code == 201
     sweet_id = create_response.json()["id"] # Now this key should exist!
 
     # 2. Delete the sweet
-    delete_response = client.delete(f"/api/sweets/{sweet_id}", headers=admin_auth_headers)
+    delete_response = await client.delete(f"/api/sweets/{sweet_id}", headers=admin_auth_headers)
     assert delete_response.status_code == 204
     
     # 3. Verify it's deleted (attempting to GET should return 404)
-    get_response = client.get(f"/api/sweets/{sweet_id}")
+    get_response = await client.get(f"/api/sweets/{sweet_id}")
     assert get_response.status_code == 404
 
-def test_delete_sweet_regular_user_fails(client: TestClient, regular_user_auth_headers: Dict[str, str], admin_auth_headers: Dict[str, str]):
+async def test_delete_sweet_regular_user_fails(client: AsyncClient, regular_user_auth_headers: Dict[str, str], admin_auth_headers: Dict[str, str]):
     """Test that a regular user cannot delete a sweet."""
     # 1. Create a sweet (using unique data)
-    create_response = client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
+    create_response = await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)
     assert create_response.status_code == 201
     sweet_id = create_response.json()["id"] # Now this key should exist!
 
     # 2. Attempt delete with regular user
-    delete_response = client.delete(f"/api/sweets/{sweet_id}", headers=regular_user_auth_headers)
+    delete_response = await client.delete(f"/api/sweets/{sweet_id}", headers=regular_user_auth_headers)
     assert delete_response.status_code == 403
     assert "Only administrators can delete sweets." in delete_response.json()["detail"]
     
     # 3. Verify the sweet still exists
-    get_response = client.get(f"/api/sweets/{sweet_id}")
-    assert get_response.status_code == 200
\ No newline at end of file
+    get_response = await client.get(f"/api/sweets/{sweet_id}")
+    assert get_response.status_code == 200
+
+# --- 5. SEARCH TESTS (GET /api/sweets/search) ---
+
+async def test_search_sweets_prefix_and_typo(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Test that search matches by prefix and with a typo, ranking name matches above description matches."""
+    fudge = {**get_unique_sweet_data(), "name": "Walnut Fudge", "description": "Soft fudge bar."}
+    brownie = {**get_unique_sweet_data(), "name": "Chocolate Brownie", "description": "Goes well with walnut fudge."}
+    for sweet in (fudge, brownie):
+        assert (await client.post("/api/sweets/", json=sweet, headers=admin_auth_headers)).status_code == 201
+
+    # Prefix: "wal fud" matches both, the name match ranks first
+    response = await client.get("/api/sweets/search", params={"q": "wal fud"})
+    assert response.status_code == 200
+    assert [sweet["name"] for sweet in response.json()] == ["Walnut Fudge", "Chocolate Brownie"]
+
+    # Typo: "brwonie" is "brownie" with two letters swapped
+    response = await client.get("/api/sweets/search", params={"q": "brwonie"})
+    assert [sweet["name"] for sweet in response.json()] == ["Chocolate Brownie"]
+
+    # Every query term must match
+    response = await client.get("/api/sweets/search", params={"q": "walnut licorice"})
+    assert response.json() == []
+
+async def test_search_sweets_follows_updates_and_deletes(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Test that the index is updated by the update and delete endpoints."""
+    sweet = {**get_unique_sweet_data(), "name": "Mango Barfi", "description": None}
+    sweet_id = (await client.post("/api/sweets/", json=sweet, headers=admin_auth_headers)).json()["id"]
+
+    await client.put(f"/api/sweets/{sweet_id}", json={"name": "Pista Barfi"}, headers=admin_auth_headers)
+    assert (await client.get("/api/sweets/search", params={"q": "mango"})).json() == []
+    assert [s["id"] for s in (await client.get("/api/sweets/search", params={"q": "pista"})).json()] == [sweet_id]
+
+    await client.delete(f"/api/sweets/{sweet_id}", headers=admin_auth_headers)
+    assert (await client.get("/api/sweets/search", params={"q": "barfi"})).json() == []
+
+async def test_search_sweets_sees_writes_from_other_workers(
+    client: AsyncClient, db: AsyncSession, admin_auth_headers: Dict[str, str], monkeypatch
+):
+    """Test that the index picks up renames, deletes and inserts that never went through this process."""
+    monkeypatch.setattr(settings, "SEARCH_INDEX_REFRESH_SECONDS", 0)
+    created = []
+    for name in ("Mango Barfi", "Kaju Barfi"):
+        sweet = {**get_unique_sweet_data(), "name": name, "description": None}
+        created.append((await client.post("/api/sweets/", json=sweet, headers=admin_auth_headers)).json())
+    ids = [sweet["id"] for sweet in created]
+    assert len((await client.get("/api/sweets/search", params={"q": "barfi"})).json()) == 2
+
+    # Another worker renames one sweet, deletes the other and adds a third, straight through the database
+    await db.execute(update(models.Sweet).where(models.Sweet.id == ids[0]).values(name="Mango Halwa"))
+    await db.execute(delete(models.Sweet).where(models.Sweet.id == ids[1]))
+    db.add(models.Sweet(name="Coconut Barfi", category="Indian", price=2.5, stock_quantity=5, owner_id=created[0]["owner_id"]))
+    await db.commit()
+
+    assert [s["name"] for s in (await client.get("/api/sweets/search", params={"q": "barfi"})).json()] == ["Coconut Barfi"]
+    assert [s["id"] for s in (await client.get("/api/sweets/search", params={"q": "halwa"})).json()] == [ids[0]]
+
+
+def test_search_with_few_shared_matches_stays_bounded():
+    """
+    Number terms each prefix-match dozens of sweets but share almost none, so the
+    score-level walk never collects `limit` results. It must give up and fall back to
+    candidate scoring instead of visiting every level combination (minutes of work).
+    """
+    index = CatalogSearchIndex()
+    index.rebuild(
+        [SimpleNamespace(id=sweet_id, name=f"Sweet {sweet_id}", category="Candy", description=None)
+         for sweet_id in range(1, 20_001)]
+        + [SimpleNamespace(id=20_001, name="Mixed 10 20 30 40", category="Candy", description=None)]
+    )
+
+    started = time.perf_counter()
+    results = index.search("10 20 30 40", limit=20)
+    assert time.perf_counter() - started < 0.5
+    assert [sweet_id for sweet_id, _ in results] == [20_001]
+
+
+# --- 6. FILTERING, SORTING AND PAGINATION TESTS (GET /api/sweets/?...) ---
+
+async def test_get_sweets_filtered_and_sorted(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Filters are applied in SQL and results come back in the requested order."""
+    category = f"Barfi {uuid.uuid4().hex[:8]}"
+    for price, stock in ((4.0, 10), (2.0, 0), (3.0, 5), (9.0, 1)):
+        sweet = {**get_unique_sweet_data(), "category": category, "price": price, "stock_quantity": stock}
+        await client.post("/api/sweets/", json=sweet, headers=admin_auth_headers)
+
+    response = await client.get(
+        "/api/sweets/",
+        params={"category": category, "max_price": 5, "in_stock": "true", "sort": "-price"}
+    )
+
+    assert response.status_code == 200
+    assert [sweet["price"] for sweet in response.json()] == [4.0, 3.0]
+    assert "X-Next-Cursor" not in response.headers
+
+
+async def test_get_sweets_cursor_pagination(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Following X-Next-Cursor walks every matching sweet exactly once, in order."""
+    category = f"Ladoo {uuid.uuid4().hex[:8]}"
+    for price in (1.5, 1.5, 2.5, 0.5, 3.5):
+        sweet = {**get_unique_sweet_data(), "category": category, "price": price}
+        await client.post("/api/sweets/", json=sweet, headers=admin_auth_headers)
+
+    params = {"category": category, "sort": "price", "limit": 2}
+    prices, pages = [], 0
+    while True:
+        response = await client.get("/api/sweets/", params=params)
+        assert response.status_code == 200
+        prices += [sweet["price"] for sweet in response.json()]
+        pages += 1
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert prices == [0.5, 1.5, 1.5, 2.5, 3.5]
+    assert pages == 3
+
+    # A cursor is only valid for the sort order that produced it
+    response = await client.get("/api/sweets/", params={"sort": "name", "cursor": params["cursor"]})
+    assert response.status_code == 400
+
+
+# --- 7. BULK IMPORT TESTS (POST /api/sweets/bulk) ---
+
+async def test_bulk_import_csv_upserts_and_reports_bad_rows(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Valid rows are inserted or update the sweet with the same name; invalid rows are reported."""
+    existing = get_unique_sweet_data()
+    await client.post("/api/sweets/", json=existing, headers=admin_auth_headers)
+
+    csv_body = (
+        "name,category,price,stock_quantity,description,is_available\n"
+        f"{existing['name']},Fudge,7.5,3,,false\n"          # Updates the existing sweet
+        "Rose Barfi,Indian,4.25,40,\"Milk fudge, with rose\nand pistachio\",true\n"
+        "Broken Ladoo,Indian,-1,10,,\n"                      # Price must be positive
+        "Mango Kulfi,Frozen,3.0,abc,,\n"                     # Stock must be an integer
+    )
+    response = await client.post(
+        "/api/sweets/bulk?format=csv", content=csv_body.encode(), headers=admin_auth_headers
+    )
+
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["upserted"], report["failed"]) == (4, 2, 2)
+    assert [error["row"] for error in report["errors"]] == [3, 4]
+    assert "price" in report["errors"][0]["errors"][0]
+
+    sweets = {sweet["name"]: sweet for sweet in (await client.get("/api/sweets/")).json()}
+    assert len(sweets) == 2
+    assert sweets[existing["name"]]["price"] == 7.5
+    assert sweets[existing["name"]]["is_available"] is False
+    assert sweets["Rose Barfi"]["description"] == "Milk fudge, with rose\nand pistachio"
+    # Imported sweets are searchable straight away
+    assert (await client.get("/api/sweets/search", params={"q": "rose"})).json()[0]["name"] == "Rose Barfi"
+
+
+async def test_bulk_import_ndjson(client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]):
+    lines = [json.dumps({**get_unique_sweet_data(), "name": f"Kaju Katli {n}"}) for n in range(5)]
+    body = "\n".join(lines[:2] + ["{not json"] + lines[2:]) + "\n"
+
+    response = await client.post("/api/sweets/bulk?format=ndjson", content=body, headers=regular_user_auth_headers)
+    assert response.status_code == 403
+
+    response = await client.post("/api/sweets/bulk?format=ndjson", content=body, headers=admin_auth_headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["upserted"], report["failed"]) == (6, 5, 1)
+    assert report["errors"][0]["row"] == 3
+    assert len((await client.get("/api/sweets/")).json()) == 5
+
+
+# --- 8. STOCK ADJUSTMENT TESTS (POST /api/sweets/stock-adjustments) ---
+
+async def test_stock_adjustments_apply_atomically(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Deltas and counts are applied together; one bad entry rolls back the whole batch."""
+    ids = []
+    for _ in range(3):
+        ids.append((await client.post("/api/sweets/", json=get_unique_sweet_data(), headers=admin_auth_headers)).json()["id"])
+
+    batch = {"adjustments": [
+        {"sweet_id": ids[0], "delta": 25},
+        {"sweet_id": ids[1], "set_to": 7},
+        {"sweet_id": ids[1], "delta": -2},   # Applies after the count
+        {"sweet_id": ids[2], "delta": -100},
+    ]}
+    response = await client.post("/api/sweets/stock-adjustments", json=batch, headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert response.json() == [
+        {"sweet_id": ids[0], "stock_quantity": 125},
+        {"sweet_id": ids[1], "stock_quantity": 5},
+        {"sweet_id": ids[2], "stock_quantity": 0},
+    ]
+
+    # Going below zero rejects the whole batch
+    batch = {"adjustments": [{"sweet_id": ids[0], "delta": 5}, {"sweet_id": ids[1], "delta": -6}]}
+    response = await client.post("/api/sweets/stock-adjustments", json=batch, headers=admin_auth_headers)
+    assert response.status_code == 400
+    assert str(ids[1]) in response.json()["detail"]
+    assert (await client.get(f"/api/sweets/{ids[0]}")).json()["stock_quantity"] == 125
+
+    # So does an unknown sweet, and an entry must carry exactly one of delta/set_to
+    batch = {"adjustments": [{"sweet_id": ids[0], "delta": 5}, {"sweet_id": 99999, "delta": 1}]}
+    response = await client.post("/api/sweets/stock-adjustments", json=batch, headers=admin_auth_headers)
+    assert response.status_code == 404
+    batch = {"adjustments": [{"sweet_id": ids[0], "delta": 5, "set_to": 1}]}
+    response = await client.post("/api/sweets/stock-adjustments", json=batch, headers=admin_auth_headers)
+    assert response.status_code == 422
+    assert (await client.get(f"/api/sweets/{ids[0]}")).json()["stock_quantity"] == 125
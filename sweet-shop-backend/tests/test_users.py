@@ -0,0 +1,88 @@
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict
+
+from app.core.cache import PrincipalCache
+from app.db.models import User as UserModel
+
+
+# --- 1. GET /api/users/me ---
+
+async def test_read_users_me_uses_principal_cache(
+    client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]
+):
+    """Test that repeated requests from a regular user are served from the principal cache, and admins are not cached."""
+    first = await client.get("/api/users/me", headers=regular_user_auth_headers)
+    second = await client.get("/api/users/me", headers=regular_user_auth_headers)
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert second.json()["is_admin"] is False
+
+    assert (await client.get("/api/users/me", headers=admin_auth_headers)).json()["is_admin"] is True
+    stats = (await client.get("/api/admin/principal-cache", headers=admin_auth_headers)).json()
+    assert stats["hits"] >= 1
+    assert stats["size"] == 1
+
+# --- 2. PATCH /api/users/{user_id}/admin ---
+
+async def test_promote_user_takes_effect_immediately(client: AsyncClient, admin_auth_headers: Dict[str, str], regular_user_auth_headers: Dict[str, str]):
+    """Test that promoting a user invalidates their cached principal."""
+    # 1. Warm the cache with the regular user's (non-admin) principal
+    me = (await client.get("/api/users/me", headers=regular_user_auth_headers)).json()
+    assert me["is_admin"] is False
+    assert (await client.get("/api/users/", headers=regular_user_auth_headers)).status_code == 403
+
+    # 2. Promote the user
+    response = await client.patch(f"/api/users/{me['id']}/admin", json={"is_admin": True}, headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert response.json()["is_admin"] is True
+
+    # 3. The same token now has admin access
+    assert (await client.get("/api/users/", headers=regular_user_auth_headers)).status_code == 200
+
+async def test_demoted_admin_loses_access_on_every_worker(
+    client: AsyncClient, db: AsyncSession, admin_auth_headers: Dict[str, str]
+):
+    """Test that a demotion made by another worker (straight through the database) applies on the next request."""
+    me = (await client.get("/api/users/me", headers=admin_auth_headers)).json()
+    assert (await client.get("/api/users/", headers=admin_auth_headers)).status_code == 200
+
+    await db.execute(update(UserModel).where(UserModel.id == me["id"]).values(is_admin=False))
+    await db.commit()
+
+    assert (await client.get("/api/users/", headers=admin_auth_headers)).status_code == 403
+
+async def test_admin_cannot_change_own_status(client: AsyncClient, admin_auth_headers: Dict[str, str]):
+    """Test that an admin cannot demote themselves."""
+    me = (await client.get("/api/users/me", headers=admin_auth_headers)).json()
+    response = await client.patch(f"/api/users/{me['id']}/admin", json={"is_admin": False}, headers=admin_auth_headers)
+    assert response.status_code == 400
+
+async def test_change_admin_status_regular_user_fails(client: AsyncClient, regular_user_auth_headers: Dict[str, str]):
+    """Test that a regular user cannot promote anyone."""
+    response = await client.patch("/api/users/1/admin", json={"is_admin": True}, headers=regular_user_auth_headers)
+    assert response.status_code == 403
+
+
+# --- 3. PrincipalCache ---
+
+def test_principal_cache_evicts_least_recently_used():
+    """Test that the cache stays within max_size by evicting the least recently used subject."""
+    cache = PrincipalCache(max_size=2, ttl_seconds=60)
+    cache.put("a@example.com", "A")
+    cache.put("b@example.com", "B")
+    assert cache.get("a@example.com") == "A"  # "b" is now least recently used
+    cache.put("c@example.com", "C")
+
+    assert cache.get("b@example.com") is None
+    assert cache.get("a@example.com") == "A"
+    assert cache.stats()["hit_rate"] == 0.6667
+
+def test_principal_cache_expires_entries():
+    """Test that entries older than the TTL are treated as misses."""
+    cache = PrincipalCache(max_size=10, ttl_seconds=0)
+    cache.put("a@example.com", "A")
+    assert cache.get("a@example.com") is None
+    assert cache.stats()["size"] == 0
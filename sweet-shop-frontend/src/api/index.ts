@@ -13,6 +13,26 @@ const api = axios.create({
     },
 });
 
+// --- Read-your-writes ---
+// Responses to writes carry X-Last-Write (when the write committed). Echoing the
+// latest value on every request makes the backend serve our reads from the primary
+// database for a few seconds, so we see our own changes even while replicas catch up.
+const LAST_WRITE_HEADER = 'X-Last-Write';
+let lastWrite: string | null = null;
+
+api.interceptors.response.use(
+    response => {
+        const written = response.headers[LAST_WRITE_HEADER.toLowerCase()];
+        if (written && (!lastWrite || Number(written) > Number(lastWrite))) {
+            lastWrite = written;
+        }
+        return response;
+    },
+    error => {
+        return Promise.reject(error);
+    }
+);
+
 // --- Interceptor to attach the JWT Token ---
 // This ensures that all authenticated API calls (like /orders/ or /users/me) 
 // automatically include the 'Authorization' header.
@@ -26,6 +46,9 @@ api.interceptors.request.use(
              // Ensure the header is not sent if no token exists
              delete config.headers.Authorization;
         }
+        if (lastWrite) {
+            config.headers[LAST_WRITE_HEADER] = lastWrite;
+        }
         return config;
     },
     error => {
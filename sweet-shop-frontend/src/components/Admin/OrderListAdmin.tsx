@@ -28,6 +28,14 @@ interface AdminOrder {
 // Order Status options for the dropdown
 const statusOptions = ['Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled'];
 
+// Response of POST /orders/status-batch
+interface StatusBatchResult {
+    status: AdminOrder['status'];
+    updated: number[];
+    unchanged: number[];
+    not_found: number[];
+}
+
 // --- Component Definition ---
 
 const OrderListAdmin: React.FC = () => {
@@ -36,6 +44,11 @@ const OrderListAdmin: React.FC = () => {
     const [orders, setOrders] = useState<AdminOrder[]>([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
+    // Cursor for the next page of orders (from the X-Next-Cursor header), null when on the last page
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    // Orders ticked for a bulk status change, and the status to move them to
+    const [selectedIds, setSelectedIds] = useState<number[]>([]);
+    const [bulkStatus, setBulkStatus] = useState<string>('Shipped');
 
     // NEW HELPER FUNCTION TO FORMAT DISPLAY NAME
     const getDisplayName = (email: string | undefined, ownerId: number): string => {
@@ -56,14 +69,15 @@ const OrderListAdmin: React.FC = () => {
     };
     // END NEW HELPER FUNCTION
 
-    const fetchOrders = async () => {
+    const fetchOrders = async (cursor: string | null = null) => {
         setLoading(true);
         try {
-            // This endpoint should now return the user_email field for admins
-            const response = await api.get<AdminOrder[]>('/orders/'); 
+            // The endpoint returns one page of orders, newest first, including user_email for admins
+            const response = await api.get<AdminOrder[]>('/orders/', { params: cursor ? { cursor } : {} }); 
             
-            // Assuming the list of orders is directly in response.data
-            setOrders(response.data.reverse()); 
+            // Append to the already-loaded orders when fetching a following page
+            setOrders(prevOrders => cursor ? [...prevOrders, ...response.data] : response.data); 
+            setNextCursor(response.headers['x-next-cursor'] ?? null);
             setError(null);
         } catch (err: any) {
             console.error('Failed to fetch orders:', err);
@@ -101,11 +115,46 @@ const OrderListAdmin: React.FC = () => {
         }
     };
     
+    const toggleSelected = (orderId: number) => {
+        setSelectedIds(prevIds => prevIds.includes(orderId)
+            ? prevIds.filter(id => id !== orderId)
+            : [...prevIds, orderId]);
+    };
+
+    const toggleSelectAll = () => {
+        setSelectedIds(selectedIds.length === orders.length ? [] : orders.map(order => order.id));
+    };
+
+    const handleBulkStatusChange = async () => {
+        if (!window.confirm(`Are you sure you want to change ${selectedIds.length} orders to "${bulkStatus}"?`)) {
+            return;
+        }
+
+        try {
+            // One request for all selected orders; the response lists what happened to each ID
+            const response = await api.post<StatusBatchResult>('/orders/status-batch', { order_ids: selectedIds, status: bulkStatus });
+            const { updated, unchanged, not_found } = response.data;
+            const changed = new Set([...updated, ...unchanged]);
+
+            setOrders(prevOrders => prevOrders.map(order =>
+                changed.has(order.id) ? { ...order, status: response.data.status } : order
+            ));
+            setSelectedIds([]);
+            const missing = not_found.length ? ` ${not_found.length} orders no longer exist.` : '';
+            alert(`${updated.length} orders updated to ${bulkStatus}.${missing}`);
+
+        } catch (err: any) {
+            console.error('Bulk status update failed:', err);
+            const errorMessage = err.response?.data?.detail || 'Failed to update order statuses.';
+            alert(errorMessage);
+        }
+    };
+    
     if (!user || !user.is_admin) {
         return <div className="alert alert-danger mt-5 text-center">Unauthorized Access.</div>;
     }
 
-    if (loading) {
+    if (loading && orders.length === 0) {
         return <div className="text-center mt-5">Loading customer orders...</div>;
     }
 
@@ -122,12 +171,52 @@ const OrderListAdmin: React.FC = () => {
                     No customer orders have been placed yet.
                 </div>
             ) : (
+                <>
+                {/* Bulk Status Update Control */}
+                <div className="d-flex align-items-center gap-2 mb-3">
+                    <input
+                        type="checkbox"
+                        className="form-check-input mt-0"
+                        id="select-all-orders"
+                        checked={selectedIds.length === orders.length}
+                        onChange={toggleSelectAll}
+                    />
+                    <label htmlFor="select-all-orders" className="form-label mb-0 me-3">
+                        Select all ({selectedIds.length} selected)
+                    </label>
+                    <select
+                        className="form-select form-select-sm w-auto"
+                        value={bulkStatus}
+                        onChange={(e) => setBulkStatus(e.target.value)}
+                    >
+                        {statusOptions.map(status => (
+                            <option key={status} value={status}>{status}</option>
+                        ))}
+                    </select>
+                    <button
+                        className="btn btn-sm btn-primary"
+                        onClick={handleBulkStatusChange}
+                        disabled={loading || selectedIds.length === 0}
+                    >
+                        Update selected
+                    </button>
+                </div>
+
                 <div className="row g-4">
                     {orders.map((order) => (
                         <div className="col-lg-6" key={order.id}>
                             <div className="card shadow-sm h-100">
                                 <div className="card-header bg-secondary text-white d-flex justify-content-between align-items-center">
-                                    <h5 className="mb-0">Order ID: #{order.id}</h5>
+                                    <div className="d-flex align-items-center">
+                                        <input
+                                            type="checkbox"
+                                            className="form-check-input mt-0 me-2"
+                                            aria-label={`Select order ${order.id}`}
+                                            checked={selectedIds.includes(order.id)}
+                                            onChange={() => toggleSelected(order.id)}
+                                        />
+                                        <h5 className="mb-0">Order ID: #{order.id}</h5>
+                                    </div>
                                     <span className={`badge text-capitalize 
                                         ${order.status === 'Delivered' ? 'bg-success' : 
                                             order.status === 'Processing' ? 'bg-warning text-dark' : 
@@ -175,6 +264,15 @@ const OrderListAdmin: React.FC = () => {
                         </div>
                     ))}
                 </div>
+                </>
+            )}
+
+            {nextCursor && (
+                <div className="text-center mt-4">
+                    <button className="btn btn-outline-secondary" onClick={() => fetchOrders(nextCursor)} disabled={loading}>
+                        {loading ? 'Loading...' : 'Load more orders'}
+                    </button>
+                </div>
             )}
         </div>
     );
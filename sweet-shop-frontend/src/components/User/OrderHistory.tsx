@@ -2,7 +2,7 @@
 
 import React, { useState, useEffect } from 'react';
 import api from '../../api/index.ts';
-import { Order, OrderItem } from '../../types/Order.ts'; 
+import { Order, OrderItem, OrderSummary } from '../../types/Order.ts'; 
 
 // --- PROP INTERFACES ---
 
@@ -21,9 +21,13 @@ interface OrderHistoryProps {
 const OrderHistory: React.FC<OrderHistoryProps> = ({ sweets = [] }) => {
     
     // STATE DEFINITIONS
-    const [orders, setOrders] = useState<Order[]>([]);
+    const [orders, setOrders] = useState<OrderSummary[]>([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
+    // Cursor for the next page of orders (from the X-Next-Cursor header), null when on the last page
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    // Items of the orders the user has expanded, fetched on demand
+    const [orderItems, setOrderItems] = useState<Record<number, OrderItem[]>>({});
 
     // Function to find the sweet name from the passed-in list
     const getSweetName = (id: number): string => {
@@ -32,29 +36,47 @@ const OrderHistory: React.FC<OrderHistoryProps> = ({ sweets = [] }) => {
         return sweet ? sweet.name : `Sweet ID: ${id}`; // Fallback to ID if name is not found
     };
     
-    useEffect(() => {
-        const fetchOrders = async () => {
-            setLoading(true); 
-
-            try {
-                const response = await api.get<Order[]>('/orders/');
-                
-                // Defensive array assignment
-                setOrders(response.data ?? []); 
-                setError(null);
-            } catch (err: any) {
-                console.error("Failed to fetch orders:", err);
-                const errorMessage = err.response?.data?.detail || err.message || 'Failed to load order history.';
-                setError(errorMessage);
-            } finally {
-                setLoading(false);
-            }
-        };
+    const fetchOrders = async (cursor: string | null = null) => {
+        setLoading(true); 
+
+        try {
+            // One page of order summaries, newest first
+            const response = await api.get<OrderSummary[]>('/orders/history', { params: cursor ? { cursor } : {} });
+            
+            // Defensive array assignment; a following page is appended
+            const page = response.data ?? [];
+            setOrders(prevOrders => cursor ? [...prevOrders, ...page] : page); 
+            setNextCursor(response.headers['x-next-cursor'] ?? null);
+            setError(null);
+        } catch (err: any) {
+            console.error("Failed to fetch orders:", err);
+            const errorMessage = err.response?.data?.detail || err.message || 'Failed to load order history.';
+            setError(errorMessage);
+        } finally {
+            setLoading(false);
+        }
+    };
 
+    useEffect(() => {
         fetchOrders();
     }, []);
 
-    if (loading) {
+    // Shows or hides an order's items, loading them the first time
+    const toggleItems = async (orderId: number) => {
+        if (orderItems[orderId]) {
+            setOrderItems(({ [orderId]: _, ...rest }) => rest);
+            return;
+        }
+        try {
+            const response = await api.get<Order>(`/orders/${orderId}`);
+            setOrderItems(prevItems => ({ ...prevItems, [orderId]: response.data.items ?? [] }));
+        } catch (err: any) {
+            console.error("Failed to fetch order items:", err);
+            alert(err.response?.data?.detail || 'Failed to load the order items.');
+        }
+    };
+
+    if (loading && orders.length === 0) {
         return <div className="container mt-5 text-center"><p>Loading your order history...</p></div>;
     }
 
@@ -79,12 +101,18 @@ const OrderHistory: React.FC<OrderHistoryProps> = ({ sweets = [] }) => {
                             <div className="card-body">
                                 <p><strong>Date Placed:</strong> {new Date(order.created_at).toLocaleDateString()}</p>
                                 <p><strong>Status:</strong> {order.status}</p>
+                                <p><strong>Items:</strong> {order.item_count}</p>
                                 <p className="h4 text-end">**Total:** ₹{order.total_price.toFixed(2)}</p>
 
+                                <button className="btn btn-sm btn-outline-success" onClick={() => toggleItems(order.id)}>
+                                    {orderItems[order.id] ? 'Hide items' : 'Show items'}
+                                </button>
+
+                                {orderItems[order.id] && (
+                                <>
                                 <h6 className="mt-4 border-bottom pb-2">Items Purchased:</h6>
                                 <ul className="list-group list-group-flush">
-                                    {/* FIX: Using 'order.items' to match the backend JSON response */}
-                                    {order.items?.map((item: OrderItem, index: number) => (
+                                    {orderItems[order.id].map((item: OrderItem, index: number) => (
                                         <li key={index} className="list-group-item d-flex justify-content-between align-items-center">
                                             <span>
                                                 {/* FIX: Using getSweetName for display name */}
@@ -97,11 +125,21 @@ const OrderHistory: React.FC<OrderHistoryProps> = ({ sweets = [] }) => {
                                         </li>
                                     ))}
                                 </ul>
+                                </>
+                                )}
                             </div>
                         </div>
                     ))}
                 </div>
             )}
+
+            {nextCursor && (
+                <div className="text-center mb-4">
+                    <button className="btn btn-outline-secondary" onClick={() => fetchOrders(nextCursor)} disabled={loading}>
+                        {loading ? 'Loading...' : 'Load more orders'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
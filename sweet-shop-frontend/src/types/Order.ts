@@ -42,4 +42,20 @@ export interface Order {
     
     // Array of all items included in this order
     items: OrderItem[];
-}
\ No newline at end of file
+}
+
+/**
+ * One order in the customer's order history (GET /orders/history).
+ * Items are not included; they are fetched per order from GET /orders/{id}.
+ */
+export interface OrderSummary {
+    id: number;
+    status: string;
+    total_price: number;
+
+    // Number of sweets in the order (the sum of item quantities)
+    item_count: number;
+
+    created_at: string;
+    updated_at: string | null;
+}